@@ -4,7 +4,7 @@ from setuptools import setup, find_packages
 setup(
       name='task-manager',
       version='1.0',
-      py_modules= ['bot', 'models', 'contact_manager', 'event_manager', 'note_manager', 'file_sorter', 'base_view', 'common'],
+      py_modules= ['bot', 'models', 'storage', 'binary_format', 'indexes', 'sqlite_book', 'bulk_io', 'benchmarks', 'contact_manager', 'event_manager', 'event_indexes', 'event_storage', 'event_benchmarks', 'recurrence', 'reminders', 'ical', 'note_manager', 'note_index', 'note_storage', 'file_sorter', 'sort_engine', 'sort_benchmarks', 'base_view', 'common', 'data_tools'],
       description='It`s a personal helper, witch can be use like the address book, notes manager, event manager and file sorter.',
       url='',
       author='Dreamcode team, Vitaliy Nerg, Omelchenko Anton, Artem Hrytsay, Serhii Nozhenko, Muzychyk Vadym',
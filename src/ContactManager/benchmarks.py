@@ -0,0 +1,129 @@
+"""
+Benchmarks for the address book.
+
+Run from the ContactManager directory:
+    python benchmarks.py
+"""
+import csv
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+from bulk_io import import_contacts
+from models import AddressBook, Record
+
+
+class LegacyField:
+    """
+    Field layout used before __slots__: every field holds its own __dict__.
+    """
+    def __init__(self, value):
+        self.value = value
+
+
+class LegacyRecord:
+    """
+    Record layout used before __slots__: a __dict__ and a list of Phone objects.
+    """
+    def __init__(self, name, birthday=None, email=None, address=None):
+        self.name = LegacyField(name)
+        self.phones = []
+        self.birthday = LegacyField(birthday) if birthday else None
+        self.email = LegacyField(email) if email else None
+        self.address = LegacyField(address) if address else None
+
+    def add_phone(self, phone):
+        self.phones.append(LegacyField(phone))
+
+
+def sample_contact(i):
+    return (f'Contact {i}', f'{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 60}',
+            f'contact{i}@example.com', f'Street {i % 100}', [f'{2 * i:010d}', f'{2 * i + 1:010d}'])
+
+
+def measure_memory(record_class, count):
+    tracemalloc.start()
+    records = []
+    for i in range(count):
+        name, birthday, email, address, phones = sample_contact(i)
+        record = record_class(name, birthday=birthday, email=email, address=address)
+        for phone in phones:
+            record.add_phone(phone)
+        records.append(record)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def memory_benchmark(count=100_000):
+    """
+    Compare the memory taken by `count` contacts with the current and the legacy record layout.
+
+    :return: Bytes per record for the legacy and the current layout.
+    """
+    legacy = measure_memory(LegacyRecord, count) / count
+    current = measure_memory(Record, count) / count
+    print(f'Legacy records: {legacy:.0f} bytes per record')
+    print(f'Compact records: {current:.0f} bytes per record ({legacy / current:.1f}x smaller)')
+    return legacy, current
+
+
+def import_benchmark(count=100_000):
+    """
+    Import `count` generated contacts from a CSV file into an empty book.
+
+    :return: Import throughput in records per second.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'contacts.csv')
+        with open(csv_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['name', 'phones', 'email', 'birthday', 'address'])
+            for i in range(count):
+                name, birthday, email, address, phones = sample_contact(i)
+                writer.writerow([name, ';'.join(phones), email, birthday, address])
+        book = AddressBook(os.path.join(directory, 'address_book.bin'))
+        report = import_contacts(book, csv_path)
+        book.storage.close()
+    print(report)
+    return report.items_per_second
+
+
+def load_benchmark(count=100_000):
+    """
+    Compare the startup load of `count` contacts from a pickled book and from the binary book file.
+
+    :return: Load time in seconds of the pickled and the binary book.
+    """
+    records = {}
+    for i in range(count):
+        name, birthday, email, address, phones = sample_contact(i)
+        record = Record(name, birthday=birthday, email=email, address=address)
+        record.set_phones(phones)
+        records[name] = record
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, 'address_book.pickle')
+        with open(pickle_path, 'wb') as file:
+            pickle.dump(records, file)
+        start = time.perf_counter()
+        with open(pickle_path, 'rb') as file:
+            pickle.load(file)
+        pickled = time.perf_counter() - start
+
+        book = AddressBook(os.path.join(directory, 'address_book.bin'))
+        book.storage.compact(records, background=False)
+        start = time.perf_counter()
+        book.load_data_from_file()
+        binary = time.perf_counter() - start
+        book.storage.close()
+    print(f'Pickled book: loaded {count} contacts in {pickled:.3f}s')
+    print(f'Binary book: loaded {count} contacts in {binary:.3f}s ({pickled / binary:.1f}x faster)')
+    return pickled, binary
+
+
+if __name__ == '__main__':
+    memory_benchmark()
+    import_benchmark()
+    load_benchmark()
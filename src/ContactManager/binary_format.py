@@ -0,0 +1,344 @@
+"""
+Binary format of the address book file.
+
+    header        MAGIC, version, flags, record count, record index offset, string table offset, string count
+    records       record count x (u32 length, record)
+    record index  record count x u64 offset of the record
+    string table  string count x u64 offset of the string, then string count x (u32 length, utf-8 bytes)
+
+A record refers to its strings by their number in the string table, so a repeating string
+(an address, a city) is stored once:
+
+    u32 name, u32 email, u32 birthday, u32 address, u16 birthday ordinal, u16 phone count, phone count x u64 phone
+
+The file holds strings and integers only, so reading it never runs code the way unpickling does.
+"""
+from array import array
+from collections.abc import MutableMapping
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+
+MAGIC = b'ABKB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQQI')
+RECORD = struct.Struct('<IIIIHH')
+LENGTH = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+# journal entry: operation, length of the entry body, crc32 of the body
+JOURNAL_ENTRY = struct.Struct('<BII')
+NO_STRING = 0xFFFFFFFF
+NO_ORDINAL = 0xFFFF
+PUT = 1
+DELETE = 2
+
+
+class BookFormatError(Exception):
+    pass
+
+
+def record_values(record):
+    """
+    Return the plain values the format stores for a record.
+
+    :return: Tuple of name, phones (integers), email, birthday, birthday ordinal and address.
+    """
+    return (record.name.value, record._phones,
+            record.email.value if record.email else None,
+            record.birthday.value if record.birthday else None,
+            record.birthday.ordinal if record.birthday else None,
+            record.address.value if record.address else None)
+
+
+def encode_record(values, string_id):
+    name, phones, email, birthday, ordinal, address = values
+    payload = RECORD.pack(
+        string_id(name),
+        string_id(email) if email is not None else NO_STRING,
+        string_id(birthday) if birthday is not None else NO_STRING,
+        string_id(address) if address is not None else NO_STRING,
+        ordinal if ordinal is not None else NO_ORDINAL,
+        len(phones))
+    return payload + array('Q', phones).tobytes()
+
+
+def decode_record(buffer, offset, string):
+    name, email, birthday, address, ordinal, phone_count = RECORD.unpack_from(buffer, offset)
+    phones_start = offset + RECORD.size
+    phones = array('Q', buffer[phones_start:phones_start + phone_count * 8])
+    return (string(name), phones,
+            string(email) if email != NO_STRING else None,
+            string(birthday) if birthday != NO_STRING else None,
+            ordinal if ordinal != NO_ORDINAL else None,
+            string(address) if address != NO_STRING else None)
+
+
+class StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def id(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+
+def align(file):
+    # offset tables are read as arrays of u64, so they start on an 8-byte boundary
+    file.write(b'\0' * (-file.tell() % OFFSET.size))
+    return file.tell()
+
+
+def write_book(path, values):
+    """
+    Write the book file.
+
+    :param path: Path to the file.
+    :param values: Iterable of record values as returned by record_values.
+    """
+    strings = StringTable()
+    offsets = []
+    with open(path, 'wb') as file:
+        file.write(b'\0' * HEADER.size)
+        for record in values:
+            payload = encode_record(record, strings.id)
+            offsets.append(file.tell())
+            file.write(LENGTH.pack(len(payload)))
+            file.write(payload)
+
+        index_offset = align(file)
+        file.write(array('Q', offsets).tobytes())
+
+        strings_offset = align(file)
+        encoded = [string.encode('utf-8') for string in strings.strings]
+        position = strings_offset + len(encoded) * OFFSET.size
+        string_offsets = array('Q')
+        for data in encoded:
+            string_offsets.append(position)
+            position += LENGTH.size + len(data)
+        file.write(string_offsets.tobytes())
+        for data in encoded:
+            file.write(LENGTH.pack(len(data)))
+            file.write(data)
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets), index_offset, strings_offset, len(encoded)))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def is_book_file(path):
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class BookFile:
+    """
+    Book file mapped into memory, records and strings are decoded only when asked for.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.buffer)[:2]
+        if magic != MAGIC:
+            raise BookFormatError(f'{path} is not an address book file')
+        if version > VERSION:
+            raise BookFormatError(f'{path} has unsupported version {version}')
+        self._map_tables()
+        self._strings = {}
+
+    def _map_tables(self):
+        _, _, _, self.count, index_offset, strings_offset, string_count = HEADER.unpack_from(self.buffer)
+        self.offsets = memoryview(self.buffer)[index_offset:index_offset + self.count * 8].cast('Q')
+        self.string_offsets = memoryview(self.buffer)[strings_offset:strings_offset + string_count * 8].cast('Q')
+
+    def string(self, string_id):
+        string = self._strings.get(string_id)
+        if string is None:
+            offset = self.string_offsets[string_id]
+            (length,) = LENGTH.unpack_from(self.buffer, offset)
+            start = offset + LENGTH.size
+            string = self._strings[string_id] = str(self.buffer[start:start + length], 'utf-8')
+        return string
+
+    def name(self, index):
+        (name_id,) = LENGTH.unpack_from(self.buffer, self.offsets[index] + LENGTH.size)
+        return self.string(name_id)
+
+    def values(self, index):
+        return decode_record(self.buffer, self.offsets[index] + LENGTH.size, self.string)
+
+    def close(self):
+        """
+        Unmap the file, so it can be replaced.
+        """
+        # the views of the mapping have to be released before it is closed
+        self.offsets.release()
+        self.string_offsets.release()
+        self.buffer.close()
+
+
+class LazyRecords(MutableMapping):
+    """
+    Dict of records read from a book file, a record is built on its first access.
+
+    Until then the entry holds the number of the record in the file. A compaction may switch
+    the records to the rewritten file from its own thread, so the entries and the file are
+    read and changed under a lock.
+    """
+    def __init__(self, book_file, build_record):
+        """
+        Initialize LazyRecords.
+
+        :param book_file: BookFile to read the records from.
+        :param build_record: Function building a record from the values of decode_record.
+        """
+        self.book_file = book_file
+        self.build_record = build_record
+        self.entries = {book_file.name(index): index for index in range(book_file.count)}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        entry = self.entries[name]
+        if type(entry) is int:
+            with self._lock:
+                entry = self.entries[name]
+                if type(entry) is int:
+                    entry = self.entries[name] = self.build_record(self.book_file.values(entry))
+        return entry
+
+    def __setitem__(self, name, record):
+        with self._lock:
+            self.entries[name] = record
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self.entries[name]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def values_of(self, name):
+        """
+        Return the stored values of a record without building it.
+        """
+        with self._lock:
+            entry = self.entries[name]
+            return self.book_file.values(entry) if type(entry) is int else record_values(entry)
+
+    def copy(self):
+        """
+        Return a copy of the entries reading the same mapped file.
+        """
+        records = LazyRecords.__new__(LazyRecords)
+        records.book_file = self.book_file
+        records.build_record = self.build_record
+        with self._lock:
+            records.entries = dict(self.entries)
+        records._lock = self._lock
+        return records
+
+    def replace_file(self, path, snapshot):
+        """
+        Switch to the book file rewritten from `snapshot`, which replaces the file at `path`.
+
+        The records not built yet are renumbered by their position in the snapshot, the
+        other entries do not depend on the file.
+
+        :param path: Path to the current book file.
+        :param snapshot: LazyRecords copy the file was written from, in its order.
+        """
+        tmp_path = path + '.tmp'
+        positions = {name: index for index, name in enumerate(snapshot)}
+        with self._lock:
+            # a mapped file cannot be replaced on every platform, it is unmapped first
+            self.book_file.close()
+            os.replace(tmp_path, path)
+            self.book_file = BookFile(path)
+            for name, entry in self.entries.items():
+                if type(entry) is int:
+                    self.entries[name] = positions[name]
+
+
+def snapshot_values(data):
+    """
+    Yield the values of every record of a dict or LazyRecords, building no records.
+    """
+    if isinstance(data, LazyRecords):
+        for name in data:
+            yield data.values_of(name)
+    else:
+        for record in data.values():
+            yield record_values(record)
+
+
+def encode_journal_entry(op, key, values=None):
+    """
+    Encode a journal entry, the record strings are stored in the entry itself.
+    """
+    strings = StringTable()
+    strings.id(key)
+    payload = encode_record(values, strings.id) if values is not None else b''
+    encoded = [string.encode('utf-8') for string in strings.strings]
+    body = b''.join([LENGTH.pack(len(encoded))] + [LENGTH.pack(len(data)) + data for data in encoded] + [payload])
+    return JOURNAL_ENTRY.pack(op, len(body), zlib.crc32(body)) + body
+
+
+def decode_journal(buffer):
+    """
+    Yield (operation, key, values, end) of the journal entries, stopping at a torn or corrupted tail.
+
+    `end` is the offset right after the entry, so the end of the last yielded entry is the size
+    of the valid part of the journal.
+    """
+    offset = 0
+    while offset + JOURNAL_ENTRY.size <= len(buffer):
+        op, length, crc = JOURNAL_ENTRY.unpack_from(buffer, offset)
+        body = buffer[offset + JOURNAL_ENTRY.size:offset + JOURNAL_ENTRY.size + length]
+        if len(body) < length or zlib.crc32(body) != crc or op not in (PUT, DELETE):
+            return
+        offset += JOURNAL_ENTRY.size + length
+
+        (count,) = LENGTH.unpack_from(body)
+        position = LENGTH.size
+        strings = []
+        for _ in range(count):
+            (string_length,) = LENGTH.unpack_from(body, position)
+            position += LENGTH.size
+            strings.append(str(body[position:position + string_length], 'utf-8'))
+            position += string_length
+        values = decode_record(body, position, strings.__getitem__) if op == PUT else None
+        yield op, strings[0], values, offset
+
+
+def convert_book(data_file_path=None):
+    """
+    Convert a pickled address book (address_book.bin and its journal) to the binary format.
+
+    :param data_file_path: Path to the address book (default is the AddressBook one).
+    :return: Number of converted contacts.
+    """
+    from models import AddressBook
+
+    book = AddressBook(data_file_path)
+    book.load_data_from_file()
+    book.storage.compact(book.data, background=False)
+    book.storage.close()
+    return len(book.data)
+
+
+if __name__ == '__main__':
+    converted = convert_book()
+    print(f'{converted} contacts converted to the binary address book format.')
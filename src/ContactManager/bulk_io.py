@@ -0,0 +1,155 @@
+from itertools import islice
+import csv
+import json
+import os
+import re
+import time
+
+from data_tools import ImportReport
+from models import ObjectValidateError, Record
+
+
+FIELDS = ['name', 'phones', 'email', 'birthday', 'address']
+FORMATS = ('csv', 'jsonl')
+# bytes which are not valid UTF-8 are read as lone surrogates, so they reject only their own row
+INVALID_TEXT = re.compile('[\udc80-\udcff]')
+
+
+def detect_format(path, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown contacts file format "{file_format}". Use one of: {", ".join(FORMATS)}')
+    return file_format
+
+
+def split_phones(phones):
+    if not phones:
+        return []
+    if isinstance(phones, str):
+        phones = phones.replace(',', ';').split(';')
+    return [phone.strip() for phone in phones if phone.strip()]
+
+
+def read_rows(path, file_format=None):
+    """
+    Stream the rows of a CSV or JSONL contacts file.
+
+    A row which cannot be read is yielded as the error, reading goes on with the next row.
+
+    :return: Generator of (row number, row dict or the error of an invalid row) tuples.
+    """
+    file_format = detect_format(path, file_format)
+    with open(path, newline='', encoding='utf-8', errors='surrogateescape') as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            # row 1 is the header
+            row_number = 1
+            while True:
+                row_number += 1
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    yield row_number, ValueError(f'Invalid CSV: {e}')
+                    continue
+                values = [value for value in row.values() if isinstance(value, str)]
+                if any(INVALID_TEXT.search(value) for value in values):
+                    yield row_number, ValueError('Row is not valid UTF-8')
+                else:
+                    yield row_number, row
+        else:
+            for row_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                if INVALID_TEXT.search(line):
+                    yield row_number, ValueError('Row is not valid UTF-8')
+                    continue
+                try:
+                    yield row_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, ValueError(f'Invalid JSON: {e}')
+
+
+def build_record(row):
+    """
+    Build a record from a row, validating it with the Field rules.
+    """
+    if isinstance(row, Exception):
+        raise ObjectValidateError(str(row))
+    if not isinstance(row, dict) or not row.get('name'):
+        raise ObjectValidateError('Name is required')
+    record = Record(row['name'], birthday=row.get('birthday') or None, email=row.get('email') or None,
+                    address=row.get('address') or None)
+    record.set_phones(split_phones(row.get('phones')))
+    return record
+
+
+def import_contacts(address_book, path, file_format=None, chunk_size=10000):
+    """
+    Import contacts from a CSV or JSONL file.
+
+    The file is read and validated in chunks, so memory does not depend on its size. Invalid
+    rows are reported without stopping the import, and the book is saved once at the end.
+
+    :param address_book: AddressBook or SqliteAddressBook to import to.
+    :param path: Path to the file.
+    :param file_format: 'csv' or 'jsonl' (default is detected by the file extension).
+    :param chunk_size: Number of rows validated at a time.
+    :return: ImportReport.
+    """
+    report = ImportReport('contacts', 'rows')
+    start = time.perf_counter()
+    rows = read_rows(path, file_format)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for row_number, row in chunk:
+                try:
+                    address_book.add_record(build_record(row))
+                except (ObjectValidateError, TypeError, AttributeError) as e:
+                    report.add_error(row_number, str(e))
+                else:
+                    report.imported += 1
+    finally:
+        # the contacts already added are saved even if reading the file fails
+        if report.imported:
+            address_book.save_data_to_file()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def record_to_row(record):
+    return {
+        'name': record.name.value,
+        'phones': record.get_phones_list(),
+        'email': record.email.value if record.email else '',
+        'birthday': record.birthday.value if record.birthday else '',
+        'address': record.address.value if record.address else '',
+    }
+
+
+def export_contacts(address_book, path, file_format=None, page_size=10000):
+    """
+    Export all contacts to a CSV or JSONL file, page by page.
+
+    :return: Number of exported contacts.
+    """
+    file_format = detect_format(path, file_format)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+        for page in address_book.iterator(page_size):
+            for record in page:
+                row = record_to_row(record)
+                if file_format == 'csv':
+                    row['phones'] = ';'.join(row['phones'])
+                    writer.writerow(row)
+                else:
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                count += 1
+    return count
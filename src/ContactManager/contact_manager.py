@@ -1,6 +1,9 @@
-from models import ObjectValidateError, AddressBook, Record, Name, Address, Phone, Email, Birthday
+from models import ObjectValidateError, AddressBook, Record, Address, Phone, Email, Birthday
 from common import CommandHandler, handle_error
 from base_view import ContactConsoleView
+from sqlite_book import SqliteAddressBook
+from bulk_io import import_contacts, export_contacts
+import os
 
 
 class UserInputHandler:
@@ -138,7 +141,7 @@ class ContactManager:
         address = self.user_input_handler.get_user_output('address', required=False)
 
         record = Record(name, email=email, birthday=birthday, address=address)
-        record.phones.extend(Phone(phone_number) for phone_number in phones)
+        record.set_phones(phones)
         self.address_book.add_record(record)
         self.address_book.save_data_to_file()
         self.view.display_message(f'Contact {name} added.Contact details: ')
@@ -161,8 +164,11 @@ class ContactManager:
             birthday = self.user_input_handler.get_user_output('birthday', required=False)
             address = self.user_input_handler.get_user_output('address', required=False)
 
-            contact.name = Name(name) if name else contact.name
-            contact.phones = [Phone(phone) for phone in phones] if phones else contact.phones
+            if name:
+                self.address_book.rename(contact.name.value, name)
+                contact = self.address_book.find(name)
+            if phones:
+                contact.set_phones(phones)
             if email:
                 contact.add_email(email)
             if birthday:
@@ -201,6 +207,18 @@ class ContactManager:
         else:
             self.view.display_error(f"Contact with the name '{name}' not found.")
 
+    @handle_error
+    def handle_find_by_phone(self):
+        """
+        Handle finding the contact which owns a phone number.
+        """
+        phone = self.view.get_input("Enter the phone number: ")
+        record = self.address_book.find_by_phone(phone)
+        if record:
+            self.view.display_contact_details(record)
+        else:
+            self.view.display_error(f"No contact with the phone '{phone}' found.")
+
     @handle_error
     def handle_search_contacts(self):
         """
@@ -226,6 +244,28 @@ class ContactManager:
         except ValueError as e:
             self.view.display_error(str(e))
 
+    @handle_error
+    def handle_import_contacts(self):
+        """
+        Handle importing contacts from a CSV or JSONL file.
+        """
+        path = self.view.get_input("Enter the path to the CSV or JSONL file: ")
+        report = import_contacts(self.address_book, path)
+        self.view.display_message(str(report))
+        for row_number, message in report.errors[:10]:
+            self.view.display_error(f'Row {row_number}: {message}')
+        if len(report.errors) > 10:
+            self.view.display_message(f'... and {len(report.errors) - 10} more rejected rows.')
+
+    @handle_error
+    def handle_export_contacts(self):
+        """
+        Handle exporting all contacts to a CSV or JSONL file.
+        """
+        path = self.view.get_input("Enter the path to the CSV or JSONL file: ")
+        count = export_contacts(self.address_book, path)
+        self.view.display_message(f'{count} contacts exported to {path}.')
+
     @handle_error
     def handle_congratulate(self):
         """
@@ -242,11 +282,7 @@ class ContactManager:
         days = self.view.get_input("Enter the number of days for congratulations: ")
         try:
             days = int(days)
-            congratulation_list = []
-
-            for record in self.address_book.data.values():
-                if record.birthday and record.is_in_range(days):
-                    congratulation_list.append(record)
+            congratulation_list = self.address_book.upcoming_birthdays(days)
 
             if congratulation_list:
                 result = f'\nCongratulations to the following contacts, whose birthday is in the next {days} days:\n'
@@ -279,6 +315,9 @@ class ContactCommandHandler(CommandHandler):
             '5': ("Search", manager.handle_search_contacts),
             '6': ("Show all contacts", manager.handle_display_all_contacts),
             '7': ("Greets", manager.handle_congratulate),
+            '8': ("Find contact by phone", manager.handle_find_by_phone),
+            '9': ("Import contacts", manager.handle_import_contacts),
+            '10': ("Export contacts", manager.handle_export_contacts),
             '0': ("Return to main menu", self.return_to_main_menu())
         }
         super().__init__(commands, view)
@@ -291,7 +330,9 @@ def run_contact_manager():
 
     program_name = "Contact Manager V0.1"
     view = ContactConsoleView()
-    address_book = AddressBook()
+    # the SQLite book is used once the address_book.bin one has been migrated with sqlite_book.py
+    sqlite_book = SqliteAddressBook()
+    address_book = sqlite_book if os.path.exists(sqlite_book.db_path) else AddressBook()
     address_book.load_data_from_file()
     manager = ContactManager(address_book, view)
     contact_command_handler = ContactCommandHandler(manager, view)
@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from heapq import merge
+import calendar
+
+
+def celebration_date(year, month, day):
+    """
+    Return the date the birthday is celebrated in the year, 29th of February falls on 28th in non-leap years.
+    """
+    if month == 2 and day == 29 and not calendar.isleap(year):
+        day = 28
+    return date(year, month, day)
+
+
+class BirthdayIndex:
+    """
+    Day-of-year bucketed birthday calendar.
+
+    Birthdays are kept in 366 buckets, one per day of a leap year, so the birthdays in the
+    next N days are collected from at most 366 buckets whatever the size of the book.
+    Results of the latest query date are cached until the next change of the index.
+    """
+
+    BUCKETS = 366
+    # number of `days` values cached for the query date
+    CACHE_SIZE = 16
+    # days before each month in a leap year, indexed by month number
+    DAYS_BEFORE_MONTH = (0, 0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+
+    def __init__(self):
+        # every bucket is a sorted list of keys, so contacts born on the same day can be paged by key
+        self.buckets = [[] for _ in range(self.BUCKETS)]
+        self.keys_buckets = {}
+        # days -> result for _cache_date, so the cache never outlives the day it was computed for
+        self._cache = {}
+        self._cache_date = None
+
+    @classmethod
+    def bucket(cls, month, day):
+        return cls.DAYS_BEFORE_MONTH[month] + day - 1
+
+    def add(self, key, bucket):
+        self.remove(key)
+        insort(self.buckets[bucket], key)
+        self.keys_buckets[key] = bucket
+        self._cache.clear()
+
+    def remove(self, key):
+        bucket = self.keys_buckets.pop(key, None)
+        if bucket is not None:
+            keys = self.buckets[bucket]
+            del keys[bisect_left(keys, key)]
+            self._cache.clear()
+
+    def upcoming(self, days, today=None):
+        """
+        Return the keys which birthdays are celebrated in the next `days` days, today included.
+
+        :param days: Number of days to look ahead.
+        :param today: Date the range starts from (default is today).
+        :return: List of (celebration date, key) tuples ordered by date.
+        """
+        today = today or date.today()
+        if today != self._cache_date:
+            self._cache.clear()
+            self._cache_date = today
+        result = self._cache.get(days)
+        if result is None:
+            if len(self._cache) >= self.CACHE_SIZE:
+                # the oldest entry goes first
+                del self._cache[next(iter(self._cache))]
+            result = self._cache[days] = self._collect(days, today)
+        return result
+
+    @classmethod
+    def window(cls, days, today):
+        """
+        Yield every date of the next `days` days with the buckets of the birthdays celebrated on it.
+
+        A bucket is yielded once only, on its first date in the window.
+        """
+        leap_day = cls.bucket(2, 29)
+        seen = set()
+        for offset in range(min(days, cls.BUCKETS) + 1):
+            current = today + timedelta(days=offset)
+            buckets = [cls.bucket(current.month, current.day)]
+            if current.month == 2 and current.day == 28 and not calendar.isleap(current.year):
+                buckets.append(leap_day)
+            buckets = [bucket for bucket in buckets if bucket not in seen]
+            seen.update(buckets)
+            yield current, buckets
+
+    def _collect(self, days, today):
+        found = []
+        for current, buckets in self.window(days, today):
+            found.extend((current, key) for key in merge(*(self.buckets[bucket] for bucket in buckets)))
+        return found
+
+    def ordered(self, today, after=None):
+        """
+        Yield all the keys ordered by their next birthday from `today`, then by key.
+
+        :param today: Date the order starts from.
+        :param after: (offset in days, key) to resume after, as yielded before.
+        :return: Generator of (offset in days, key) tuples.
+        """
+        after_offset, after_key = after or (0, None)
+        for offset, (_, buckets) in enumerate(self.window(self.BUCKETS - 1, today)):
+            if offset < after_offset:
+                continue
+            keys = []
+            for bucket in buckets:
+                bucket_keys = self.buckets[bucket]
+                resumed = offset == after_offset and after_key is not None
+                start = bisect_right(bucket_keys, after_key) if resumed else 0
+                keys.append(map(bucket_keys.__getitem__, range(start, len(bucket_keys))))
+            for key in merge(*keys):
+                yield offset, key
+
+
+class PhoneIndex:
+    """
+    Hash index from a phone number to the key of the contact which owns it.
+    """
+
+    def __init__(self):
+        self.owners = {}
+        self.keys_phones = {}
+
+    def add(self, key, phones):
+        self.remove(key)
+        for phone in phones:
+            # a phone loaded from an old book may belong to several contacts, the first one keeps it
+            self.owners.setdefault(phone, key)
+        self.keys_phones[key] = list(phones)
+
+    def remove(self, key):
+        for phone in self.keys_phones.pop(key, ()):
+            if self.owners.get(phone) == key:
+                del self.owners[phone]
+
+    def find(self, phone):
+        return self.owners.get(phone)
@@ -1,9 +1,16 @@
-from datetime import datetime
+from datetime import datetime, date
+from bisect import bisect_left, bisect_right
 from collections import UserDict
 from itertools import islice
+from array import array
 import os
-import pickle
 import re
+import sys
+
+from binary_format import LazyRecords, record_values
+from data_tools import NgramIndex
+from indexes import BirthdayIndex, PhoneIndex, celebration_date
+from storage import JournalStorage
 
 
 class ObjectValidateError(Exception):
@@ -11,12 +18,45 @@ class ObjectValidateError(Exception):
         super().__init__(message)
 
 
+def normalize_phone(phone):
+    """
+    Keep the digits of a phone number only, so "(012) 345-67-89" is found as "0123456789".
+    """
+    return ''.join(symbol for symbol in phone if symbol.isdigit())
+
+
 class Field:
+    # fields hold no __dict__, a book of a million contacts holds several million of them
+    __slots__ = ('__value',)
+    # repeating strings (names, addresses) are interned to be stored once
+    interned = False
+
     def __init__(self, value):
         valid, msg = self.is_valid(value)
         if not valid:
             raise ObjectValidateError(msg)
-        self.__value = value
+        self.__value = sys.intern(value) if self.interned else value
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self._slots() if hasattr(self, slot)}
+
+    def __setstate__(self, state):
+        # books saved before __slots__ store the state as __dict__ with the same mangled names
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        slots = self._slots()
+        for slot, value in state.items():
+            if slot in slots:
+                object.__setattr__(self, slot, value)
+
+    @classmethod
+    def _slots(cls):
+        slots = cls.__dict__.get('_mangled_slots')
+        if slots is None:
+            slots = {f'_{klass.__name__}{slot}' if slot.startswith('__') else slot
+                     for klass in cls.__mro__ for slot in getattr(klass, '__slots__', ())}
+            cls._mangled_slots = slots
+        return slots
 
     @property
     def value(self):
@@ -27,7 +67,7 @@ class Field:
         valid, msg = self.is_valid(value)
         if not valid:
             raise ObjectValidateError(msg)
-        self.__value = value
+        self.__value = sys.intern(value) if self.interned else value
 
     def is_valid(self, new_value):
         return True, None
@@ -43,21 +83,28 @@ class Field:
 
 
 class Name(Field):
+    __slots__ = ()
+    interned = True
+
     def __init__(self, name):
         super().__init__(name)
 
 
 class Phone(Field):
+    __slots__ = ()
+
     def __init__(self, phone):
         super().__init__(phone)
 
     def is_valid(self, phone):
-        if not phone.isdigit() or len(phone) != 10:
+        if not phone.isascii() or not phone.isdigit() or len(phone) != 10:
             return False, f'Invalid phone number "{phone}"! Must be contain 10 digits only'
         return True, None
 
 
 class Email(Field):
+    __slots__ = ()
+
     def __init__(self, email):
         super().__init__(email)
 
@@ -68,23 +115,62 @@ class Email(Field):
 
 
 class Birthday(Field):
+    __slots__ = ('__date', '__ordinal')
+
     def __init__(self, birthday):
         super().__init__(birthday)
-        self.__value = datetime.strptime(birthday, "%d.%m.%Y") if birthday else None
 
-    def is_valid(self, birthday):
+    def __setstate__(self, state):
+        # books saved before the parsed date was cached have to be parsed again
+        super().__setstate__(state)
+        self.is_valid(self.value)
+
+    @staticmethod
+    def parse(birthday):
+        """
+        Parse a dd.mm.yyyy birthday, return None if it is not valid.
+
+        Zero-padded dates are parsed by hand, the rest of the formats strptime accepts are left to it.
+        """
+        if (len(birthday) == 10 and birthday[2] == '.' and birthday[5] == '.'
+                and birthday[:2].isdigit() and birthday[3:5].isdigit() and birthday[6:].isdigit()):
+            try:
+                return date(int(birthday[6:]), int(birthday[3:5]), int(birthday[:2]))
+            except ValueError:
+                return None
         try:
-            datetime.strptime(birthday, "%d.%m.%Y")
-        except ValueError:
+            return datetime.strptime(birthday, "%d.%m.%Y").date()
+        except (ValueError, TypeError):
+            return None
+
+    def is_valid(self, birthday):
+        parsed = self.parse(birthday)
+        if parsed is None:
             return False, f'Invalid birthday "{birthday}". Right birthday forman dd.mm.yyyy'
-        else:
-            return True, None
+        # the birthday is parsed only once, here, both on creation and on a value change
+        self.__date = parsed
+        self.__ordinal = BirthdayIndex.bucket(parsed.month, parsed.day)
+        return True, None
+
+    @property
+    def date(self):
+        return self.__date
+
+    @property
+    def ordinal(self):
+        """
+        Day of a leap year the birthday falls on, counting from 0.
+        """
+        return self.__ordinal
 
     def __str__(self):
-        return self.__value.strftime("%d.%m.%Y") if self.__value else ""
+        return f"{self.__date.day:02d}.{self.__date.month:02d}.{self.__date.year:04d}"
 
 
 class Address(Field):
+    __slots__ = ()
+    interned = True
+
     def __init__(self, address):
         super().__init__(address)
 
@@ -95,71 +181,135 @@ class Address(Field):
 
 
 class Record:
+    __slots__ = ('name', '_phones', 'birthday', 'email', 'address', '_book')
+
     def __init__(self, name, birthday=None, email=None, address=None):
         self.name = Name(name)
-        self.phones = []
+        # phones are validated as 10 digits, so they are packed as integers
+        self._phones = array('Q')
         self.birthday = Birthday(birthday) if birthday else None
         self.email = Email(email) if email else None
         self.address = Address(address) if address else None
+        self._book = None
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != '_book'}
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        # books saved before __slots__ keep the phones as a list of Phone objects
+        if 'phones' in state:
+            state['_phones'] = array('Q', (int(phone.value) for phone in state.pop('phones')))
+        for slot in self.__slots__:
+            setattr(self, slot, state.get(slot))
+        self._book = None
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Build a record from the plain values stored in the address book file, validating them.
+        """
+        name, phones, email, birthday, _, address = values
+        record = cls(name, birthday=birthday, email=email, address=address)
+        if any(phone >= 10 ** 10 for phone in phones):
+            raise ObjectValidateError(f'Invalid phone number in contact {name}')
+        record._phones = array('Q', phones)
+        return record
+
+    @property
+    def phones(self):
+        # a tuple, as changing a copy of the packed phones would not change the record
+        return tuple(Phone(phone) for phone in self.get_phones_list())
+
+    @phones.setter
+    def phones(self, phones):
+        self._phones = array('Q', (int(phone.value) for phone in phones))
+
+    def _changed(self):
+        # let the address book know that the record has to be written on the next save
+        if self._book is not None:
+            self._book.record_changed(self)
+
+    def _check_phones(self, phones):
+        # phones must be unique across the address book
+        if self._book is not None:
+            self._book.check_phones(self, phones)
 
     def add_phone(self, phone):
         if phone not in self.get_phones_list():
             new_phone = Phone(phone)
-            self.phones.append(new_phone)
+            self._check_phones([phone])
+            self._phones.append(int(new_phone.value))
+            self._changed()
 
     def remove_phone(self, phone):
         phone_index = self.get_phones_list().index(phone)
-        del self.phones[phone_index]
+        del self._phones[phone_index]
+        self._changed()
+
+    def set_phones(self, phones):
+        new_phones = [Phone(phone) for phone in phones]
+        self._check_phones(phones)
+        self.phones = new_phones
+        self._changed()
 
     def edit_phone(self, old_phone, new_phone):
+        if new_phone != old_phone:
+            Phone(new_phone)
+            self._check_phones([new_phone])
         self.remove_phone(old_phone)
         self.add_phone(new_phone)
 
     def find_phone(self, desired_phone_number):
-        for phone in self.phones:
-            if phone.value == desired_phone_number:
-                return phone
+        if desired_phone_number in self.get_phones_list():
+            return Phone(desired_phone_number)
 
     def get_phones_list(self) -> list:
-        return [phone.value for phone in self.phones]
+        return [f'{phone:010d}' for phone in self._phones]
 
     def add_email(self, email):
         if not self.email:
             self.email = Email(email)
+            self._changed()
         else:
             raise ObjectValidateError('Email already exist for this contact')
 
     def remove_email(self):
         self.email = None
+        self._changed()
 
     def add_address(self, address):
         if not self.address:
             self.address = Address(address)
+            self._changed()
         else:
             raise ObjectValidateError('Address already exist for this contact')
 
     def remove_address(self):
         self.address = None
+        self._changed()
 
     def set_birthday(self, birthday):
         self.birthday = Birthday(birthday)
+        self._changed()
 
-    def days_to_birthday(self):
+    def days_to_birthday(self, today=None):
         if not self.birthday:
             return
-        birthday = datetime.strptime(self.birthday.value, "%d.%m.%Y")
-        now = datetime.now()
-        next_birthday = datetime(now.year, birthday.month, birthday.day)
-        if next_birthday < now:
-            next_birthday = datetime(now.year + 1, birthday.month, birthday.day)
-        return (next_birthday - now).days
+        birthday = self.birthday.date
+        today = today or date.today()
+        next_birthday = celebration_date(today.year, birthday.month, birthday.day)
+        if next_birthday < today:
+            next_birthday = celebration_date(today.year + 1, birthday.month, birthday.day)
+        return (next_birthday - today).days
 
     def is_in_range(self, n):
         days_to_birthday = self.days_to_birthday()
         return 0 <= days_to_birthday <= n
 
     def __str__(self):
-        text_view = f"Contact name: {self.name.value}\nPhones: {', '.join(p.value for p in self.phones)}"
+        text_view = f"Contact name: {self.name.value}\nPhones: {', '.join(self.get_phones_list())}"
 
         if self.email:
             text_view += f'\nEmail: {self.email.value}'
@@ -176,44 +326,105 @@ class Record:
 
 
 class AddressBook(UserDict):
-    def __init__(self):
+    def __init__(self, data_file_path=None):
         super().__init__()
 
         self.data_file_name = 'address_book.bin'
         self.current_directory = os.path.dirname(os.path.abspath(__file__))
         self.data_file_path = os.path.join(self.current_directory, self.data_file_name)
+        if data_file_path:
+            self.data_file_path = os.path.abspath(data_file_path)
+            self.current_directory, self.data_file_name = os.path.split(self.data_file_path)
+        self.storage = JournalStorage(self.data_file_path, self._restore_record)
+        # names of the contacts changed since the last save, in the order they changed
+        self._dirty = {}
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        self.search_index = NgramIndex()
+        self.phone_index = PhoneIndex()
+        self.birthday_index = BirthdayIndex()
+        # after a load the search, phone and birthday indexes are built on their first use
+        self._indexed = True
+        # insertion positions of the contacts, search results keep the order of the book
+        self._positions = {}
+        self._next_position = 0
+        # sorted keys of the paging orders: insertion positions and names
+        self._ordered_positions = []
+        self._position_names = {}
+        self._sorted_names = []
+        # names added since the names were sorted last, merged in on the next use
+        self._unsorted_names = []
 
     def save_data_to_file(self):
+        """
+        Append the contacts changed since the last save to the journal.
+
+        Every save costs the size of the changed records only, the full book is rewritten
+        by the storage compaction in the background once the journal grows big enough.
+        """
         if not os.access(self.current_directory, os.W_OK):
             raise PermissionError(f"Cannot write to: {self.data_file_path}")
 
-        file_path = os.path.join(self.current_directory, self.data_file_name)
-        with open(file_path, 'wb') as file:
-            pickle.dump(self.data, file)
+        if self.storage.should_snapshot(len(self._dirty), len(self.data)):
+            # most of the book has changed (a bulk import), write the snapshot instead of the journal
+            self._dirty.clear()
+            self.storage.compact(self.data, background=False)
+            return
+
+        for name in self._dirty:
+            record = self.data.get(name)
+            if record is None:
+                self.storage.append(JournalStorage.DELETE, name)
+            else:
+                self.storage.append(JournalStorage.PUT, name, record)
+        self._dirty.clear()
+        self.storage.flush()
+
+        if self.storage.needs_compaction(len(self.data)):
+            self.storage.compact(self.data)
 
     def load_data_from_file(self):
+        """
+        Load the book.
+
+        Records of the binary book file are built on their first access, and the indexes on
+        their first use, so loading costs only reading the contact names.
+        """
         # check for file exists and read access rights
-        if os.path.exists(self.data_file_path) and os.access(self.current_directory, os.R_OK):
-            with open(self.data_file_path, 'rb') as file:
-                # check loading data
-                loaded_data = pickle.load(file)
-                for name, record in loaded_data.items():
-                    if isinstance(record, Record) and self.validate_record(record):
-                        self.add_record(record)
-                    else:
+        if os.access(self.current_directory, os.R_OK):
+            loaded_data = self.storage.load()
+            if not isinstance(loaded_data, LazyRecords):
+                # check loading data, a book pickled by an older version may hold anything
+                for record in loaded_data.values():
+                    if not (isinstance(record, Record) and self.validate_record(record)):
                         # if at least one error is found, then return an empty AddressBook.
                         self.data = {}
+                        self._reset_indexes()
                         return
+                    record._book = self
+            self.data = loaded_data
+            self._reset_indexes()
+            for name in self.data:
+                self._add_position(name)
+            self._indexed = False
+            if self.storage.legacy and os.access(self.current_directory, os.W_OK):
+                # the pickled files are rewritten at once, so the journal never mixes the two formats
+                self.storage.compact(self.data, background=False)
         else:
             self.data = {}
 
+    def _restore_record(self, values):
+        record = Record.from_values(values)
+        record._book = self
+        return record
+
     @staticmethod
     def validate_record(record):
         if not isinstance(record.name, Name):
             return False
-        for phone in record.phones:
-            if not isinstance(phone, Phone):
-                return False
+        if not isinstance(record._phones, array):
+            return False
         if record.email and not isinstance(record.email, Email):
             return False
         if record.birthday:
@@ -223,29 +434,178 @@ class AddressBook(UserDict):
             return False
         return True
 
+    @staticmethod
+    def _search_texts(values):
+        name, phones = values[:2]
+        return name.lower(), ' '.join(f'{phone:010d}' for phone in phones)
+
+    def _values(self, name):
+        # the stored values of a contact, read without building its record if it is not built yet
+        if isinstance(self.data, LazyRecords):
+            return self.data.values_of(name)
+        return record_values(self.data[name])
+
+    def _add_position(self, name):
+        if name not in self._positions:
+            position = self._next_position
+            self._next_position += 1
+            self._positions[name] = position
+            self._position_names[position] = name
+            self._ordered_positions.append(position)
+            self._unsorted_names.append(name)
+
+    def _index(self, record):
+        self._add_position(record.name.value)
+        if self._indexed:
+            self._index_values(record_values(record))
+
+    def _index_values(self, values):
+        name, phones, _, _, ordinal, _ = values
+        self.search_index.add(name, *self._search_texts(values))
+        self.phone_index.add(name, [f'{phone:010d}' for phone in phones])
+        if ordinal is not None:
+            self.birthday_index.add(name, ordinal)
+        else:
+            self.birthday_index.remove(name)
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self._indexed = True
+            for name in self.data:
+                self._index_values(self._values(name))
+
+    def _unindex(self, name):
+        position = self._positions.pop(name, None)
+        if position is not None:
+            del self._position_names[position]
+            del self._ordered_positions[bisect_left(self._ordered_positions, position)]
+            sorted_names = self._get_sorted_names()
+            del sorted_names[bisect_left(sorted_names, name)]
+        self.search_index.remove(name)
+        self.phone_index.remove(name)
+        self.birthday_index.remove(name)
+
+    def _get_sorted_names(self):
+        # a bulk of added names is sorted at once instead of inserting every name into the list
+        if self._unsorted_names:
+            self._sorted_names.extend(self._unsorted_names)
+            self._sorted_names.sort()
+            self._unsorted_names = []
+        return self._sorted_names
+
+    def _attach(self, record):
+        self.data[record.name.value] = record
+        record._book = self
+        self._index(record)
+
+    def record_changed(self, record):
+        self._dirty[record.name.value] = None
+        self._index(record)
+
+    def check_phones(self, record, phones):
+        self._ensure_indexes()
+        for phone in phones:
+            owner = self.phone_index.find(normalize_phone(phone))
+            if owner is not None and owner != record.name.value:
+                raise ObjectValidateError(f'Phone {phone} already belongs to contact {owner}')
+
     def add_record(self, record):
         if record.name.value in self.data:
             raise ObjectValidateError(f'Contact with name {record.name.value} already exist. Try with another one')
-        self.data[record.name.value] = record
+        self.check_phones(record, record.get_phones_list())
+        self._attach(record)
+        self._dirty[record.name.value] = None
+
+    def rename(self, old_name, new_name):
+        # the contact keeps its name and its place, an edit may enter the current name again
+        if old_name == new_name:
+            return
+        if new_name in self.data:
+            raise ObjectValidateError(f'Contact with name {new_name} already exist. Try with another one')
+        record = self.data.pop(old_name)
+        self._unindex(old_name)
+        record.name = Name(new_name)
+        self._attach(record)
+        self._dirty.update(dict.fromkeys((old_name, new_name)))
 
     def delete(self, name):
         if name in self.data:
+            self.data[name]._book = None
             del self.data[name]
+            self._unindex(name)
+            self._dirty[name] = None
 
     def find(self, name):
         return self.data.get(name, None)
 
+    def find_by_phone(self, phone):
+        """
+        Return the contact which owns the phone number, or None.
+        """
+        self._ensure_indexes()
+        name = self.phone_index.find(normalize_phone(phone))
+        return self.data[name] if name is not None else None
+
     def search_full(self, query):
-        found_records = []
         query = query.lower().strip()
-
-        for record in self.data.values():
-            if query in record.name.value.lower() or query in ' '.join(record.get_phones_list()):
-                found_records.append(record)
-
-        return found_records
-
-    def iterator(self, page_size=10):
-        keys = list(self.data.keys())
-        for i in range(0, len(keys), page_size):
-            yield [self.data[key] for key in islice(keys, i, i + page_size)]
+        if not query:
+            return list(self.data.values())
+
+        self._ensure_indexes()
+        names = self.search_index.candidates(query)
+        if not self.search_index.is_exact(query):
+            names = [name for name in names if self._matches(self._values(name), query)]
+        return [self.data[name] for name in sorted(names, key=self._positions.__getitem__)]
+
+    def upcoming_birthdays(self, days, today=None):
+        """
+        Return the contacts which birthdays are in the next `days` days, ordered by the birthday date.
+        """
+        self._ensure_indexes()
+        return [self.data[name] for _, name in self.birthday_index.upcoming(days, today)]
+
+    def _matches(self, values, query):
+        name, phones = self._search_texts(values)
+        return query in name or query in phones
+
+    def page(self, page_size=10, order='insertion', cursor=None):
+        """
+        Return a page of contacts and the cursor of the next page.
+
+        Pages are found by the cursor (the last key of the previous page), not by an offset,
+        so every page costs O(page_size) and paging stays stable while the book changes.
+
+        :param page_size: Number of contacts on the page.
+        :param order: 'insertion', 'name' or 'birthday' (contacts with a birthday only, by the next birthday).
+        :param cursor: Cursor returned with the previous page, None for the first page.
+        :return: Tuple of the list of records and the cursor of the next page (None after the last page).
+        """
+        if order == 'insertion':
+            start = bisect_right(self._ordered_positions, cursor) if cursor is not None else 0
+            positions = self._ordered_positions[start:start + page_size]
+            names = [self._position_names[position] for position in positions]
+            next_cursor = positions[-1] if positions else None
+        elif order == 'name':
+            sorted_names = self._get_sorted_names()
+            start = bisect_right(sorted_names, cursor) if cursor is not None else 0
+            names = sorted_names[start:start + page_size]
+            next_cursor = names[-1] if names else None
+        elif order == 'birthday':
+            self._ensure_indexes()
+            today, after = cursor if cursor is not None else (date.today(), None)
+            found = list(islice(self.birthday_index.ordered(today, after), page_size))
+            names = [name for _, name in found]
+            next_cursor = (today, found[-1]) if found else None
+        else:
+            raise ValueError(f'Unknown contacts order "{order}"')
+        if len(names) < page_size:
+            next_cursor = None
+        return [self.data[name] for name in names], next_cursor
+
+    def iterator(self, page_size=10, order='insertion', cursor=None):
+        while True:
+            records, cursor = self.page(page_size, order, cursor)
+            if records:
+                yield records
+            if cursor is None:
+                return
@@ -0,0 +1,338 @@
+from array import array
+from collections.abc import Mapping
+from datetime import date
+import os
+import sqlite3
+
+from indexes import BirthdayIndex
+from models import ObjectValidateError, AddressBook, Record, normalize_phone
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    name_lower TEXT NOT NULL,
+    phones_text TEXT NOT NULL DEFAULT '',
+    email TEXT,
+    birthday TEXT,
+    birthday_ordinal INTEGER,
+    address TEXT
+);
+CREATE TABLE IF NOT EXISTS phones (
+    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    phone TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones(phone);
+CREATE INDEX IF NOT EXISTS phones_record ON phones(record_id);
+CREATE INDEX IF NOT EXISTS records_birthday ON records(birthday_ordinal, name);
+'''
+
+# substring index of the names and phones, kept in sync with the records by the triggers
+SEARCH_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS records_search USING fts5(
+    name_lower, phones_text, content='records', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS records_search_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_search (rowid, name_lower, phones_text) VALUES (new.id, new.name_lower, new.phones_text);
+END;
+CREATE TRIGGER IF NOT EXISTS records_search_delete AFTER DELETE ON records BEGIN
+    INSERT INTO records_search (records_search, rowid, name_lower, phones_text)
+    VALUES ('delete', old.id, old.name_lower, old.phones_text);
+END;
+CREATE TRIGGER IF NOT EXISTS records_search_update AFTER UPDATE OF name_lower, phones_text ON records BEGIN
+    INSERT INTO records_search (records_search, rowid, name_lower, phones_text)
+    VALUES ('delete', old.id, old.name_lower, old.phones_text);
+    INSERT INTO records_search (rowid, name_lower, phones_text) VALUES (new.id, new.name_lower, new.phones_text);
+END;
+'''
+# shorter queries have no trigram to look up
+TRIGRAM_LENGTH = 3
+
+RECORD_COLUMNS = 'name, phones_text, email, birthday, address'
+
+
+class SqliteRecords(Mapping):
+    """
+    Read-only dict-like view of the records stored in the database, records are read on access.
+    """
+    def __init__(self, book):
+        self.book = book
+
+    def __getitem__(self, name):
+        record = self.book.find(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def __iter__(self):
+        for (name,) in self.book.connection.execute('SELECT name FROM records ORDER BY id'):
+            yield name
+
+    def __len__(self):
+        return self.book.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def __bool__(self):
+        # COUNT(*) reads the whole table, an emptiness check needs one row at most
+        return bool(self.book.connection.execute('SELECT EXISTS (SELECT 1 FROM records LIMIT 1)').fetchone()[0])
+
+    def __contains__(self, name):
+        return self.book.connection.execute('SELECT 1 FROM records WHERE name = ?', (name,)).fetchone() is not None
+
+    def values(self):
+        return self.book.all_records()
+
+
+class SqliteAddressBook:
+    """
+    Address book stored in an SQLite database.
+
+    Nothing is read at startup, every lookup is an indexed SQL query, so the book does not
+    have to fit in memory. It has the same interface as AddressBook.
+    """
+    def __init__(self, db_path=None):
+        """
+        Initialize SqliteAddressBook.
+
+        :param db_path: Path to the database file (default is address_book.db next to this module).
+        """
+        self.current_directory = os.path.dirname(os.path.abspath(__file__))
+        self.db_path = db_path or os.path.join(self.current_directory, 'address_book.db')
+        self.connection = None
+        self.trigram_search = False
+        self.data = SqliteRecords(self)
+
+    def load_data_from_file(self):
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript(SCHEMA)
+        self.trigram_search = self._create_search_index()
+
+    def _create_search_index(self):
+        # the trigram tokenizer needs SQLite 3.34 built with FTS5, search_full scans without it
+        exists = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'records_search'").fetchone() is not None
+        try:
+            self.connection.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        if not exists:
+            # the records of a database created before the index
+            self.connection.execute("INSERT INTO records_search (records_search) VALUES ('rebuild')")
+            self.connection.commit()
+        return True
+
+    def save_data_to_file(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def _build_record(self, row):
+        name, phones_text, email, birthday, address = row
+        record = Record(name, birthday=birthday, email=email, address=address)
+        record._phones = array('Q', (int(phone) for phone in phones_text.split()))
+        record._book = self
+        return record
+
+    @staticmethod
+    def _row(record):
+        return (record.name.value, record.name.value.lower(), ' '.join(record.get_phones_list()),
+                record.email.value if record.email else None,
+                record.birthday.value if record.birthday else None,
+                record.birthday.ordinal if record.birthday else None,
+                record.address.value if record.address else None)
+
+    def _write_phones(self, record_id, record):
+        self.connection.execute('DELETE FROM phones WHERE record_id = ?', (record_id,))
+        self.connection.executemany('INSERT INTO phones (record_id, phone) VALUES (?, ?)',
+                                    ((record_id, phone) for phone in record.get_phones_list()))
+
+    def _phone_owner(self, phone):
+        row = self.connection.execute(
+            'SELECT records.name FROM phones JOIN records ON records.id = phones.record_id '
+            'WHERE phones.phone = ? LIMIT 1', (normalize_phone(phone),)).fetchone()
+        return row[0] if row else None
+
+    def check_phones(self, record, phones):
+        for phone in phones:
+            owner = self._phone_owner(phone)
+            if owner is not None and owner != record.name.value:
+                raise ObjectValidateError(f'Phone {phone} already belongs to contact {owner}')
+
+    def add_record(self, record):
+        if record.name.value in self.data:
+            raise ObjectValidateError(f'Contact with name {record.name.value} already exist. Try with another one')
+        self.check_phones(record, record.get_phones_list())
+        try:
+            cursor = self.connection.execute(
+                'INSERT INTO records (name, name_lower, phones_text, email, birthday, birthday_ordinal, address) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', self._row(record))
+        except sqlite3.IntegrityError:
+            raise ObjectValidateError(f'Contact with name {record.name.value} already exist. Try with another one')
+        self._write_phones(cursor.lastrowid, record)
+        record._book = self
+
+    def record_changed(self, record):
+        row = self._row(record)
+        self.connection.execute(
+            'UPDATE records SET name_lower = ?, phones_text = ?, email = ?, birthday = ?, birthday_ordinal = ?, '
+            'address = ? WHERE name = ?', row[1:] + row[:1])
+        record_id = self._record_id(record.name.value)
+        if record_id is not None:
+            self._write_phones(record_id, record)
+
+    def _record_id(self, name):
+        row = self.connection.execute('SELECT id FROM records WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def rename(self, old_name, new_name):
+        # the contact keeps its name, an edit may enter the current name again
+        if old_name == new_name:
+            return
+        if new_name in self.data:
+            raise ObjectValidateError(f'Contact with name {new_name} already exist. Try with another one')
+        self.connection.execute('UPDATE records SET name = ?, name_lower = ? WHERE name = ?',
+                                (new_name, new_name.lower(), old_name))
+
+    def delete(self, name):
+        self.connection.execute('DELETE FROM records WHERE name = ?', (name,))
+
+    def find(self, name):
+        row = self.connection.execute(f'SELECT {RECORD_COLUMNS} FROM records WHERE name = ?', (name,)).fetchone()
+        return self._build_record(row) if row else None
+
+    def find_by_phone(self, phone):
+        """
+        Return the contact which owns the phone number, or None.
+        """
+        name = self._phone_owner(phone)
+        return self.find(name) if name is not None else None
+
+    def all_records(self):
+        for row in self.connection.execute(f'SELECT {RECORD_COLUMNS} FROM records ORDER BY id'):
+            yield self._build_record(row)
+
+    def search_full(self, query):
+        """
+        Return the contacts which name or phones contain the query, in the order they were added.
+
+        Queries of at least 3 characters are looked up in the FTS5 trigram index. Shorter ones, and
+        all queries on SQLite builds without the trigram tokenizer, are a linear scan of the records.
+        """
+        query = query.lower().strip()
+        if not query:
+            return list(self.all_records())
+        if self.trigram_search and len(query) >= TRIGRAM_LENGTH:
+            # a quoted phrase of the trigram tokenizer matches the query as a substring
+            rows = self.connection.execute(
+                f'SELECT {RECORD_COLUMNS} FROM records WHERE id IN '
+                '(SELECT rowid FROM records_search WHERE records_search MATCH ?) ORDER BY id',
+                ('"' + query.replace('"', '""') + '"',))
+        else:
+            rows = self.connection.execute(
+                f'SELECT {RECORD_COLUMNS} FROM records '
+                'WHERE instr(name_lower, ?) > 0 OR instr(phones_text, ?) > 0 ORDER BY id', (query, query))
+        return [self._build_record(row) for row in rows]
+
+    def upcoming_birthdays(self, days, today=None):
+        """
+        Return the contacts which birthdays are in the next `days` days, ordered by the birthday date.
+        """
+        today = today or date.today()
+        # the first date in the window every bucket is celebrated on
+        bucket_dates = {}
+        for current, buckets in BirthdayIndex.window(days, today):
+            for bucket in buckets:
+                bucket_dates.setdefault(bucket, current)
+        if not bucket_dates:
+            return []
+        placeholders = ', '.join('?' * len(bucket_dates))
+        rows = self.connection.execute(
+            f'SELECT birthday_ordinal, {RECORD_COLUMNS} FROM records WHERE birthday_ordinal IN ({placeholders})',
+            list(bucket_dates))
+        found = sorted(rows, key=lambda row: (bucket_dates[row[0]], row[1]))
+        return [self._build_record(row[1:]) for row in found]
+
+    def page(self, page_size=10, order='insertion', cursor=None):
+        """
+        Return a page of contacts and the cursor of the next page, see AddressBook.page.
+        """
+        if order == 'insertion':
+            rows = self.connection.execute(
+                f'SELECT id, {RECORD_COLUMNS} FROM records WHERE id > ? ORDER BY id LIMIT ?',
+                (cursor or 0, page_size)).fetchall()
+            next_cursor = rows[-1][0] if rows else None
+        elif order == 'name':
+            rows = self.connection.execute(
+                f'SELECT name, {RECORD_COLUMNS} FROM records WHERE name > ? ORDER BY name LIMIT ?',
+                (cursor if cursor is not None else '', page_size)).fetchall()
+            next_cursor = rows[-1][0] if rows else None
+        elif order == 'birthday':
+            rows, next_cursor = self._birthday_page(page_size, cursor)
+        else:
+            raise ValueError(f'Unknown contacts order "{order}"')
+        if len(rows) < page_size:
+            next_cursor = None
+        return [self._build_record(row[1:]) for row in rows], next_cursor
+
+    def _birthday_page(self, page_size, cursor):
+        today, after = cursor if cursor is not None else (date.today(), None)
+        after_offset, after_name = after or (0, None)
+        rows = []
+        last = None
+        for offset, (_, buckets) in enumerate(BirthdayIndex.window(BirthdayIndex.BUCKETS - 1, today)):
+            if offset < after_offset or not buckets:
+                continue
+            resumed = offset == after_offset and after_name is not None
+            placeholders = ', '.join('?' * len(buckets))
+            found = self.connection.execute(
+                f'SELECT name, {RECORD_COLUMNS} FROM records WHERE birthday_ordinal IN ({placeholders}) '
+                'AND name > ? ORDER BY name LIMIT ?',
+                buckets + [after_name if resumed else '', page_size - len(rows)]).fetchall()
+            if found:
+                rows.extend(found)
+                last = (offset, found[-1][0])
+            if len(rows) == page_size:
+                break
+        return rows, (today, last) if last else None
+
+    def iterator(self, page_size=10, order='insertion', cursor=None):
+        while True:
+            records, cursor = self.page(page_size, order, cursor)
+            if records:
+                yield records
+            if cursor is None:
+                return
+
+
+def migrate_from_pickle(bin_path=None, db_path=None):
+    """
+    Import the contacts of an address book file (address_book.bin and its journal) into an SQLite book.
+
+    :param bin_path: Path to the address book file, binary or pickled (default is the AddressBook one).
+    :param db_path: Path to the database (default is the SqliteAddressBook one).
+    :return: Number of imported contacts.
+    """
+    source = AddressBook(bin_path)
+    source.load_data_from_file()
+
+    target = SqliteAddressBook(db_path)
+    target.load_data_from_file()
+    count = 0
+    for record in source.data.values():
+        try:
+            target.add_record(record)
+        except ObjectValidateError:
+            # already imported, or one of its phones belongs to another contact
+            continue
+        count += 1
+    target.close()
+    return count
+
+
+if __name__ == '__main__':
+    imported = migrate_from_pickle()
+    print(f'{imported} contacts imported to the SQLite address book.')
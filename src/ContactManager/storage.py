@@ -0,0 +1,181 @@
+import io
+import os
+import pickle
+import shutil
+import threading
+
+from binary_format import (PUT, DELETE, BookFile, LazyRecords, decode_journal, encode_journal_entry, is_book_file,
+                           record_values, snapshot_values, write_book)
+from data_tools import CompactionPolicy
+
+
+# pickle streams written with protocol 2 and newer start with the PROTO opcode
+PICKLE_PROTO = 0x80
+
+
+class JournalStorage(CompactionPolicy):
+    """
+    Append-only storage engine for the address book.
+
+    The book is kept as a snapshot in the binary book format plus a journal of record-level
+    mutations. Every write appends only the changed record to the journal, compaction folds
+    the journal into a new snapshot in a background thread.
+
+    Snapshots and journals pickled by older versions are still read, the book converts them
+    to the binary format once their records are validated.
+    """
+
+    PUT = PUT
+    DELETE = DELETE
+
+    def __init__(self, snapshot_path, build_record, compact_threshold=1000):
+        """
+        Initialize JournalStorage.
+
+        :param snapshot_path: Path to the snapshot file.
+        :param build_record: Function building a record from the values stored in the file.
+        :param compact_threshold: Minimal number of journal entries before compaction.
+        """
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + '.journal'
+        self.rotated_journal_path = self.journal_path + '.old'
+        self.build_record = build_record
+        self.compact_threshold = compact_threshold
+        self.log_entries = 0
+        self._journal_file = None
+        self._compaction = None
+        # the last load read files pickled by an older version
+        self.legacy = False
+
+    def load(self):
+        """
+        Load the book by replaying the snapshot and the journal.
+
+        :return: LazyRecords of the snapshot (or a dict for a pickled one) keyed by contact name.
+        """
+        self.wait_for_compaction()
+        self.legacy = False
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            if is_book_file(self.snapshot_path):
+                data = LazyRecords(BookFile(self.snapshot_path), self.build_record)
+            else:
+                with open(self.snapshot_path, 'rb') as file:
+                    data.update(pickle.load(file))
+                self.legacy = True
+        # the rotated journal exists only if compaction was interrupted
+        self.log_entries = 0
+        for path in (self.rotated_journal_path, self.journal_path):
+            self._replay(path, data)
+        return data
+
+    def _replay(self, path, data):
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            journal = file.read()
+        if journal[:1] == bytes([PICKLE_PROTO]):
+            self._replay_pickled(journal, data)
+            self.legacy = True
+            return
+        valid_size = 0
+        for op, key, values, valid_size in decode_journal(journal):
+            if op == PUT:
+                data[key] = self.build_record(values)
+            else:
+                data.pop(key, None)
+            self.log_entries += 1
+        if valid_size < len(journal) and os.access(path, os.W_OK):
+            # drop the torn tail, or the entries appended after it would never be read
+            with open(path, 'r+b') as file:
+                file.truncate(valid_size)
+
+    def _replay_pickled(self, journal, data):
+        stream = io.BytesIO(journal)
+        while True:
+            try:
+                op, key, record = pickle.load(stream)
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                # end of the journal or a tail torn by a crash in the middle of a write
+                break
+            if op == 'put':
+                data[key] = record
+            else:
+                data.pop(key, None)
+            self.log_entries += 1
+
+    def append(self, op, key, record=None):
+        """
+        Append a single mutation to the journal.
+
+        :param op: JournalStorage.PUT or JournalStorage.DELETE.
+        :param key: Name of the changed contact.
+        :param record: The changed record (for PUT only).
+        """
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, 'ab')
+        values = record_values(record) if record is not None else None
+        self._journal_file.write(encode_journal_entry(op, key, values))
+        self.log_entries += 1
+
+    def flush(self):
+        if self._journal_file is not None:
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+
+    def compact(self, data, background=True):
+        """
+        Fold the journal into a new snapshot.
+
+        The current journal is rotated away and a new one is started, so writes can go on
+        while the snapshot is written. Records changed after the rotation are written to the
+        new journal and override the snapshot on load.
+
+        :param data: Dictionary or LazyRecords of records to snapshot.
+        :param background: Write the snapshot in a background thread.
+        """
+        self.wait_for_compaction()
+        if self._journal_file is not None:
+            self.flush()
+            self._journal_file.close()
+            self._journal_file = None
+        if os.path.exists(self.journal_path):
+            if os.path.exists(self.rotated_journal_path):
+                # a previous compaction did not finish, its journal is still needed
+                with open(self.journal_path, 'rb') as source, open(self.rotated_journal_path, 'ab') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_journal_path)
+        self.log_entries = 0
+
+        # the snapshot shares the records, records not built yet are streamed from the mapped file
+        snapshot = data.copy() if isinstance(data, LazyRecords) else dict(data)
+        if background:
+            self._compaction = threading.Thread(target=self._write_snapshot, args=(snapshot, data), daemon=True)
+            self._compaction.start()
+        else:
+            self._write_snapshot(snapshot, data)
+
+    def _write_snapshot(self, snapshot, data):
+        tmp_path = self.snapshot_path + '.tmp'
+        write_book(tmp_path, snapshot_values(snapshot))
+        if isinstance(data, LazyRecords):
+            # the live book is switched to the new file, which it goes on reading lazily
+            data.replace_file(self.snapshot_path, snapshot)
+        else:
+            os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.rotated_journal_path):
+            os.remove(self.rotated_journal_path)
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        self.wait_for_compaction()
+        if self._journal_file is not None:
+            self.flush()
+            self._journal_file.close()
+            self._journal_file = None
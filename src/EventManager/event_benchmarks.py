@@ -0,0 +1,125 @@
+"""
+Benchmarks for the event manager.
+
+Run from the EventManager directory:
+    python event_benchmarks.py
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import tempfile
+import time
+
+from event_indexes import ConflictIndex
+from event_manager import Event, EventManager
+from event_storage import EventStorage
+from ical import export_events, import_events
+from recurrence import Recurrence
+
+
+def sample_event(i, start=datetime(2024, 1, 1)):
+    return Event(f'Event {i}', start + timedelta(minutes=15 * i), [f'tag{i % 10}', f'group{i % 100}'])
+
+
+def legacy_load(path):
+    # the loader used before: strptime in a json object hook for every event
+    def event_decoder(obj):
+        if 'date_time' in obj:
+            obj['date_time'] = datetime.strptime(obj['date_time'], '%Y-%m-%d %H:%M')
+        return obj
+
+    with open(path, 'r') as file:
+        return [Event(**event_data) for event_data in json.load(file, object_hook=event_decoder)]
+
+
+def load_benchmark(count=1_000_000):
+    """
+    Compare the startup load of `count` events with the legacy loader, the fast loader and the lazy loader.
+
+    :return: Load time in seconds of the legacy, the fast and the lazy loader.
+    """
+    events = [sample_event(i) for i in range(count)]
+    for event_id, event in enumerate(events):
+        event.event_id = event_id
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, 'legacy_events.json')
+        with open(legacy_path, 'w') as file:
+            json.dump([event.to_dict() for event in events], file, indent=4)
+        path = os.path.join(directory, 'events.json')
+        EventStorage(path).compact(event.to_dict() for event in events)
+        del events
+
+        start = time.perf_counter()
+        legacy_load(legacy_path)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        EventManager(path, None)
+        fast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        EventManager(path, None, lazy=True)
+        lazy = time.perf_counter() - start
+    print(f'Legacy loader: loaded {count} events in {legacy:.2f}s')
+    print(f'Fast loader: loaded {count} events in {fast:.2f}s ({legacy / fast:.1f}x faster)')
+    print(f'Lazy loader: loaded {count} events in {lazy:.2f}s ({legacy / lazy:.1f}x faster)')
+    return legacy, fast, lazy
+
+
+def conflict_benchmark(count=1_000_000, seed=0):
+    """
+    Insert `count` events of random start and duration in random order, finding the conflicts of each one first.
+
+    :return: Inserts per second.
+    """
+    generator = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    events = [Event(f'Event {i}', start + timedelta(minutes=15 * generator.randrange(count)),
+                    duration=timedelta(minutes=generator.choice((15, 30, 60, 90, 240))))
+              for i in range(count)]
+    index = ConflictIndex()
+    conflicts = 0
+    started = time.perf_counter()
+    for event in events:
+        conflicts += len(index.overlapping(event.date_time, event.end))
+        index.add(event)
+    elapsed = time.perf_counter() - started
+    print(f'Inserted {count} events with conflict checks in {elapsed:.2f}s '
+          f'({count / elapsed:.0f} events/sec, {conflicts} conflicts found)')
+    return count / elapsed
+
+
+def ical_benchmark(count=100_000):
+    """
+    Export `count` events to an .ics file and import them into an empty calendar.
+
+    :return: Export and import throughput in events per second.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        source = EventManager(os.path.join(directory, 'source.json'), None)
+        events = [sample_event(i) for i in range(count)]
+        for i, event in enumerate(events):
+            if i % 10 == 0:
+                event.duration = timedelta(minutes=30)
+            if i % 100 == 0:
+                event.recurrence = Recurrence('weekly', count=10)
+        source.add_events(events)
+
+        ics_path = os.path.join(directory, 'events.ics')
+        start = time.perf_counter()
+        export_events(source, ics_path)
+        exported = count / (time.perf_counter() - start)
+
+        target = EventManager(os.path.join(directory, 'target.json'), None)
+        report = import_events(target, ics_path)
+        target.storage.close()
+    print(f'Exported {count} events ({exported:.0f} events/sec)')
+    print(report)
+    return exported, report.items_per_second
+
+
+if __name__ == '__main__':
+    load_benchmark()
+    conflict_benchmark()
+    ical_benchmark()
@@ -0,0 +1,285 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import count, repeat
+from operator import itemgetter
+
+
+class SortedKeyList:
+    """
+    Sorted list split into blocks of at most 2 * LOAD keys.
+
+    An insert or a delete moves the keys of one block only, so it stays cheap in lists
+    of millions of keys, where a flat list would move half of the list every time.
+    """
+
+    LOAD = 512
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self.blocks = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.size = len(keys)
+
+    def add(self, key):
+        self.size += 1
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        i = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[i]
+        insort(block, key)
+        self.maxes[i] = block[-1]
+        if len(block) > 2 * self.LOAD:
+            self.blocks[i:i + 1] = [block[:self.LOAD], block[self.LOAD:]]
+            self.maxes[i:i + 1] = [block[self.LOAD - 1], block[-1]]
+
+    def remove(self, key):
+        i = bisect_left(self.maxes, key)
+        block = self.blocks[i]
+        del block[bisect_left(block, key)]
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def irange(self, low, high):
+        """
+        Yield the keys from `low` up to `high` (excluded) in order.
+        """
+        i = bisect_left(self.maxes, low)
+        start = bisect_left(self.blocks[i], low) if i < len(self.blocks) else 0
+        while i < len(self.blocks):
+            for key in self.blocks[i][start:]:
+                if key >= high:
+                    return
+                yield key
+            i += 1
+            start = 0
+
+    def update(self, keys):
+        """
+        Add many keys, rebuilding the blocks in one sort when the keys outnumber the blocks.
+        """
+        keys = list(keys)
+        if len(keys) > len(self.blocks):
+            self.__init__([key for block in self.blocks for key in block] + keys)
+        else:
+            for key in keys:
+                self.add(key)
+
+    def __len__(self):
+        return self.size
+
+
+class EventTimeline:
+    """
+    Events kept sorted by their date and time.
+
+    Events at the same time keep the order they were added in. The events of any time window
+    are a search in a SortedKeyList, without a scan or a sort of the whole calendar, and adding
+    or removing an event moves the keys of one block only.
+
+    Recurring events are kept apart in a RecurrenceIndex, and the occurrences in a window of the
+    ones which can occur in it are generated by their rules and merged into the one-off events.
+    """
+
+    def __init__(self):
+        # sorted (date_time, sequence number) keys, the sequence number orders events at the same time
+        self.keys = SortedKeyList()
+        self.events = {}
+        self.event_keys = {}
+        self._sequence = count()
+        self.recurring = RecurrenceIndex()
+
+    def add(self, event):
+        self.remove(event)
+        if event.recurrence is not None:
+            self.recurring.add(event)
+            return
+        key = (event.date_time, next(self._sequence))
+        self.keys.add(key)
+        self.events[key] = event
+        self.event_keys[id(event)] = key
+
+    def extend(self, events):
+        """
+        Add many events not in the timeline yet, sorting the keys once instead of inserting them one by one.
+        """
+        keys, recurring = [], []
+        for event in events:
+            if event.recurrence is not None:
+                recurring.append(event)
+                continue
+            key = (event.date_time, next(self._sequence))
+            keys.append(key)
+            self.events[key] = event
+            self.event_keys[id(event)] = key
+        self.keys.update(keys)
+        self.recurring.extend(recurring)
+
+    def remove(self, event):
+        key = self.event_keys.pop(id(event), None)
+        if key is not None:
+            self.keys.remove(key)
+            del self.events[key]
+        self.recurring.remove(event)
+
+    def between(self, start, end):
+        """
+        Return the one-off events from `start` up to and including `end`, ordered by date and time.
+        """
+        # (start,) sorts before every key at `start`, (end, inf) after every key at `end`
+        return [self.events[key] for key in self.keys.irange((start,), (end, float('inf')))]
+
+    def occurrences(self, start, end):
+        """
+        Return the occurrences from `start` up to and including `end` of all events, ordered by date and time.
+
+        :return: List of (date and time, event) tuples.
+        """
+        streams = [((key[0], self.events[key]) for key in self.keys.irange((start,), (end, float('inf'))))]
+        # the recurring index excludes the end of the window, a second later includes it
+        for event in self.recurring.overlapping(start, end + timedelta(seconds=1)):
+            streams.append(zip(event.recurrence.occurrences(event.date_time, start, end), repeat(event)))
+        return list(merge(*streams, key=itemgetter(0)))
+
+    def recurring_overlapping(self, start, end):
+        """
+        Return the recurring events which occurrences may overlap the time from `start` up to `end` (excluded),
+        ordered by their first occurrence.
+        """
+        return self.recurring.overlapping(start, end)
+
+    def __len__(self):
+        return len(self.keys) + len(self.recurring.events)
+
+
+def seconds(date_time):
+    """
+    Return the date and time as a number of seconds, integers compare much faster than datetime objects.
+    """
+    return date_time.toordinal() * 86400 + date_time.hour * 3600 + date_time.minute * 60 + date_time.second
+
+
+class ConflictIndex:
+    """
+    Overlap index of the one-off events with a duration.
+
+    Events are grouped by the power of two of their duration in minutes, and every group is
+    a sorted list of start keys. An event of group `c` is shorter than 2 ** c minutes, so the
+    events overlapping [start, end) in the group start between start - 2 ** c minutes and end:
+    a query costs a binary search per group plus the found events, O(log n + k).
+
+    A key is the start in seconds shifted left by 32 bits plus a sequence number, which orders
+    events starting at the same time.
+    """
+
+    SEQUENCE_BITS = 32
+
+    def __init__(self):
+        self.groups = {}
+        self.events = {}
+        self.event_keys = {}
+        self._sequence = count()
+
+    @staticmethod
+    def group(length):
+        minutes = max(-(-length // 60), 1)
+        return minutes.bit_length()
+
+    def span(self, event):
+        """
+        Return the start and the end in seconds of the time taken by the event, or None for an event left out.
+        """
+        if event.recurrence is not None or not event.duration:
+            return None
+        start = seconds(event.date_time)
+        return start, start + int(event.duration.total_seconds())
+
+    def _key(self, event):
+        span = self.span(event)
+        if span is None:
+            return None, None
+        start, end = span
+        group = self.group(end - start)
+        key = start << self.SEQUENCE_BITS | next(self._sequence) % (1 << self.SEQUENCE_BITS)
+        self.events[key] = (end, event)
+        self.event_keys[id(event)] = (group, key)
+        return group, key
+
+    def add(self, event):
+        self.remove(event)
+        group, key = self._key(event)
+        if key is not None:
+            if group not in self.groups:
+                self.groups[group] = SortedKeyList()
+            self.groups[group].add(key)
+
+    def extend(self, events):
+        """
+        Add many events not in the index yet, building every group at once.
+        """
+        keys = {}
+        for event in events:
+            group, key = self._key(event)
+            if key is not None:
+                keys.setdefault(group, []).append(key)
+        for group, group_keys in keys.items():
+            if group not in self.groups:
+                self.groups[group] = SortedKeyList()
+            self.groups[group].update(group_keys)
+
+    def remove(self, event):
+        group_key = self.event_keys.pop(id(event), None)
+        if group_key is not None:
+            group, key = group_key
+            self.groups[group].remove(key)
+            del self.events[key]
+
+    def overlapping(self, start, end):
+        """
+        Return the events overlapping the time from `start` up to `end` (excluded), ordered by start.
+        """
+        start, end = seconds(start), seconds(end)
+        found = []
+        events = self.events
+        for group, keys in self.groups.items():
+            low = start - 60 * (1 << group)
+            for key in keys.irange(low << self.SEQUENCE_BITS, end << self.SEQUENCE_BITS):
+                event_end, event = events[key]
+                if event_end > start:
+                    found.append((key, event))
+        if len(self.groups) > 1:
+            found.sort(key=itemgetter(0))
+        return [event for _, event in found]
+
+
+# end of the span of an endless recurring event, later than any date and time
+END_OF_TIME = seconds(datetime.max)
+
+
+class RecurrenceIndex(ConflictIndex):
+    """
+    Overlap index of the recurring events, over the time from their first occurrence up to the
+    end of their last one.
+
+    A query expands only the rules of the events which can occur in its window, instead of every
+    event which started before it. An endless event lasts up to END_OF_TIME, so the endless events
+    fall in the groups of the longest spans, where all the events started before the end of the
+    window are found.
+    """
+
+    def span(self, event):
+        if event.recurrence is None:
+            return None
+        start = seconds(event.date_time)
+        last = event.recurrence.last_occurrence(event.date_time)
+        if last is None:
+            return start, END_OF_TIME
+        # an event without a duration takes a second, so the start of its last occurrence is in the span
+        duration = int(event.duration.total_seconds()) if event.duration else 0
+        return start, seconds(last) + max(duration, 1)
@@ -1,24 +1,109 @@
 from base_view import EventConsoleView
 from common import CommandHandler, handle_error
 from datetime import datetime, timedelta
+from data_tools import KeyIndex, NgramIndex
+from event_indexes import ConflictIndex, EventTimeline
+from heapq import heappop, heappush
+from event_storage import EventStorage
+from recurrence import DATE_TIME_FORMAT, Recurrence, parse_date_time
+from reminders import ReminderScheduler
+import gc
 import json
+import os
 
 
 class Event:
     """
     Class to represent an event.
+
+    An event loaded lazily keeps its line of the events file, the title and tags are
+    decoded from it on their first access.
     """
-    def __init__(self, title, date_time, tags=None):
+    __slots__ = ('_title', 'date_time', '_tags', 'event_id', 'recurrence', 'duration', '_line')
+
+    def __init__(self, title, date_time, tags=None, event_id=None, recurrence=None, duration=None):
         """
         Initialize the event object.
 
         :param title: Title of the event.
-        :param date_time: Date and time of the event.
+        :param date_time: Date and time of the event, the first occurrence of a recurring event.
         :param tags: Tags associated with the event (default is None).
+        :param event_id: Id of the event in the events file (default is None, set by EventManager).
+        :param recurrence: Recurrence rule of a recurring event (default is None).
+        :param duration: Duration of the event as a timedelta (default is None, the event takes no time).
         """
-        self.title = title
+        self._line = None
+        self._title = title
         self.date_time = date_time
-        self.tags = tags or []
+        self._tags = tags or []
+        self.event_id = event_id
+        self.recurrence = recurrence
+        self.duration = duration
+
+    @classmethod
+    def from_dict(cls, event_data):
+        """
+        Build an event from its data in the events file.
+        """
+        recurrence_data = event_data.get('recurrence')
+        duration = event_data.get('duration')
+        return cls(event_data['title'], parse_date_time(event_data['date_time']), event_data.get('tags'),
+                   event_data.get('event_id'), Recurrence.from_dict(recurrence_data) if recurrence_data else None,
+                   timedelta(minutes=duration) if duration else None)
+
+    @classmethod
+    def from_line(cls, event_id, date_time_text, line):
+        """
+        Build an event from its line in the events file, decoding only its date and time.
+        """
+        event = cls.__new__(cls)
+        event._line = line
+        event.date_time = parse_date_time(date_time_text)
+        event.event_id = event_id
+        # lines of recurring events and events with a duration are always decoded at once
+        event.recurrence = None
+        event.duration = None
+        return event
+
+    @property
+    def end(self):
+        return self.date_time + self.duration if self.duration else self.date_time
+
+    def at(self, date_time):
+        """
+        Return the occurrence of a recurring event starting at `date_time`.
+        """
+        return Event(self.title, date_time, self.tags, self.event_id, self.recurrence, self.duration)
+
+    def _decode(self):
+        event_data = json.loads(self._line)
+        self._line = None
+        self._title = event_data['title']
+        self._tags = event_data.get('tags') or []
+
+    @property
+    def title(self):
+        if self._line is not None:
+            self._decode()
+        return self._title
+
+    @title.setter
+    def title(self, title):
+        if self._line is not None:
+            self._decode()
+        self._title = title
+
+    @property
+    def tags(self):
+        if self._line is not None:
+            self._decode()
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        if self._line is not None:
+            self._decode()
+        self._tags = tags
 
     def time_until_event(self):
         """
@@ -28,57 +113,259 @@ class Event:
         """
         return self.date_time - datetime.now()
 
+    def to_dict(self):
+        """
+        Return the data of the event stored in the events file.
+
+        :return: Dictionary of the event data.
+        """
+        # date_time and event_id go first, so a lazy load reads them without decoding the line
+        event_data = {
+            'date_time': self.date_time.strftime(DATE_TIME_FORMAT),
+            'event_id': self.event_id,
+            'title': self.title,
+            'tags': self.tags,
+        }
+        if self.recurrence is not None:
+            event_data['recurrence'] = self.recurrence.to_dict()
+        if self.duration:
+            event_data['duration'] = int(self.duration.total_seconds() // 60)
+        return event_data
+
     def __str__(self):
         """
         Return a string representation of the event.
 
         :return: String representation of the event.
         """
-        return f'Title: {self.title}\nDate and Time: {self.date_time}\nTags: {", ".join(self.tags)}\n'
+        text = f'Title: {self.title}\nDate and Time: {self.date_time}\nTags: {", ".join(self.tags)}\n'
+        if self.duration:
+            text += f'Duration: {self.duration}\n'
+        if self.recurrence is not None:
+            text += f'Repeats: {self.recurrence}\n'
+        return text
 
 
 class EventManager:
     """
     Class to manage events.
     """
-    def __init__(self, file_path, view):
+    def __init__(self, file_path, view, lazy=False):
         """
         Initialize the event manager.
 
         :param file_path: Path to the file where events are stored.
         :param view: View object for interacting with the user.
+        :param lazy: Decode the title and tags of an event only when they are used (default is False).
         """
         self.file_path = file_path
+        self.lazy = lazy
+        self.storage = EventStorage(file_path)
+        # ids of the events changed since the last save, in the order they changed
+        self._dirty = {}
+        # events keyed by id, in the order they were added (ids only grow)
         self.events = self.load_events()
+        self._next_id = max(self.events, default=-1) + 1
         self.view = view
+        # events sorted by date and time, kept up to date by add, edit and delete
+        self.timeline = EventTimeline()
+        self.timeline.extend(self.events.values())
+        # one-off events with a duration, to find overlapping bookings
+        self.conflicts = ConflictIndex()
+        self.conflicts.extend(self.events.values())
+        # title and tag indexes, built on their first use so a lazy load does not decode every event
+        self.title_index = KeyIndex()
+        self.tag_index = KeyIndex()
+        self.search_index = NgramIndex()
+        self._indexed = False
+        self.reminders = None
+
+    def set_reminders(self, reminders):
+        """
+        Schedule the reminders of all events, and keep them up to date on add, edit and delete.
+
+        :param reminders: ReminderScheduler object.
+        """
+        self.reminders = reminders
+        reminders.schedule_all(self.events.values())
 
     def load_events(self):
         """
         Load events from a file.
 
-        :return: List of events.
+        :return: Dictionary of events keyed by event id.
         """
+        # the loaded objects are never garbage, the cyclic collector would only rescan them again and again
+        gc_enabled = gc.isenabled()
+        gc.disable()
         try:
-            with open(self.file_path, 'r') as file:
-                events_data = json.load(file, object_hook=self.event_decoder)
-                events = [Event(**event_data) for event_data in events_data]
-                return events
-        except FileNotFoundError:
+            events_data = self.storage.load(self.lazy)
+            events = {event_id: Event.from_line(event_id, *event_data) if type(event_data) is tuple
+                      else Event.from_dict(event_data) for event_id, event_data in events_data.items()}
+        finally:
+            if gc_enabled:
+                gc.enable()
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        if self.storage.legacy and os.access(directory, os.W_OK):
+            # the events file written as a JSON list is rewritten at once in the incremental format
+            self.storage.compact(event.to_dict() for event in events.values())
+        return events
+
+    def save_events(self):
+        """
+        Append the events changed since the last save to the mutation log.
+
+        Unchanged events are never serialized again, the whole events file is rewritten
+        only by the compaction once the log grows as big as the calendar.
+        """
+        if self.storage.should_snapshot(len(self._dirty), len(self.events)):
+            # most of the calendar has changed (add_events of an .ics file), write the snapshot instead of the log
+            self._dirty.clear()
+            self.storage.compact(event.to_dict() for event in self.events.values())
+            return
+
+        for event_id in self._dirty:
+            event = self.events.get(event_id)
+            if event is None:
+                self.storage.append(EventStorage.DELETE, event_id)
+            else:
+                self.storage.append(EventStorage.PUT, event_id, event.to_dict())
+        self._dirty.clear()
+        self.storage.flush()
+
+        if self.storage.needs_compaction(len(self.events)):
+            self.storage.compact(event.to_dict() for event in self.events.values())
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self._indexed = True
+            for event in self.events.values():
+                self._index_texts(event)
+
+    def _index_texts(self, event):
+        self.title_index.add(event.event_id, [event.title])
+        self.tag_index.add(event.event_id, event.tags)
+        self.search_index.add(event.event_id, event.title, *event.tags)
+
+    def _index(self, event):
+        self.timeline.add(event)
+        self.conflicts.add(event)
+        if self.reminders is not None:
+            self.reminders.schedule(event)
+        if self._indexed:
+            self._index_texts(event)
+        self._dirty[event.event_id] = None
+
+    def _register(self, event):
+        event.event_id = self._next_id
+        self._next_id += 1
+        self.events[event.event_id] = event
+        self._index(event)
+
+    def add_events(self, events):
+        """
+        Add many events at once, every index takes them in one batch.
+
+        :param events: List of events without ids.
+        """
+        for event in events:
+            event.event_id = self._next_id
+            self._next_id += 1
+            self.events[event.event_id] = event
+            self._dirty[event.event_id] = None
+        self.timeline.extend(events)
+        self.conflicts.extend(events)
+        if self._indexed:
+            for event in events:
+                self._index_texts(event)
+        if self.reminders is not None:
+            self.reminders.schedule_all(events)
+
+    def _remove(self, event):
+        del self.events[event.event_id]
+        self.timeline.remove(event)
+        self.conflicts.remove(event)
+        self.title_index.remove(event.event_id)
+        self.tag_index.remove(event.event_id)
+        self.search_index.remove(event.event_id)
+        if self.reminders is not None:
+            self.reminders.cancel(event.event_id)
+        self._dirty[event.event_id] = None
+
+    def _recurring_overlapping(self, start, end):
+        # occurrences of the recurring events with a duration which overlap [start, end)
+        for event in self.timeline.recurring_overlapping(start, end):
+            if event.duration:
+                window_start = start - event.duration + timedelta(microseconds=1)
+                for date_time in event.recurrence.occurrences(event.date_time, window_start, end):
+                    if date_time < end:
+                        yield event.at(date_time)
+
+    def overlapping(self, start, end):
+        """
+        Return the events (and the occurrences of recurring events) overlapping the time from `start`
+        up to `end` (excluded), ordered by start.
+        """
+        events = self.conflicts.overlapping(start, end)
+        recurring = list(self._recurring_overlapping(start, end))
+        if recurring:
+            events = sorted(events + recurring, key=lambda event: event.date_time)
+        return events
+
+    def find_conflicts(self, event):
+        """
+        Return the events overlapping the event, for a recurring event the ones overlapping its first occurrence.
+        """
+        if not event.duration:
             return []
+        return [other for other in self.overlapping(event.date_time, event.end) if other.event_id != event.event_id]
 
-    def event_decoder(self, obj):
-        if 'date_time' in obj:
-            obj['date_time'] = datetime.strptime(obj['date_time'], '%Y-%m-%d %H:%M')
-        return obj
+    def conflicts_between(self, start, end):
+        """
+        Return all pairs of overlapping events from `start` up to `end` (excluded).
 
-    def save_events(self):
-        events_data = []
-        for event in self.events:
-            event_data = event.__dict__.copy()
-            event_data['date_time'] = event.date_time.strftime('%Y-%m-%d %H:%M')
-            events_data.append(event_data)
-        with open(self.file_path, 'w') as file:
-            json.dump(events_data, file, indent=4)
+        The events of the range are swept by start, keeping a heap of the ends of the events
+        still going on, so the cost is O((m + k) log m) for m events and k conflicts in the range.
+
+        :return: List of (event, event) tuples ordered by the start of the later event.
+        """
+        conflicts = []
+        ongoing = []
+        for index, event in enumerate(self.overlapping(start, end)):
+            while ongoing and ongoing[0][0] <= event.date_time:
+                heappop(ongoing)
+            conflicts.extend((other, event) for _, _, other in ongoing)
+            heappush(ongoing, (event.end, index, event))
+        return conflicts
+
+    def find_by_title(self, title):
+        """
+        Return the first added event with the title, or None.
+        """
+        self._ensure_indexes()
+        event_ids = self.title_index.find(title)
+        # an event renamed to the title is listed after the ones which had it, ids follow the order of adding
+        return self.events[min(event_ids)] if event_ids else None
+
+    def find_by_tag(self, tag):
+        """
+        Return the events with the tag, in the order they were added.
+        """
+        self._ensure_indexes()
+        return [self.events[event_id] for event_id in sorted(self.tag_index.find(tag))]
+
+    def search(self, query):
+        """
+        Return the events which title or one of the tags contains the query, in the order they were added.
+        """
+        if not query:
+            return list(self.events.values())
+        self._ensure_indexes()
+        event_ids = self.search_index.candidates(query)
+        results = [self.events[event_id] for event_id in sorted(event_ids)]
+        if not self.search_index.is_exact(query):
+            results = [event for event in results if query in event.title or any(query in tag for tag in event.tags)]
+        return results
 
     @handle_error
     def add_event(self):
@@ -86,19 +373,62 @@ class EventManager:
         while True:
             date_time_str = self.view.get_input('Enter event date and time (YYYY-MM-DD HH:MM): ')
             try:
-                date_time = datetime.strptime(date_time_str, '%Y-%m-%d %H:%M')
+                date_time = datetime.strptime(date_time_str, DATE_TIME_FORMAT)
                 break
             except ValueError:
                 self.view.display_message('Please enter date and time in the format YYYY-MM-DD HH:MM.')
         tags = self.view.get_input('Enter tags separated by commas: ').split(',')
-        event = Event(title, date_time, tags)
-        self.events.append(event)
+        duration = self.input_duration()
+        recurrence = self.input_recurrence()
+        event = Event(title, date_time, tags, recurrence=recurrence, duration=duration)
+        self._register(event)
         self.save_events()
         self.view.display_message('Event added successfully.')
+        self.warn_conflicts(event)
+
+    def input_duration(self):
+        while True:
+            minutes = self.view.get_input('Enter event duration in minutes, leave empty for none: ').strip()
+            if not minutes:
+                return None
+            if minutes.isdigit():
+                return timedelta(minutes=int(minutes))
+            self.view.display_message('Please enter the duration as a number of minutes.')
+
+    def warn_conflicts(self, event):
+        conflicts = self.find_conflicts(event)
+        if conflicts:
+            self.view.display_message('Warning: the event overlaps with these events:')
+            self.view.display_events_list(conflicts)
+
+    def input_recurrence(self):
+        """
+        Ask for the recurrence rule of an event.
+
+        :return: Recurrence object, or None for a one-off event.
+        """
+        while True:
+            frequency = self.view.get_input(
+                'Repeat the event (daily/weekly/monthly), leave empty for a one-off event: ').strip().lower()
+            if not frequency:
+                return None
+            interval = self.view.get_input('Repeat every how many days/weeks/months (default is 1): ').strip()
+            end = self.view.get_input(
+                'Repeat until date and time (YYYY-MM-DD HH:MM) or a number of times, leave empty to repeat forever: ')
+            exceptions = self.view.get_input(
+                'Skipped occurrences (YYYY-MM-DD HH:MM) separated by commas, leave empty for none: ')
+            try:
+                end = end.strip()
+                until = parse_date_time(end) if end and not end.isdigit() else None
+                count = int(end) if end.isdigit() else None
+                exceptions = [parse_date_time(text.strip()) for text in exceptions.split(',') if text.strip()]
+                return Recurrence(frequency, int(interval or 1), until, count, exceptions)
+            except ValueError as e:
+                self.view.display_message(f'Invalid repetition: {e}. Please try again.')
 
     def search_event(self):
         query = self.view.get_input('Enter event title to search: ')
-        results = [event for event in self.events if query in event.title or any(query in tag for tag in event.tags)]
+        results = self.search(query)
         if results:
             self.view.display_message('Search results')
             self.view.display_events_list(results)
@@ -107,44 +437,107 @@ class EventManager:
 
     def edit_event(self):
         title = self.view.get_input('Enter event title to edit: ')
-        for event in self.events:
-            if event.title == title:
-                new_title = self.view.get_input('Enter new event title: ')
-                while True:
-                    new_date_time_str = self.view.get_input('Enter new event date and time (YYYY-MM-DD HH:MM): ')
-                    try:
-                        new_date_time = datetime.strptime(new_date_time_str, '%Y-%m-%d %H:%M')
-                        break
-                    except ValueError:
-                        self.view.display_message('Please enter date and time in the format YYYY-MM-DD HH:MM.')
-                new_tags = self.view.get_input('Enter new tags separated by commas: ').split(',')
-                event.title = new_title
-                event.date_time = new_date_time
-                event.tags = new_tags
-                self.view.display_message('Event edited successfully. Updated details:')
-                self.view.display_event_details(event)
-                self.save_events()
-                return
-        self.view.display_error(f'Event with title "{title}" not found.')
+        event = self.find_by_title(title)
+        if event is None:
+            self.view.display_error(f'Event with title "{title}" not found.')
+            return
+        new_title = self.view.get_input('Enter new event title: ')
+        while True:
+            new_date_time_str = self.view.get_input('Enter new event date and time (YYYY-MM-DD HH:MM): ')
+            try:
+                new_date_time = datetime.strptime(new_date_time_str, DATE_TIME_FORMAT)
+                break
+            except ValueError:
+                self.view.display_message('Please enter date and time in the format YYYY-MM-DD HH:MM.')
+        new_tags = self.view.get_input('Enter new tags separated by commas: ').split(',')
+        new_duration = self.input_duration()
+        new_recurrence = self.input_recurrence()
+        event.title = new_title
+        event.date_time = new_date_time
+        event.tags = new_tags
+        event.duration = new_duration
+        event.recurrence = new_recurrence
+        self._index(event)
+        self.view.display_message('Event edited successfully. Updated details:')
+        self.view.display_event_details(event)
+        self.save_events()
+        self.warn_conflicts(event)
 
     def delete_event(self):
         title = self.view.get_input('Enter event title to delete: ')
-        for event in self.events:
-            if event.title == title:
-                self.events.remove(event)
-                self.view.display_message('Event deleted successfully.')
-                self.save_events()
-                return
-        self.view.display_error(f'Event with title "{title}" not found.')
+        event = self.find_by_title(title)
+        if event is None:
+            self.view.display_error(f'Event with title "{title}" not found.')
+            return
+        self._remove(event)
+        self.view.display_message('Event deleted successfully.')
+        self.save_events()
+
+    @handle_error
+    def show_conflicts(self):
+        dates = []
+        for prompt in ('Enter start date (YYYY-MM-DD): ', 'Enter end date (YYYY-MM-DD): '):
+            while True:
+                try:
+                    dates.append(datetime.strptime(self.view.get_input(prompt), '%Y-%m-%d'))
+                    break
+                except ValueError:
+                    self.view.display_message('Please enter date in the format YYYY-MM-DD.')
+        conflicts = self.conflicts_between(dates[0], dates[1] + timedelta(days=1))
+        if not conflicts:
+            self.view.display_message('No overlapping events found.')
+            return
+        for first, second in conflicts:
+            self.view.display_message(f'"{first.title}" ({first.date_time.strftime(DATE_TIME_FORMAT)}) overlaps with '
+                                      f'"{second.title}" ({second.date_time.strftime(DATE_TIME_FORMAT)})')
+
+    @handle_error
+    def import_events(self):
+        from ical import import_events
+
+        path = self.view.get_input('Enter the path to the .ics file: ')
+        report = import_events(self, path)
+        self.view.display_message(str(report))
+        for line_number, message in report.errors[:10]:
+            self.view.display_error(f'Event at line {line_number}: {message}')
+        if len(report.errors) > 10:
+            self.view.display_message(f'... and {len(report.errors) - 10} more rejected events.')
+
+    @handle_error
+    def export_events(self):
+        from ical import export_events
+
+        path = self.view.get_input('Enter the path to the .ics file: ')
+        count = export_events(self, path)
+        self.view.display_message(f'{count} events exported to {path}.')
+
+    @handle_error
+    def show_events_by_tag(self):
+        tag = self.view.get_input('Enter tag: ')
+        results = self.find_by_tag(tag)
+        if results:
+            self.view.display_events_list(results)
+        else:
+            self.view.display_error(f'No events with tag "{tag}" found.')
+
+    def upcoming_events(self, days=7, now=None):
+        """
+        Return the events from now up to `days` days ahead, ordered by date and time.
+
+        :param days: Number of days to look ahead.
+        :param now: Start of the window (default is the current time).
+        :return: List of events, a recurring event is listed once per occurrence.
+        """
+        now = now or datetime.now()
+        return [event if event.recurrence is None else event.at(date_time)
+                for date_time, event in self.timeline.occurrences(now, now + timedelta(days=days))]
 
     @handle_error
     def show_upcoming_events(self):
-        today = datetime.now()
-        upcoming_events = [event for event in self.events if event.time_until_event() <= timedelta(days=7)]
+        upcoming_events = self.upcoming_events(7)
         if upcoming_events:
-            sorted_upcoming_events = sorted(upcoming_events, key=lambda event: event.date_time)
             self.view.display_message('Upcoming events within a week:')
-            self.view.display_events_list(sorted_upcoming_events)
+            self.view.display_events_list(upcoming_events)
         else:
             self.view.display_error('No upcoming events within a week.')
 
@@ -153,7 +546,7 @@ class EventManager:
         if not self.events:
             self.view.display_message('No events found.')
             return
-        self.view.display_events_list(self.events)
+        self.view.display_events_list(list(self.events.values()))
 
 
 class EventCommandHandler(CommandHandler):
@@ -176,6 +569,10 @@ class EventCommandHandler(CommandHandler):
             "4": ("Search event", manager.search_event),
             "5": ("Edit event", manager.edit_event),
             "6": ("Delete event", manager.delete_event),
+            "7": ("Show events by tag", manager.show_events_by_tag),
+            "8": ("Find overlapping events", manager.show_conflicts),
+            "9": ("Import events from an .ics file", manager.import_events),
+            "10": ("Export events to an .ics file", manager.export_events),
             "0": ("Return to Main Menu", self.return_to_main_menu())
         }
         super().__init__(commands, view)
@@ -189,12 +586,19 @@ def run_event_manager():
     event_file_path = 'events.json'
     view = EventConsoleView()
     event_manager = EventManager(event_file_path, view)
+    reminders = ReminderScheduler(
+        lambda event, occurrence: view.display_message(f'Reminder: "{event.title}" starts at '
+                                                       f'{occurrence.strftime(DATE_TIME_FORMAT)}'))
+    event_manager.set_reminders(reminders)
+    reminders.start()
     event_command_handler = EventCommandHandler(event_manager, view)
 
     while True:
         options = event_command_handler.get_commands_for_display()
         choice = view.display_menu(program_name, options)
         if choice == '0':
+            reminders.stop()
+            event_manager.storage.close()
             return
         else:
             event_command_handler.handle_command(choice)
@@ -0,0 +1,169 @@
+import json
+import os
+
+from data_tools import CompactionPolicy
+
+
+# a snapshot line starts with the date and time and the id of the event
+DATE_TIME_PREFIX = '{"date_time": "'
+EVENT_ID_PREFIX = '", "event_id": '
+DATE_TIME_START = len(DATE_TIME_PREFIX)
+DATE_TIME_END = DATE_TIME_START + len('YYYY-MM-DD HH:MM')
+EVENT_ID_START = DATE_TIME_END + len(EVENT_ID_PREFIX)
+RECURRENCE_KEY = '"recurrence": {'
+DURATION_KEY = '"duration": '
+
+
+def read_line_head(line):
+    """
+    Read the date and time and the id of the event of a snapshot line without decoding it.
+
+    :return: Tuple of the event id and the date and time text, or None if the line has another layout.
+    """
+    if RECURRENCE_KEY in line or DURATION_KEY in line:
+        # recurring events and events with a duration are indexed by their rule and duration,
+        # which have to be decoded anyway
+        return None
+    if line.startswith(DATE_TIME_PREFIX) and line.startswith(EVENT_ID_PREFIX, DATE_TIME_END):
+        end = line.find(',', EVENT_ID_START)
+        if end != -1 and line[EVENT_ID_START:end].isdigit():
+            return int(line[EVENT_ID_START:end]), line[DATE_TIME_START:DATE_TIME_END]
+    return None
+
+
+class EventStorage(CompactionPolicy):
+    """
+    Incremental storage of the events file.
+
+    The events file is a snapshot with one JSON event per line, and every save appends only
+    the changed events to a mutation log next to it. Compaction writes the new snapshot to a
+    temporary file and renames it over the old one, so a crash never leaves a truncated file.
+
+    Events files written as a single JSON list by older versions are still read.
+    """
+
+    PUT = 'put'
+    DELETE = 'delete'
+
+    def __init__(self, file_path, compact_threshold=1000):
+        """
+        Initialize EventStorage.
+
+        :param file_path: Path to the events file.
+        :param compact_threshold: Minimal number of log entries before compaction.
+        """
+        self.file_path = file_path
+        self.log_path = file_path + '.log'
+        self.compact_threshold = compact_threshold
+        self.log_entries = 0
+        # the last load read an events file written as a single JSON list
+        self.legacy = False
+        self._log_file = None
+
+    def load(self, lazy=False):
+        """
+        Load the events by replaying the snapshot and the mutation log.
+
+        :param lazy: Leave the snapshot lines undecoded.
+        :return: Dictionary of event data keyed by event id, in the order of the events. With `lazy`
+            a snapshot event is a tuple of its date and time text and its line instead.
+        """
+        events = {}
+        self.legacy = False
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                content = file.read()
+            if content.lstrip().startswith('['):
+                self.legacy = True
+                for event_id, event_data in enumerate(json.loads(content)):
+                    event_data.setdefault('event_id', event_id)
+                    events[event_data['event_id']] = event_data
+            else:
+                lines = [line for line in content.splitlines() if line.strip()]
+                if lazy:
+                    for line in lines:
+                        head = read_line_head(line)
+                        if head is not None:
+                            events[head[0]] = (head[1], line)
+                        else:
+                            event_data = json.loads(line)
+                            events[event_data['event_id']] = event_data
+                else:
+                    # the lines are decoded as one JSON list, in a single call of the C decoder
+                    for event_data in json.loads('[' + ','.join(lines) + ']'):
+                        events[event_data['event_id']] = event_data
+        self._replay(events)
+        return events
+
+    def _replay(self, events):
+        self.log_entries = 0
+        if not os.path.exists(self.log_path):
+            return
+        valid_size = 0
+        with open(self.log_path, 'rb') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a tail torn by a crash in the middle of a write
+                    break
+                if entry['op'] == self.PUT:
+                    events[entry['event']['event_id']] = entry['event']
+                else:
+                    events.pop(entry['event_id'], None)
+                self.log_entries += 1
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.log_path) and os.access(self.log_path, os.W_OK):
+            # drop the torn tail, or the entries appended after it would never be read
+            with open(self.log_path, 'r+b') as file:
+                file.truncate(valid_size)
+
+    def append(self, op, event_id, event_data=None):
+        """
+        Append a single mutation to the log.
+
+        :param op: EventStorage.PUT or EventStorage.DELETE.
+        :param event_id: Id of the changed event.
+        :param event_data: Data of the changed event (for PUT only).
+        """
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'a', encoding='utf-8')
+        if op == self.PUT:
+            entry = {'op': op, 'event': event_data}
+        else:
+            entry = {'op': op, 'event_id': event_id}
+        self._log_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.log_entries += 1
+
+    def flush(self):
+        if self._log_file is not None:
+            self._log_file.flush()
+            os.fsync(self._log_file.fileno())
+
+    def compact(self, events_data):
+        """
+        Write a new snapshot of all events and start an empty log.
+
+        A crash before the rename keeps the old snapshot and log, a crash after it replays
+        the old log over the new snapshot, which changes nothing.
+
+        :param events_data: Iterable of event data of all events.
+        """
+        self.close()
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for event_data in events_data:
+                file.write(json.dumps(event_data, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.file_path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.log_entries = 0
+        self.legacy = False
+
+    def close(self):
+        if self._log_file is not None:
+            self.flush()
+            self._log_file.close()
+            self._log_file = None
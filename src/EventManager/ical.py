@@ -0,0 +1,271 @@
+"""
+Streaming iCalendar (.ics) import and export of events.
+
+Only VEVENT components are read: SUMMARY, DTSTART, DTEND or DURATION, CATEGORIES, RRULE
+(daily, weekly and monthly, with INTERVAL, UNTIL and COUNT only) and EXDATE. Date and times
+are read as local times.
+"""
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+import re
+import time
+
+from data_tools import ImportReport
+from event_manager import Event
+from recurrence import Recurrence
+
+
+FREQUENCIES = {'DAILY': 'daily', 'WEEKLY': 'weekly', 'MONTHLY': 'monthly'}
+# a rule with any other part, such as BYDAY, repeats differently than Recurrence can
+RULE_PARTS = {'FREQ', 'INTERVAL', 'UNTIL', 'COUNT'}
+ICAL_DATE_TIME = '%Y%m%dT%H%M%S'
+# the longest line allowed by RFC 5545, in octets without the line break
+LINE_LENGTH = 75
+DURATION = re.compile(r'^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+UNESCAPE = re.compile(r'\\([\\;,nN])')
+# name of the property a line which is not valid UTF-8 is read as, no real property has it
+INVALID = '\0'
+INVALID_LINE = INVALID + ':'
+
+
+def unfold(lines):
+    """
+    Join the folded content lines, a line starting with a space or a tab continues the previous one.
+
+    :return: Generator of (line number, content line) tuples.
+    """
+    current, current_number = None, 0
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current_number, current
+        current, current_number = line, line_number
+    if current:
+        yield current_number, current
+
+
+def split_property(line):
+    """
+    Split a content line into its name, parameters and value.
+    """
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+
+def unescape(text):
+    return UNESCAPE.sub(lambda match: '\n' if match.group(1) in 'nN' else match.group(1), text)
+
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def split_list(value):
+    # commas escaped with a backslash belong to the values
+    return [unescape(item) for item in re.split(r'(?<!\\),', value) if item]
+
+
+def parse_ical_date_time(value):
+    value = value.rstrip('Z')
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d')
+    return datetime.strptime(value, ICAL_DATE_TIME)
+
+
+def parse_duration(value):
+    match = DURATION.match(value.lstrip('+'))
+    if not match:
+        raise ValueError(f'Invalid duration "{value}"')
+    weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def parse_rule(value, exceptions):
+    rule = dict(part.partition('=')[::2] for part in value.upper().split(';'))
+    frequency = FREQUENCIES.get(rule.get('FREQ'))
+    if frequency is None or not rule.keys() <= RULE_PARTS:
+        raise ValueError(f'Unsupported repetition "{value}"')
+    until = rule.get('UNTIL')
+    return Recurrence(frequency, int(rule.get('INTERVAL', 1)), parse_ical_date_time(until) if until else None,
+                      int(rule['COUNT']) if 'COUNT' in rule else None, exceptions)
+
+
+def build_event(properties):
+    """
+    Build an event from the properties of a VEVENT component.
+
+    :param properties: Dictionary of property name to a list of (parameters, value) tuples.
+    """
+    def first(name):
+        values = properties.get(name)
+        return values[0][1] if values else None
+
+    if INVALID in properties:
+        raise ValueError('The event has text which is not valid UTF-8')
+    title = first('SUMMARY')
+    start = first('DTSTART')
+    if title is None or start is None:
+        raise ValueError('SUMMARY and DTSTART are required')
+    date_time = parse_ical_date_time(start)
+    duration = None
+    if first('DTEND') is not None:
+        duration = parse_ical_date_time(first('DTEND')) - date_time
+        if duration < timedelta(0):
+            raise ValueError('DTEND is before DTSTART')
+    elif first('DURATION') is not None:
+        duration = parse_duration(first('DURATION'))
+    tags = [tag for _, value in properties.get('CATEGORIES', ()) for tag in split_list(value)]
+    exceptions = [parse_ical_date_time(date) for _, value in properties.get('EXDATE', ()) for date in value.split(',')]
+    rule = first('RRULE')
+    recurrence = parse_rule(rule, exceptions) if rule else None
+    return Event(unescape(title), date_time, tags, recurrence=recurrence, duration=duration or None)
+
+
+def decode_lines(file):
+    """
+    Decode the lines of a binary file, a line which is not valid UTF-8 is replaced by INVALID_LINE.
+    """
+    for line in file:
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            yield INVALID_LINE
+
+
+def read_events(path):
+    """
+    Stream the events of an .ics file, one VEVENT component at a time.
+
+    :return: Generator of (line number, Event or the error of an invalid event) tuples.
+    """
+    # lines are decoded one by one, so text which is not valid UTF-8 rejects only its own event
+    with open(path, 'rb') as file:
+        properties = None
+        start_line = 0
+        # components nested in the VEVENT, such as VALARM, have properties of their own
+        depth = 0
+        for line_number, line in unfold(decode_lines(file)):
+            name, params, value = split_property(line)
+            if properties is None:
+                if name == 'BEGIN' and value.upper() == 'VEVENT':
+                    properties, start_line = {}, line_number
+            elif name == 'BEGIN':
+                depth += 1
+            elif name == 'END' and depth:
+                depth -= 1
+            elif name == 'END' and value.upper() == 'VEVENT':
+                try:
+                    yield start_line, build_event(properties)
+                except ValueError as e:
+                    yield start_line, e
+                properties = None
+            elif not depth or name == INVALID:
+                properties.setdefault(name, []).append((params, value))
+
+
+def import_events(manager, path, chunk_size=10000):
+    """
+    Import events from an .ics file.
+
+    The file is read in chunks of events, so memory does not depend on its size. Every chunk
+    is added to the indexes at once, invalid events are reported without stopping the import,
+    and the events are saved once at the end.
+
+    :param manager: EventManager to import to.
+    :param path: Path to the .ics file.
+    :param chunk_size: Number of events added at a time.
+    :return: ImportReport.
+    """
+    report = ImportReport('events', 'events')
+    start = time.perf_counter()
+    events = read_events(path)
+    try:
+        while True:
+            chunk = list(islice(events, chunk_size))
+            if not chunk:
+                break
+            valid = []
+            for line_number, event in chunk:
+                if isinstance(event, Exception):
+                    report.add_error(line_number, str(event))
+                else:
+                    valid.append(event)
+            manager.add_events(valid)
+            report.imported += len(valid)
+    finally:
+        # the chunks already added are saved even if reading the file fails
+        if report.imported:
+            manager.save_events()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def fold(line):
+    """
+    Fold a content line into lines of at most LINE_LENGTH octets, never splitting a UTF-8 character.
+    """
+    if len(line) <= LINE_LENGTH and line.isascii():
+        return line + '\r\n'
+    parts = []
+    current, size = '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        # continuation lines start with a space, which counts towards their length
+        if size + char_size > LINE_LENGTH:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def format_ical_date_time(date_time):
+    return date_time.strftime(ICAL_DATE_TIME)
+
+
+def event_lines(event, stamp):
+    yield f'UID:event-{event.event_id}@task-manager'
+    yield f'DTSTAMP:{stamp}'
+    yield f'DTSTART:{format_ical_date_time(event.date_time)}'
+    if event.duration:
+        yield f'DTEND:{format_ical_date_time(event.end)}'
+    yield f'SUMMARY:{escape(event.title)}'
+    tags = [tag for tag in event.tags if tag]
+    if tags:
+        yield f'CATEGORIES:{",".join(map(escape, tags))}'
+    recurrence = event.recurrence
+    if recurrence is not None:
+        frequency = {value: key for key, value in FREQUENCIES.items()}[recurrence.frequency]
+        rule = f'FREQ={frequency};INTERVAL={recurrence.interval}'
+        if recurrence.until is not None:
+            rule += f';UNTIL={format_ical_date_time(recurrence.until)}'
+        if recurrence.count is not None:
+            rule += f';COUNT={recurrence.count}'
+        yield f'RRULE:{rule}'
+        if recurrence.exceptions:
+            yield f'EXDATE:{",".join(map(format_ical_date_time, sorted(recurrence.exceptions)))}'
+
+
+def export_events(manager, path):
+    """
+    Export all events to an .ics file, writing one event at a time.
+
+    :return: Number of exported events.
+    """
+    stamp = datetime.now(timezone.utc).strftime(ICAL_DATE_TIME) + 'Z'
+    count = 0
+    # RFC 5545 lines end with CRLF, newline='' keeps them as they are
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Dreamcode team//Task Manager//EN\r\n')
+        for event in manager.events.values():
+            file.write('BEGIN:VEVENT\r\n')
+            file.writelines(map(fold, event_lines(event, stamp)))
+            file.write('END:VEVENT\r\n')
+            count += 1
+        file.write('END:VCALENDAR\r\n')
+    return count
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+import calendar
+
+
+DATE_TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def parse_date_time(text):
+    """
+    Parse a 'YYYY-MM-DD HH:MM' date and time.
+
+    The fixed format is a subset of ISO 8601 parsed by the C fromisoformat, strptime is used
+    only for the text it does not fit.
+
+    :param text: Date and time text.
+    :return: datetime object.
+    """
+    if len(text) == 16 and text[4] == '-' and text[7] == '-' and text[10] == ' ' and text[13] == ':':
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    return datetime.strptime(text, DATE_TIME_FORMAT)
+
+
+def add_months(date_time, months):
+    """
+    Shift the date by whole months, a day missing in the target month falls on its last day.
+    """
+    month_index = date_time.month - 1 + months
+    year, month = date_time.year + month_index // 12, month_index % 12 + 1
+    day = min(date_time.day, calendar.monthrange(year, month)[1])
+    return date_time.replace(year=year, month=month, day=day)
+
+
+class Recurrence:
+    """
+    Repetition rule of a recurring event.
+
+    Occurrences are never stored, they are computed from the rule within a query window. The
+    first occurrence in the window is found arithmetically, so the cost does not depend on how
+    long the event has been repeating.
+    """
+    __slots__ = ('frequency', 'interval', 'until', 'count', 'exceptions')
+
+    FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+    def __init__(self, frequency, interval=1, until=None, count=None, exceptions=None):
+        """
+        Initialize the recurrence rule.
+
+        :param frequency: 'daily', 'weekly' or 'monthly'.
+        :param interval: Repeat every `interval` days, weeks or months (default is 1).
+        :param until: Last date and time an occurrence may start at (default is None, no end).
+        :param count: Number of occurrences, counting the skipped ones (default is None, no end).
+        :param exceptions: Start date and times of the skipped occurrences (default is None).
+        """
+        if frequency not in self.FREQUENCIES:
+            raise ValueError(f'Unknown frequency "{frequency}". Use one of: {", ".join(self.FREQUENCIES)}')
+        if interval < 1:
+            raise ValueError('Interval must be a positive number')
+        if count is not None and count < 1:
+            raise ValueError('Count must be a positive number')
+        self.frequency = frequency
+        self.interval = interval
+        self.until = until
+        self.count = count
+        self.exceptions = set(exceptions or ())
+
+    def occurrence(self, start, index):
+        """
+        Return the start of the occurrence number `index` of an event starting at `start`.
+        """
+        if self.frequency == 'monthly':
+            return add_months(start, index * self.interval)
+        return start + index * self._step()
+
+    def _step(self):
+        return timedelta(days=self.interval * (7 if self.frequency == 'weekly' else 1))
+
+    def _first_index(self, start, window_start):
+        # the number of the first occurrence which may start in the window, or a few before it
+        if window_start <= start:
+            return 0
+        if self.frequency == 'monthly':
+            months = (window_start.year - start.year) * 12 + window_start.month - start.month
+            return max(months // self.interval - 1, 0)
+        return (window_start - start) // self._step()
+
+    def occurrences(self, start, window_start, window_end):
+        """
+        Lazily yield the occurrence starts from `window_start` up to and including `window_end`.
+
+        :param start: Start of the first occurrence.
+        """
+        index = self._first_index(start, window_start)
+        while self.count is None or index < self.count:
+            date_time = self.occurrence(start, index)
+            if date_time > window_end or (self.until is not None and date_time > self.until):
+                return
+            if date_time >= window_start and date_time not in self.exceptions:
+                yield date_time
+            index += 1
+
+    def last_occurrence(self, start):
+        """
+        Return the latest date and time an occurrence may start at, or None for an endless event.
+        """
+        if self.count is not None:
+            try:
+                last = self.occurrence(start, self.count - 1)
+            except (OverflowError, ValueError):
+                # the count outlasts the latest date a datetime can hold
+                return self.until
+            return min(last, self.until) if self.until is not None else last
+        return self.until
+
+    def to_dict(self):
+        recurrence_data = {'frequency': self.frequency, 'interval': self.interval}
+        if self.until is not None:
+            recurrence_data['until'] = self.until.strftime(DATE_TIME_FORMAT)
+        if self.count is not None:
+            recurrence_data['count'] = self.count
+        if self.exceptions:
+            recurrence_data['exceptions'] = sorted(date_time.strftime(DATE_TIME_FORMAT)
+                                                   for date_time in self.exceptions)
+        return recurrence_data
+
+    @classmethod
+    def from_dict(cls, recurrence_data):
+        until = recurrence_data.get('until')
+        return cls(recurrence_data['frequency'], recurrence_data.get('interval', 1),
+                   parse_date_time(until) if until else None, recurrence_data.get('count'),
+                   map(parse_date_time, recurrence_data.get('exceptions', ())))
+
+    def __str__(self):
+        unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[self.frequency]
+        text = f'every {unit}' if self.interval == 1 else f'every {self.interval} {unit}s'
+        if self.count is not None:
+            text += f', {self.count} times'
+        if self.until is not None:
+            text += f', until {self.until.strftime(DATE_TIME_FORMAT)}'
+        if self.exceptions:
+            text += f', {len(self.exceptions)} skipped'
+        return text
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+from heapq import heapify, heappop, heappush
+from itertools import count
+import asyncio
+import threading
+
+
+class ReminderScheduler:
+    """
+    Asyncio scheduler of event reminders.
+
+    Pending reminders are kept in a min-heap ordered by the reminder time. The scheduler
+    sleeps until the earliest one is due, so it takes no CPU while idle whatever the number
+    of pending reminders. A changed event only replaces its own heap entry: the old entry is
+    marked cancelled and dropped when it reaches the top of the heap.
+
+    The event loop runs in a background thread, next to the console input loop.
+    """
+
+    def __init__(self, notifier, lead_time=timedelta(minutes=15), clock=datetime.now):
+        """
+        Initialize the scheduler.
+
+        :param notifier: Function called with the event and the start of its occurrence when a reminder is due.
+        :param lead_time: How long before the event start the reminder is due (default is 15 minutes).
+        :param clock: Function returning the current date and time.
+        """
+        self.notifier = notifier
+        self.lead_time = lead_time
+        self.clock = clock
+        # heap of [reminder time, sequence number, event, occurrence start, active] entries
+        self.heap = []
+        self.entries = {}
+        self._sequence = count()
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+
+    def _next_occurrence(self, event, after):
+        if event.recurrence is None:
+            return event.date_time if event.date_time > after else None
+        return next(event.recurrence.occurrences(event.date_time, after + timedelta(microseconds=1), datetime.max),
+                    None)
+
+    def _entry(self, event, after):
+        occurrence = self._next_occurrence(event, after)
+        if occurrence is None:
+            return None
+        entry = [occurrence - self.lead_time, next(self._sequence), event, occurrence, True]
+        self.entries[event.event_id] = entry
+        return entry
+
+    def _cancel(self, event_id):
+        entry = self.entries.pop(event_id, None)
+        if entry is not None:
+            entry[-1] = False
+
+    def _schedule(self, event):
+        self._cancel(event.event_id)
+        entry = self._entry(event, self.clock())
+        if entry is not None:
+            heappush(self.heap, entry)
+            if entry is self.heap[0] and self._wakeup is not None:
+                # the new reminder is due before the one the loop sleeps for
+                self._wakeup.set()
+
+    def _schedule_all(self, events):
+        now = self.clock()
+        for event in events:
+            self._cancel(event.event_id)
+            entry = self._entry(event, now)
+            if entry is not None:
+                self.heap.append(entry)
+        heapify(self.heap)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _call(self, function, *args):
+        # the heap is changed only in the loop thread
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(function, *args)
+        else:
+            function(*args)
+
+    def schedule(self, event):
+        """
+        Schedule the reminder of the next occurrence of the event, replacing the one scheduled before.
+        """
+        self._call(self._schedule, event)
+
+    def schedule_all(self, events):
+        """
+        Schedule the reminders of many events, building the heap at once.
+        """
+        self._call(self._schedule_all, list(events))
+
+    def cancel(self, event_id):
+        """
+        Cancel the reminder of the event.
+        """
+        self._call(self._cancel, event_id)
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and (not self.heap[0][-1] or self.heap[0][0] <= now):
+            entry = heappop(self.heap)
+            if entry[-1]:
+                del self.entries[entry[2].event_id]
+                due.append(entry)
+        return due
+
+    async def run(self):
+        """
+        Fire the reminders as they fall due, until the task is cancelled.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            now = self.clock()
+            for _, _, event, occurrence, _ in self._pop_due(now):
+                self.notifier(event, occurrence)
+                # a recurring event is reminded of its following occurrence
+                entry = self._entry(event, occurrence)
+                if entry is not None:
+                    heappush(self.heap, entry)
+
+            self._wakeup.clear()
+            timeout = (self.heap[0][0] - now).total_seconds() if self.heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """
+        Start the scheduler loop in a background thread.
+        """
+        started = threading.Event()
+
+        async def main():
+            self._loop = asyncio.get_running_loop()
+            task = asyncio.ensure_future(self.run())
+            started.set()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        self._thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        """
+        Stop the scheduler loop and wait for its thread.
+        """
+        if self._loop is not None:
+            loop, self._loop = self._loop, None
+            loop.call_soon_threadsafe(self._cancel_tasks, loop)
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def _cancel_tasks(loop):
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
@@ -3,7 +3,10 @@ import shutil
 import re
 import pathlib
 import logging
+import json
+from functools import lru_cache
 from View.base_view import ConsoleView
+from FileManager import sort_engine
 
 # Настройка логгирования
 logging.basicConfig(filename='file_sorter.log', level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -23,14 +26,42 @@ DIRECTORIES = {
                     ".sh", ".html", ".css", ".js", ".go", ".json"]
 }
 
+ARCHIVE_EXTENSIONS = [".zip", ".tar", ".gz", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz"]
+ARCHIVES_DIRECTORY = "Archives"
+UNKNOWN_DIRECTORY = "Unknown"
+# user categories, a JSON object mapping a directory name to its extensions, next to this module
+CATEGORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_sorter_categories.json")
+
+TRANSLIT = {'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shc', 'ъ': '',
+            'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+            'і': 'i', 'ї': 'yi', 'є': 'ye', 'ґ': 'g'}
+# a single pass over the name for all letters, capitals are transliterated to lowercase
+TRANSLIT_TABLE = str.maketrans({**TRANSLIT, **{cyr.upper(): lat for cyr, lat in TRANSLIT.items()}})
+SPECIAL_CHARACTERS = re.compile(r'[^\w\s-]')
+WHITESPACE = re.compile(r'\s+')
+NORMALIZE_CACHE_SIZE = 65536
+
 rename_counter = 0
 path_for_count = ""
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_name(name):
+    name = name.translate(TRANSLIT_TABLE).lower()
+    name = SPECIAL_CHARACTERS.sub('_', name)
+    return WHITESPACE.sub(' ', name).strip().replace(' ', '_')
+
+
 def normalize(name):
     """
     Normalize file name to replace special characters and spaces with underscores.
 
+    Cyrillic letters are transliterated with one translation table, and the results of
+    repeated names come from a bounded LRU cache.
+
     Args:
         name (str): File name to be normalized.
 
@@ -38,22 +69,8 @@ def normalize(name):
         str: Normalized file name.
     """
     global rename_counter
-
-    translit = {'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-                'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-                'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-                'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shc', 'ъ': '',
-                'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'}
-    name = name.lower()
-
-    for cyr, lat in translit.items():
-        name = name.replace(cyr, lat)
-    name = re.sub(r'[^\w\s-]', '_', name)
-    name = re.sub(r'\s+', ' ', name)
-    name = name.strip().replace(' ', '_')
     rename_counter += 1
-
-    return name
+    return normalize_name(name)
 
 
 def create_directories(root):
@@ -63,12 +80,130 @@ def create_directories(root):
     Args:
         root (str): Root directory where the directories will be created.
     """
-    for directory in DIRECTORIES:
+    for directory in SORT_DIRECTORIES:
         directory_path = os.path.join(root, directory)
         if not os.path.exists(directory_path):
             os.makedirs(directory_path)
 
 
+def build_extension_map(directories=DIRECTORIES, archive_extensions=ARCHIVE_EXTENSIONS):
+    """
+    Build the map of every known extension to its directory.
+
+    Extensions listed in the directories win over archive extensions, and the first directory
+    listing an extension wins over the next ones, as when they were checked one by one.
+
+    Args:
+        directories (dict): Directory name to a list of extensions.
+        archive_extensions (list): Extensions of the archives.
+
+    Returns:
+        dict: Lowercase extension to directory name.
+    """
+    extension_map = {}
+    for directory, extensions in directories.items():
+        for extension in extensions:
+            extension_map.setdefault(extension.lower(), directory)
+    for extension in archive_extensions:
+        extension_map.setdefault(extension.lower(), ARCHIVES_DIRECTORY)
+    return extension_map
+
+
+# DIRECTORIES and ARCHIVE_EXTENSIONS with the user categories, replaced by register_categories
+SORT_DIRECTORIES = DIRECTORIES
+SORT_ARCHIVE_EXTENSIONS = ARCHIVE_EXTENSIONS
+EXTENSION_MAP = build_extension_map()
+# extensions of two suffixes, such as .tar.gz, checked before the last suffix alone
+MULTI_PART_EXTENSIONS = {extension for extension in EXTENSION_MAP if extension.count('.') > 1}
+
+
+def register_categories(categories):
+    """
+    Add user categories, an extension listed there is moved from its old directory.
+
+    The categories are added to copies of the sort directories, DIRECTORIES and
+    ARCHIVE_EXTENSIONS keep the default ones.
+
+    Args:
+        categories (dict): Directory name to a list of extensions. Extensions listed
+            under ARCHIVES_DIRECTORY are extracted.
+    """
+    global SORT_DIRECTORIES, SORT_ARCHIVE_EXTENSIONS, EXTENSION_MAP, MULTI_PART_EXTENSIONS
+    directories = {directory: list(extensions) for directory, extensions in SORT_DIRECTORIES.items()}
+    archive_extensions = list(SORT_ARCHIVE_EXTENSIONS)
+    for directory, extensions in categories.items():
+        extensions = [extension.lower() if extension.startswith('.') else '.' + extension.lower()
+                      for extension in extensions]
+        for listed in [*directories.values(), archive_extensions]:
+            listed[:] = [extension for extension in listed if extension not in extensions]
+        if directory == ARCHIVES_DIRECTORY:
+            archive_extensions.extend(extensions)
+        else:
+            directories.setdefault(directory, []).extend(extensions)
+    SORT_DIRECTORIES, SORT_ARCHIVE_EXTENSIONS = directories, archive_extensions
+    EXTENSION_MAP = build_extension_map(directories, archive_extensions)
+    MULTI_PART_EXTENSIONS = {extension for extension in EXTENSION_MAP if extension.count('.') > 1}
+
+
+def load_categories(path=CATEGORIES_FILE):
+    """
+    Register the user categories of a JSON file, if it exists.
+
+    Args:
+        path (str): Path to the categories file (default is the one next to this module).
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        register_categories(json.load(file))
+
+
+def split_extension(file_name):
+    """
+    Split a file name into its stem and its known extension, in the case of the name.
+
+    Unlike os.path.splitext, a known multi-part extension such as .tar.gz is kept whole.
+
+    Args:
+        file_name (str): Name or path of the file.
+
+    Returns:
+        tuple: The stem and the extension, which is empty for an unknown one.
+    """
+    dot = file_name.rfind('.')
+    if dot == -1:
+        return file_name, ''
+    if MULTI_PART_EXTENSIONS:
+        second_dot = file_name.rfind('.', 0, dot)
+        if second_dot != -1 and file_name[second_dot:].lower() in MULTI_PART_EXTENSIONS:
+            return file_name[:second_dot], file_name[second_dot:]
+    if file_name[dot:].lower() in EXTENSION_MAP:
+        return file_name[:dot], file_name[dot:]
+    return file_name, ''
+
+
+def classify(file_name):
+    """
+    Find the directory a file is sorted to by its extension, with a dict lookup per suffix.
+
+    Args:
+        file_name (str): Name or path of the file.
+
+    Returns:
+        str: One of the SORT_DIRECTORIES, ARCHIVES_DIRECTORY or UNKNOWN_DIRECTORY.
+    """
+    dot = file_name.rfind('.')
+    if dot == -1:
+        return UNKNOWN_DIRECTORY
+    if MULTI_PART_EXTENSIONS:
+        second_dot = file_name.rfind('.', 0, dot)
+        if second_dot != -1:
+            directory = EXTENSION_MAP.get(file_name[second_dot:].lower())
+            if directory is not None:
+                return directory
+    return EXTENSION_MAP.get(file_name[dot:].lower(), UNKNOWN_DIRECTORY)
+
+
 def process_file(file_path, root):
     """
     Process a file and move it to the corresponding directory based on its extension.
@@ -77,22 +212,20 @@ def process_file(file_path, root):
         file_path (str): Path to the file to be processed.
         root (str): Root directory where the file is located.
     """
+    directory = classify(file_path)
+
+    if directory in SORT_DIRECTORIES:
+        file_directory = os.path.join(root, directory)
+        file_name, file_ext = os.path.splitext(os.path.basename(file_path))
+        file_name = normalize(file_name) + file_ext
+        destination = os.path.join(file_directory, file_name)
+        shutil.move(file_path, destination)
+        logging.info(f"Moved file: {file_name} to {file_directory}")
+        return
 
-    for directory, extensions in DIRECTORIES.items():
-        for extension in extensions:
-            if file_path.lower().endswith(extension):
-                file_directory = os.path.join(root, directory)
-                file_name, file_ext = os.path.splitext(os.path.basename(file_path))
-                file_name = normalize(file_name) + file_ext
-                destination = os.path.join(file_directory, file_name)
-                shutil.move(file_path, destination)
-                logging.info(f"Moved file: {file_name} to {file_directory}")
-                return
-
-    archive_extensions = [".zip", ".tar", ".gz"]
-    if any(file_path.lower().endswith(extension) for extension in archive_extensions):
-        archive_name, _ = os.path.splitext(os.path.basename(file_path))
-        archive_directory = os.path.join(root, "Archives", archive_name)
+    if directory == ARCHIVES_DIRECTORY:
+        archive_name, _ = split_extension(os.path.basename(file_path))
+        archive_directory = os.path.join(root, ARCHIVES_DIRECTORY, archive_name)
         if not os.path.exists(archive_directory):
             os.makedirs(archive_directory)
         shutil.unpack_archive(file_path, archive_directory)
@@ -100,7 +233,7 @@ def process_file(file_path, root):
         os.remove(file_path)
         return
 
-    unknown_directory = os.path.join(root, "Unknown")
+    unknown_directory = os.path.join(root, UNKNOWN_DIRECTORY)
     if not os.path.exists(unknown_directory):
         os.makedirs(unknown_directory)
     destination = os.path.join(unknown_directory, os.path.basename(file_path))
@@ -145,6 +278,7 @@ def run_file_sorter():
     Entry point to run the file sorting process.
     """
     view = ConsoleView()
+    load_categories()
     while True:
         path = view.get_input("Enter the path to directory you want to sort: ")
 
@@ -155,7 +289,7 @@ def run_file_sorter():
             path_for_count = path
             delete_empty_directories(path)
             create_directories(path)
-            process_directory(path)
+            sort_engine.sort_directory(path)
             break
 
 
@@ -0,0 +1,240 @@
+"""
+Parallel file sorting engine.
+
+The tree is scanned with os.scandir in the main thread, which classifies the files and picks
+their destinations in batches. The moves and archive extractions of a batch run in a thread
+or process pool. Only a bounded number of batches wait for the pool, so memory does not
+depend on the size of the tree.
+
+Destinations are chosen only by the scanning thread, in the sorted order of the names, so
+name conflicts are resolved the same way on every run and the workers never race for a name:
+a taken name gets the first free `_1`, `_2`, ... suffix. Names differing only in case are
+taken as the same, since they are the same file on case-insensitive file systems.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
+import os
+import shutil
+import threading
+import time
+
+# the module, not its names: file_sorter imports this module, and its categories can be replaced at run time
+from FileManager import file_sorter
+
+
+MOVE = 'move'
+EXTRACT = 'extract'
+
+
+def run_batch(tasks):
+    """
+    Move or extract a batch of files, in a worker thread or process.
+
+    Args:
+        tasks (list): (operation, source, destination) tuples.
+
+    Returns:
+        list: (operation, source, destination, error message or None) tuples.
+    """
+    results = []
+    for operation, source, destination in tasks:
+        try:
+            if operation == MOVE:
+                shutil.move(source, destination)
+            else:
+                os.makedirs(destination, exist_ok=True)
+                shutil.unpack_archive(source, destination)
+                os.remove(source)
+            results.append((operation, source, destination, None))
+        except Exception as e:
+            if operation == EXTRACT and os.path.isdir(destination) and not os.listdir(destination):
+                os.rmdir(destination)
+            results.append((operation, source, destination, str(e)))
+    return results
+
+
+class SortReport:
+    """
+    Result of a sort: the numbers of moved files and extracted archives and the failed files.
+    """
+    def __init__(self):
+        self.moved = 0
+        self.extracted = 0
+        self.failed = []
+        self.elapsed = 0.0
+
+    @property
+    def files_per_second(self):
+        return (self.moved + self.extracted) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f'Moved {self.moved} files, extracted {self.extracted} archives, {len(self.failed)} failed '
+                f'in {self.elapsed:.2f}s ({self.files_per_second:.0f} files/sec)')
+
+
+class ParallelSorter:
+    """
+    Sorts the files of a directory tree with a pool of workers.
+    """
+    def __init__(self, root, workers=None, processes=False, batch_size=256, max_pending=None):
+        """
+        Initialize ParallelSorter.
+
+        Args:
+            root (str): Root directory to sort.
+            workers (int): Number of workers (default is the number of CPUs).
+            processes (bool): Use a process pool instead of a thread pool. Moves mostly wait for
+                the file system and run well in threads, processes pay off for many archives.
+            batch_size (int): Number of files sent to a worker at a time.
+            max_pending (int): Maximal number of batches waiting for the pool (default is twice the workers).
+        """
+        self.root = root
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_pending = max_pending or 2 * self.workers
+        self.sorted_directories = {
+            os.path.join(root, directory)
+            for directory in (*file_sorter.SORT_DIRECTORIES, file_sorter.ARCHIVES_DIRECTORY,
+                              file_sorter.UNKNOWN_DIRECTORY)}
+        # case-folded names taken in every destination directory, on disk or by the planned moves
+        self.taken = {}
+        self._lock = threading.Lock()
+
+    def scan(self, report):
+        """
+        Yield the file entries of the tree in a deterministic order, skipping the sorted directories.
+
+        As with os.walk, symlinks to files are sorted as files, and symlinks to directories are
+        neither sorted nor followed. A directory or entry which cannot be read is recorded in the
+        failed files of the report and skipped.
+        """
+        stack = [self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                with os.scandir(path) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except OSError as e:
+                self._record(report, [(MOVE, path, None, str(e))])
+                continue
+            directories = []
+            for entry in entries:
+                try:
+                    is_directory = entry.is_dir()
+                    is_symlink = entry.is_symlink()
+                except OSError as e:
+                    self._record(report, [(MOVE, entry.path, None, str(e))])
+                    continue
+                if is_directory:
+                    if not is_symlink and entry.path not in self.sorted_directories:
+                        directories.append(entry.path)
+                else:
+                    yield entry
+            # the subdirectories are visited in the order of their names
+            stack.extend(reversed(directories))
+
+    def _unique(self, directory, stem, extension=''):
+        taken = self.taken.get(directory)
+        if taken is None:
+            taken = self.taken[directory] = {name.casefold() for name in os.listdir(directory)} \
+                if os.path.isdir(directory) else set()
+        name = stem + extension
+        number = 0
+        while name.casefold() in taken:
+            number += 1
+            name = f'{stem}_{number}{extension}'
+        taken.add(name.casefold())
+        return os.path.join(directory, name)
+
+    def plan(self, entry):
+        """
+        Return the (operation, source, destination) task of a file entry.
+        """
+        directory = file_sorter.classify(entry.name)
+        if directory in file_sorter.SORT_DIRECTORIES:
+            stem, extension = os.path.splitext(entry.name)
+            destination = self._unique(os.path.join(self.root, directory), file_sorter.normalize(stem), extension)
+            return MOVE, entry.path, destination
+        if directory == file_sorter.ARCHIVES_DIRECTORY:
+            archive_name, _ = file_sorter.split_extension(entry.name)
+            destination = self._unique(os.path.join(self.root, file_sorter.ARCHIVES_DIRECTORY), archive_name)
+            return EXTRACT, entry.path, destination
+        stem, extension = os.path.splitext(entry.name)
+        destination = self._unique(os.path.join(self.root, file_sorter.UNKNOWN_DIRECTORY), stem, extension)
+        return MOVE, entry.path, destination
+
+    def batches(self, report):
+        batch = []
+        for entry in self.scan(report):
+            batch.append(self.plan(entry))
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _record(self, report, results):
+        with self._lock:
+            for operation, source, destination, error in results:
+                if error is not None:
+                    report.failed.append((source, error))
+                    logging.error(f"Failed to sort {source}: {error}")
+                elif operation == MOVE:
+                    report.moved += 1
+                    logging.info(f"Moved file: {os.path.basename(destination)} to {os.path.dirname(destination)}")
+                else:
+                    report.extracted += 1
+                    logging.info(f"Extracted archive: {os.path.basename(destination)} to {destination}")
+
+    def run(self):
+        """
+        Sort the tree.
+
+        Returns:
+            SortReport: The result of the sort.
+        """
+        report = SortReport()
+        start = time.perf_counter()
+        file_sorter.create_directories(self.root)
+        for directory in (file_sorter.ARCHIVES_DIRECTORY, file_sorter.UNKNOWN_DIRECTORY):
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        pending = threading.BoundedSemaphore(self.max_pending)
+        executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+
+        def done(future, batch):
+            try:
+                self._record(report, future.result())
+            except Exception as e:
+                # the whole batch is lost when a worker process dies
+                self._record(report, [(operation, source, destination, str(e))
+                                      for operation, source, destination in batch])
+            finally:
+                pending.release()
+
+        with executor_class(max_workers=self.workers) as executor:
+            for batch in self.batches(report):
+                # blocks while max_pending batches wait for the pool
+                pending.acquire()
+                future = executor.submit(run_batch, batch)
+                future.add_done_callback(lambda future, batch=batch: done(future, batch))
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def sort_directory(root, workers=None, processes=False):
+    """
+    Sort all files of a directory tree in parallel.
+
+    Args:
+        root (str): Root directory containing the files to be sorted.
+        workers (int): Number of workers (default is the number of CPUs).
+        processes (bool): Use a process pool instead of a thread pool.
+
+    Returns:
+        SortReport: The result of the sort.
+    """
+    print("File sorting in progress ...")
+    report = ParallelSorter(root, workers, processes).run()
+    print(f"File sorting completed. {report}")
+    return report
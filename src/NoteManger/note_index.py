@@ -0,0 +1,365 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date, timedelta
+import json
+import math
+import os
+import re
+
+from data_tools import CompactionPolicy
+
+
+TOKEN = re.compile(r'\w+')
+OR = 'OR'
+PREFIX = '*'
+
+
+def tokenize(text):
+    """
+    Split the text into lowercase word tokens.
+    """
+    return TOKEN.findall(text.casefold())
+
+
+def term_frequencies(texts):
+    """
+    Return the number of occurrences of every term of the texts.
+    """
+    return dict(Counter(token for text in texts for token in tokenize(text)))
+
+
+class DateIndex:
+    """
+    Keys sorted by date, the keys of any date range are a binary search and a slice.
+
+    Dates are kept as their proleptic Gregorian ordinals, so comparisons are integer ones.
+    """
+
+    def __init__(self):
+        # sorted (ordinal, key) tuples
+        self.entries = []
+        self.key_entries = {}
+
+    def add(self, key, day):
+        self.remove(key)
+        entry = (day.toordinal(), key)
+        insort(self.entries, entry)
+        self.key_entries[key] = entry
+
+    def extend(self, keys_days):
+        """
+        Add many keys not in the index yet, sorting the entries once.
+        """
+        for key, day in keys_days:
+            entry = (day.toordinal(), key)
+            self.entries.append(entry)
+            self.key_entries[key] = entry
+        self.entries.sort()
+
+    def remove(self, key):
+        entry = self.key_entries.pop(key, None)
+        if entry is not None:
+            del self.entries[bisect_left(self.entries, entry)]
+
+    def _position(self, day):
+        # (ordinal,) sorts before every entry of the day
+        return bisect_left(self.entries, (day.toordinal(),))
+
+    def between(self, start, end):
+        """
+        Return the keys dated from `start` up to and including `end`, ordered by date.
+        """
+        first = self._position(start)
+        last = self._position(end + timedelta(days=1))
+        return [key for _, key in self.entries[first:last]]
+
+    def month_counts(self, start, end):
+        """
+        Return ((year, month), number of keys) tuples of every month from `start` up to and including `end`.
+        """
+        counts = []
+        month = date(start.year, start.month, 1)
+        first = self._position(month)
+        while month <= end:
+            next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            last = self._position(next_month)
+            counts.append(((month.year, month.month), last - first))
+            month, first = next_month, last
+        return counts
+
+    def first_day(self):
+        return date.fromordinal(self.entries[0][0]) if self.entries else None
+
+    def last_day(self):
+        return date.fromordinal(self.entries[-1][0]) if self.entries else None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FullTextIndex:
+    """
+    Inverted index of the note texts with BM25 ranking.
+
+    Every term maps to the notes containing it and its frequency in each of them, so a query
+    reads only the postings of its own terms instead of scanning every note. The terms are
+    also kept sorted, a prefix query is a binary search and a slice of them.
+
+    Query syntax: words are combined with AND, `OR` separates alternatives and a word ending
+    with `*` matches every term starting with it, e.g. `meet* plan OR budget`.
+    """
+
+    VERSION = 1
+
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Initialize FullTextIndex.
+
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.terms = []
+        self.documents = {}
+        self.total_length = 0
+
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        Build the index of many keys at once, sorting the terms once instead of inserting them one by one.
+
+        :param documents: Dictionary of the term frequencies of every key, see `term_frequencies`.
+        """
+        index = cls()
+        postings = index.postings
+        for key, frequencies in documents.items():
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, {})[key] = frequency
+            index.total_length += sum(frequencies.values())
+        index.documents = documents
+        index.terms = sorted(postings)
+        return index
+
+    def add(self, key, texts):
+        """
+        Index the texts of the key, replacing the ones indexed before.
+        """
+        self.put(key, term_frequencies(texts))
+
+    def put(self, key, frequencies):
+        """
+        Index the term frequencies of the key, replacing the ones indexed before.
+        """
+        self.remove(key)
+        for term, frequency in frequencies.items():
+            self._post(term, key, frequency)
+        self.documents[key] = frequencies
+        self.total_length += sum(frequencies.values())
+
+    def _post(self, term, key, frequency):
+        keys = self.postings.get(term)
+        if keys is None:
+            keys = self.postings[term] = {}
+            insort(self.terms, term)
+        keys[key] = frequency
+
+    def remove(self, key):
+        frequencies = self.documents.pop(key, None)
+        if frequencies is None:
+            return
+        self.total_length -= sum(frequencies.values())
+        for term in frequencies:
+            keys = self.postings[term]
+            del keys[key]
+            if not keys:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def expand(self, word):
+        """
+        Return the indexed terms matching a query word, all the terms starting with it for a prefix word.
+        """
+        if not word.endswith(PREFIX):
+            return [word] if word in self.postings else []
+        prefix = word.rstrip(PREFIX)
+        if not prefix:
+            return []
+        first = bisect_left(self.terms, prefix)
+        last = bisect_left(self.terms, prefix + '\U0010ffff')
+        return self.terms[first:last]
+
+    def parse(self, query):
+        """
+        Split the query into its OR alternatives, each a list of the term lists of its words.
+        """
+        alternatives = [[]]
+        for word in query.split():
+            if word == OR:
+                alternatives.append([])
+                continue
+            prefix = word.endswith(PREFIX)
+            for token in tokenize(word):
+                alternatives[-1].append(self.expand(token + PREFIX if prefix else token))
+        return [words for words in alternatives if words]
+
+    def _matching(self, words):
+        # every word has to match, by any of its terms
+        found = None
+        for terms in sorted(words, key=lambda terms: sum(len(self.postings[term]) for term in terms)):
+            keys = set().union(*(self.postings[term] for term in terms))
+            found = keys if found is None else found & keys
+            if not found:
+                return set()
+        return found
+
+    def score(self, key, terms):
+        """
+        Return the BM25 score of the key for the query terms.
+        """
+        frequencies = self.documents[key]
+        length = sum(frequencies.values())
+        average_length = self.total_length / len(self.documents)
+        total = 0.0
+        for term in terms:
+            frequency = frequencies.get(term)
+            if not frequency:
+                continue
+            count = len(self.postings[term])
+            idf = math.log(1 + (len(self.documents) - count + 0.5) / (count + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            total += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return total
+
+    def search(self, query):
+        """
+        Return the keys matching the query, the best ranked first.
+        """
+        alternatives = self.parse(query)
+        found = set().union(*(self._matching(words) for words in alternatives))
+        if not found:
+            return []
+        terms = {term for words in alternatives for word_terms in words for term in word_terms}
+        scores = {key: self.score(key, terms) for key in found}
+        return sorted(found, key=lambda key: -scores[key])
+
+
+def file_stamp(path):
+    """
+    Return the size and modification time of the file, which change whenever it is rewritten.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class IndexLog(CompactionPolicy):
+    """
+    Append-only log of the full-text index, kept next to the notes file.
+
+    After a header line, every line is a JSON entry: `[key, frequencies]` indexes the terms of a
+    note and `[key, null]` removes it. A save appends the entries of the notes it changed and a
+    `{"stamp": ..., "entries": ...}` line with the stamp of the notes it saved and the number
+    of entries appended since the log was last compacted, so the index is never rewritten as a
+    whole on a save. Once the appended entries outgrow the notes, the log is compacted to one
+    entry per note.
+
+    The log is valid only when its last line is the stamp of the saved notes, which is
+    checked by reading the end of the file, without parsing the entries.
+    """
+
+    VERSION = 1
+    # bytes read from the end of the log to find its last line, which is a short stamp line
+    TAIL_SIZE = 4096
+
+    def __init__(self, path, compact_threshold=1000):
+        """
+        Initialize IndexLog.
+
+        :param path: Path to the log file.
+        :param compact_threshold: Minimal number of appended entries before compaction.
+        """
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self.log_entries = 0
+
+    def is_current(self, stamp):
+        """
+        Check that the log ends with the stamp of the saved notes, so entries can be appended to it.
+
+        :param stamp: Stamp of the saved notes, see `NoteManager.stamp`.
+        """
+        if stamp is None:
+            return False
+        try:
+            with open(self.path, 'rb') as file:
+                file.seek(0, os.SEEK_END)
+                file.seek(max(0, file.tell() - self.TAIL_SIZE))
+                tail = file.read()
+            # a line cut by a crash has no newline and is not a stamp
+            last_line = tail.rsplit(b'\n', 2)[-2] if tail.endswith(b'\n') else b''
+            end = json.loads(last_line)
+        except (OSError, ValueError, IndexError):
+            return False
+        if not isinstance(end, dict) or end.get('stamp') != stamp:
+            return False
+        self.log_entries = end.get('entries', 0)
+        return True
+
+    def load(self, stamp):
+        """
+        Replay the log.
+
+        :param stamp: Stamp of the saved notes.
+        :return: FullTextIndex, or None if the log is missing, unreadable or written for another notes file.
+        """
+        if not self.is_current(stamp):
+            return None
+        documents = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                if json.loads(next(file, 'null')) != {'version': self.VERSION}:
+                    return None
+                for line in file:
+                    entry = json.loads(line)
+                    if isinstance(entry, list):
+                        key, frequencies = entry
+                        if frequencies is None:
+                            documents.pop(key, None)
+                        else:
+                            documents[key] = frequencies
+        except (OSError, ValueError):
+            return None
+        return FullTextIndex.from_documents(documents)
+
+    def append(self, changes, stamp):
+        """
+        Append the entries of a save.
+
+        :param changes: Dictionary of the term frequencies of the changed keys, None for the removed ones.
+        :param stamp: Stamp of the notes written by the save.
+        """
+        self.log_entries += len(changes)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            for key, frequencies in changes.items():
+                file.write(json.dumps([key, frequencies], ensure_ascii=False) + '\n')
+            file.write(json.dumps({'stamp': stamp, 'entries': self.log_entries}) + '\n')
+
+    def compact(self, index, stamp):
+        """
+        Write one entry per key of the index, replacing the log atomically.
+
+        :param index: FullTextIndex of all notes.
+        :param stamp: Stamp of the notes written by the save.
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'version': self.VERSION}) + '\n')
+            for key, frequencies in index.documents.items():
+                file.write(json.dumps([key, frequencies], ensure_ascii=False) + '\n')
+            file.write(json.dumps({'stamp': stamp, 'entries': 0}) + '\n')
+        os.replace(tmp_path, self.path)
+        self.log_entries = 0
@@ -1,9 +1,36 @@
-from datetime import date
+from datetime import date, datetime
 from base_view import NoteConsoleView
 from common import CommandHandler, handle_error
+from data_tools import KeyIndex
+from note_index import DateIndex, FullTextIndex, IndexLog, file_stamp, term_frequencies
+from note_storage import NoteStorage
 import json
 
 
+NOTE_DATE_FORMAT = '%d-%m-%Y'
+
+
+def parse_note_date(note_date):
+    """
+    Returns the date of a note from its saved form.
+
+    Args:
+        note_date: A date, its ordinal, or a "DD-MM-YYYY" text saved by older versions.
+
+    Returns:
+        date: The date of the note.
+    """
+    if isinstance(note_date, date):
+        return note_date
+    if isinstance(note_date, int):
+        return date.fromordinal(note_date)
+    return datetime.strptime(note_date, NOTE_DATE_FORMAT).date()
+
+
+def input_note_date(text):
+    return datetime.strptime(text.strip(), NOTE_DATE_FORMAT).date()
+
+
 class Note:
     """
     Represents a note with title, content, and tags.
@@ -12,8 +39,13 @@ class Note:
         title (str): The title of the note.
         content (str): The content of the note.
         tags (list): The tags associated with the note.
+        note_date (date): The date of the note, saved as its ordinal.
+        note_id (int): The unique id of the note.
+        content_hash (str): The hash of the stored content, None until the content is saved.
+
+    The content of a saved note stays in the blob file of its storage and is read only when accessed.
     """
-    def __init__(self, title, content, tags, note_date=None):
+    def __init__(self, title, content, tags, note_date=None, note_id=None):
         """
         Initializes a Note object with the provided title, content, and tags.
 
@@ -21,14 +53,53 @@ class Note:
             title (str): The title of the note.
             content (str): The content of the note.
             tags (list): The tags associated with the note.
+            note_date: The date of the note, see parse_note_date (default is today).
+            note_id (int): The unique id of the note, assigned by NoteManager if not given.
         """
         self.title = title
         self.tags = tags
+        self.storage = None
+        self.content_hash = None
         self.content = content
         if note_date:
-            self.note_date = note_date
+            self.note_date = parse_note_date(note_date)
         else:
-            self.note_date = date.today().strftime("%d-%m-%Y")
+            self.note_date = date.today()
+        self.note_id = note_id
+
+    @property
+    def content(self):
+        if self.content_hash is not None:
+            return self.storage.read(self.content_hash)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self.content_hash = None
+
+    @classmethod
+    def from_dict(cls, note_data, storage):
+        """
+        Creates a Note from its saved data, with its content left in the storage.
+        """
+        note = cls(note_data['title'], None, note_data['tags'], note_data['note_date'], note_data['note_id'])
+        note.storage = storage
+        note.content_hash = note_data['content_hash']
+        return note
+
+    def to_dict(self):
+        return {'title': self.title, 'tags': self.tags, 'note_date': self.note_date.toordinal(),
+                'note_id': self.note_id, 'content_hash': self.content_hash}
+
+    def store(self, storage):
+        """
+        Writes the content to the storage if it is not stored yet, then releases it from memory.
+        """
+        if self.content_hash is None:
+            self.content_hash = storage.write(self._content)
+            self.storage = storage
+            self._content = None
 
     def __str__(self):
         """
@@ -37,7 +108,7 @@ class Note:
         Returns:
             str: A string containing the title, tags, and content of the note.
         """
-        return f"Title: {self.title}\nTags: {', '.join(self.tags)}\nContent: {self.content}\nDate: {self.note_date}"
+        return f"Title: {self.title}\nTags: {', '.join(self.tags)}\nContent: {self.content}\nDate: {self.note_date.strftime(NOTE_DATE_FORMAT)}"
 
 
 class NoteManager:
@@ -47,8 +118,14 @@ class NoteManager:
 
     Attributes:
         file_path (str): The file path to store notes.
-        notes (list): A list of Note objects representing the notes.
+        notes (dict): The Note objects representing the notes, keyed by their ids.
         view: The view object for input/output.
+        index (FullTextIndex): Full-text index of the notes, loaded on first use.
+        index_log (IndexLog): Log of the full-text index changes, kept next to the notes file.
+        title_index (KeyIndex): Ids of the notes by their title.
+        tag_index (KeyIndex): Ids of the notes by their tags, with the number of notes of every tag.
+        date_index (DateIndex): Ids of the notes sorted by their date.
+        storage (NoteStorage): Storage of the note metadata and contents.
     """
     def __init__(self, file_path, view):
         """
@@ -59,34 +136,174 @@ class NoteManager:
             view: The view object for input/output.
         """
         self.file_path = file_path
-        self.notes = self.load_notes()
         self.view = view
+        self.storage = NoteStorage(file_path)
+        self.notes = self.load_notes()
+        self._next_id = max(self.notes, default=-1) + 1
+        self.title_index = KeyIndex()
+        self.tag_index = KeyIndex()
+        self.date_index = DateIndex()
+        for note in self.notes.values():
+            self._index_keys(note)
+        self.date_index.extend((note.note_id, note.note_date) for note in self.notes.values())
+        self.index_log = IndexLog(file_path + '.index')
+        self._full_text_index = None
+        # term frequencies of the notes changed since the last save, None for the deleted ones,
+        # their metadata is appended to the log of the storage on the next save
+        self._index_changes = {}
+        # the index was rebuilt, so the log has to be compacted on the next save
+        self._index_rebuilt = False
+        if self.storage.legacy:
+            # notes files of older versions are converted to the metadata file and the blob file
+            self.save_notes()
 
     def load_notes(self):
         """
-        Loads notes from a JSON file.
+        Loads the note metadata, the contents are read from the blob file when accessed.
 
         Returns:
-            list: A list of Note objects representing the loaded notes.
+            dict: The Note objects representing the loaded notes, keyed by their ids.
         """
         try:
-            with open(self.file_path, 'r') as file:
-                notes_data = json.load(file)
+            notes_data = self.storage.load()
+            if self.storage.legacy:
                 notes = [Note(**note_data) for note_data in notes_data]
-                return notes
-        except FileNotFoundError:
-            return []
+                # notes saved by older versions have no ids
+                if any(note.note_id is None for note in notes):
+                    for note_id, note in enumerate(notes):
+                        note.note_id = note_id
+            else:
+                notes = [Note.from_dict(note_data, self.storage) for note_data in notes_data]
+            return {note.note_id: note for note in notes}
         except json.JSONDecodeError:
             self.view.display_error('File format error')
-            return []
+            return {}
+
+    @property
+    def index(self):
+        if self._full_text_index is None:
+            self._full_text_index = self.load_index()
+        return self._full_text_index
+
+    def load_index(self):
+        """
+        Replays the full-text index log, rebuilding the index if the log is missing or out of date.
+
+        Returns:
+            FullTextIndex: The index of all notes.
+        """
+        index = self.index_log.load(self.stamp())
+        if index is None:
+            index = FullTextIndex.from_documents(
+                {note.note_id: term_frequencies(self.note_texts(note)) for note in self.notes.values()})
+            self._index_rebuilt = True
+        else:
+            # the notes changed since the last save are not in the log yet
+            for note_id, frequencies in self._index_changes.items():
+                if frequencies is None:
+                    index.remove(note_id)
+                else:
+                    index.put(note_id, frequencies)
+        return index
+
+    def stamp(self):
+        """
+        Returns the stamp of the saved notes, which the index log has to end with to be current.
+
+        The metadata log changes on every save, so it is stamped along with the notes file.
+        """
+        return [file_stamp(self.file_path), file_stamp(self.storage.log_path)]
+
+    @staticmethod
+    def note_texts(note):
+        return [note.title, note.content, note.note_date.strftime(NOTE_DATE_FORMAT), *note.tags]
 
     def save_notes(self):
         """
-        Saves notes to a JSON file.
+        Saves the note metadata, the new contents and the full-text index changes.
+
+        Only the contents changed since the last save are appended to the blob file, only the
+        metadata of the changed notes to the log of the storage, and only their index entries
+        to the index log. The notes file is rewritten only by the compaction, once the log
+        grows as big as the notes.
+        """
+        for note in self.notes.values():
+            note.store(self.storage)
+        content_hashes = [note.content_hash for note in self.notes.values()]
+        if self.storage.needs_blob_compaction(content_hashes):
+            self.storage.compact_blobs(content_hashes)
+        # the log can be appended to only while it ends with the stamp of the saved notes
+        compact = (self._index_rebuilt or not self.index_log.is_current(self.stamp())
+                   or self.index_log.needs_compaction(len(self.notes)))
+        if compact:
+            # loaded before the saved notes change, while the log still matches them
+            index = self.index
+        if self.storage.should_snapshot(len(self._index_changes), len(self.notes)):
+            self.storage.compact(note.to_dict() for note in self.notes.values())
+        else:
+            for note_id in self._index_changes:
+                note = self.notes.get(note_id)
+                if note is None:
+                    self.storage.append(NoteStorage.DELETE, note_id)
+                else:
+                    self.storage.append(NoteStorage.PUT, note_id, note.to_dict())
+            self.storage.flush()
+            if self.storage.needs_compaction(len(self.notes)):
+                self.storage.compact(note.to_dict() for note in self.notes.values())
+        if compact:
+            self.index_log.compact(index, self.stamp())
+            self._index_rebuilt = False
+        else:
+            self.index_log.append(self._index_changes, self.stamp())
+        self._index_changes = {}
+
+    def _index_keys(self, note):
+        self.title_index.add(note.note_id, [note.title])
+        self.tag_index.add(note.note_id, [tag.strip() for tag in note.tags if tag.strip()])
+
+    def _index(self, note):
+        self._index_keys(note)
+        self.date_index.add(note.note_id, note.note_date)
+        frequencies = self._index_changes[note.note_id] = term_frequencies(self.note_texts(note))
+        if self._full_text_index is not None:
+            self._full_text_index.put(note.note_id, frequencies)
+
+    def _remove(self, note):
+        del self.notes[note.note_id]
+        self.title_index.remove(note.note_id)
+        self.tag_index.remove(note.note_id)
+        self.date_index.remove(note.note_id)
+        self._index_changes[note.note_id] = None
+        if self._full_text_index is not None:
+            self._full_text_index.remove(note.note_id)
+
+    def find_by_title(self, title):
+        """
+        Returns the first note with the title, or None.
+        """
+        note_id = self.title_index.first(title)
+        return self.notes[note_id] if note_id is not None else None
+
+    def find_by_tag(self, tag):
+        return [self.notes[note_id] for note_id in self.tag_index.find(tag.strip())]
+
+    def notes_between(self, start, end):
+        """
+        Returns the notes dated from start up to and including end, ordered by date.
+        """
+        return [self.notes[note_id] for note_id in self.date_index.between(start, end)]
+
+    def month_counts(self, start=None, end=None):
         """
-        notes_data = [note.__dict__ for note in self.notes]
-        with open(self.file_path, 'w') as file:
-            json.dump(notes_data, file, indent=4)
+        Returns ((year, month), number of notes) tuples of every month from start up to and including end.
+
+        The range defaults to the months from the first note to the last one.
+        """
+        start = start or self.date_index.first_day()
+        end = end or self.date_index.last_day()
+        if start is None or end is None:
+            return []
+        return self.date_index.month_counts(start, end)
 
     @handle_error
     def add_note(self):
@@ -96,16 +313,23 @@ class NoteManager:
         title = self.view.get_input('Enter note title: ')
         content = self.view.get_input('Enter note content: ')
         tags = self.view.get_input('Enter tags separated by commas: ').split(',')
-        note = Note(title, content, tags)
-        self.notes.append(note)
+        note = Note(title, content, tags, note_id=self._next_id)
+        self._next_id += 1
+        self.notes[note.note_id] = note
+        self._index(note)
         self.save_notes()
         self.view.display_message('Note added successfully.')
 
     @handle_error
     def search_note(self):
-        query = self.view.get_input('Enter search query: ')
-        results = [note for note in self.notes if query in note.title or query in note.content
-                   or any(query in tag for tag in note.tags) or query in note.note_date]
+        """
+        Searches notes by words of their title, content, tags and date, the best matches first.
+
+        Words are combined with AND, OR separates alternatives and a word ending with * matches
+        every word starting with it.
+        """
+        query = self.view.get_input('Enter search query (words, OR, prefix*): ')
+        results = [self.notes[note_id] for note_id in self.index.search(query)]
         if results:
             self.view.display_message('Search results:')
             self.view.display_notes_list(results)
@@ -115,16 +339,17 @@ class NoteManager:
     @handle_error
     def edit_note(self):
         title = self.view.get_input('Enter the title of the note you want to edit: ')
-        for note in self.notes:
-            if note.title == title:
-                self.view.display_note_details(note)
-                new_content = self.view.get_input('Enter the new content for the note: ')
-                note.content = new_content
-                self.save_notes()
-                self.view.display_message('Note successfully edited. Updated details:')
-                self.view.display_note_details(note)
-                return
-        self.view.display_error('Note not found.')
+        note = self.find_by_title(title)
+        if note is None:
+            self.view.display_error('Note not found.')
+            return
+        self.view.display_note_details(note)
+        new_content = self.view.get_input('Enter the new content for the note: ')
+        note.content = new_content
+        self._index(note)
+        self.save_notes()
+        self.view.display_message('Note successfully edited. Updated details:')
+        self.view.display_note_details(note)
 
     @handle_error
     def delete_note(self):
@@ -132,33 +357,75 @@ class NoteManager:
         Deletes an existing note.
         """
         title = self.view.get_input('Enter the title of the note you want to delete: ')
-        for note in self.notes:
-            if note.title == title:
-                self.notes.remove(note)
-                self.save_notes()
-                self.view.display_message('Note successfully deleted.')
-                return
-        self.view.display_error('Note not found.')
+        note = self.find_by_title(title)
+        if note is None:
+            self.view.display_error('Note not found.')
+            return
+        self._remove(note)
+        self.save_notes()
+        self.view.display_message('Note successfully deleted.')
 
     @handle_error
     def add_tag_to_note(self):
         title = self.view.get_input('Enter the title of the note to which you want to add a tag: ')
-        for note in self.notes:
-            if note.title == title:
-                tag = self.view.get_input('Enter the tag: ')
-                note.tags.append(tag)
-                self.save_notes()
-                self.view.display_message('Tag successfully added to the note. Updated details:')
-                self.view.display_note_details(note)
-                return
-        self.view.display_error('Note not found.')
+        note = self.find_by_title(title)
+        if note is None:
+            self.view.display_error('Note not found.')
+            return
+        tag = self.view.get_input('Enter the tag: ')
+        note.tags.append(tag)
+        self._index(note)
+        self.save_notes()
+        self.view.display_message('Tag successfully added to the note. Updated details:')
+        self.view.display_note_details(note)
 
     @handle_error
     def show_all_notes(self):
         if not self.notes:
             self.view.display_error('No notes found.')
             return
-        self.view.display_notes_list(self.notes)
+        self.view.display_notes_list(self.notes.values())
+
+    @handle_error
+    def show_notes_by_tag(self):
+        tag = self.view.get_input('Enter the tag: ')
+        notes = self.find_by_tag(tag)
+        if not notes:
+            self.view.display_error('No notes found with this tag.')
+            return
+        self.view.display_notes_list(notes)
+
+    @handle_error
+    def show_notes_between(self):
+        start = input_note_date(self.view.get_input('Enter the start date (DD-MM-YYYY): '))
+        end = input_note_date(self.view.get_input('Enter the end date (DD-MM-YYYY): '))
+        notes = self.notes_between(start, end)
+        if not notes:
+            self.view.display_error('No notes found in this period.')
+            return
+        self.view.display_notes_list(notes)
+
+    @handle_error
+    def show_month_counts(self):
+        """
+        Shows the number of notes of every month, from the first note to the last one.
+        """
+        month_counts = self.month_counts()
+        if not month_counts:
+            self.view.display_error('No notes found.')
+            return
+        self.view.display_month_counts(month_counts)
+
+    @handle_error
+    def show_tag_cloud(self):
+        """
+        Shows every tag with the number of its notes, the most used tags first.
+        """
+        tag_counts = self.tag_index.counts()
+        if not tag_counts:
+            self.view.display_error('No tags found.')
+            return
+        self.view.display_tag_cloud(tag_counts)
 
 
 class NoteCommandHandler(CommandHandler):
@@ -186,6 +453,10 @@ class NoteCommandHandler(CommandHandler):
             "4": ("Delete note", manager.delete_note),
             "5": ("Add tag to note", manager.add_tag_to_note),
             "6": ("Show all notes", manager.show_all_notes),
+            "7": ("Show notes by tag", manager.show_notes_by_tag),
+            "8": ("Tag cloud", manager.show_tag_cloud),
+            "9": ("Show notes between dates", manager.show_notes_between),
+            "10": ("Notes per month", manager.show_month_counts),
             "0": ("Return to Main Menu", self.return_to_main_menu())
         }
         super().__init__(commands, view)
@@ -205,6 +476,7 @@ def run_note_manager():
         options = note_command_handler.get_commands_for_display()
         choice = view.display_menu(program_name, options)
         if choice == '0':
+            manager.storage.close()
             return
         else:
             note_command_handler.handle_command(choice)
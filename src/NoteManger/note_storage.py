@@ -0,0 +1,276 @@
+import hashlib
+import json
+import mmap
+import os
+
+from data_tools import CompactionPolicy
+
+
+class NoteStorage(CompactionPolicy):
+    """
+    Content-addressed storage of the notes.
+
+    The notes file is a small metadata index: the title, tags and date of every note and the
+    hash, offset and length of its content. The contents are kept apart, in an append-only
+    blob file read through mmap, so loading and listing the notes never reads their bodies
+    and a save appends only the contents not stored yet. Equal contents are stored once.
+
+    The notes file is a snapshot of the metadata, and a save appends only the metadata of the
+    changed notes to a log next to it, one JSON entry per line. The log starts with the number
+    of the snapshot it continues, so the log of an older snapshot, left by a crash in the middle
+    of a compaction, is never replayed over a newer one. Once the log outgrows the notes, the
+    metadata is compacted into a new snapshot.
+
+    Replaced contents stay in the blob file until the dead bytes outgrow the live ones, then
+    the live contents are copied to a new blob file, which the next snapshot is switched to.
+
+    Notes files written as a single JSON list with the contents inline by older versions
+    are still read.
+    """
+
+    VERSION = 1
+    PUT = 'put'
+    DELETE = 'delete'
+
+    def __init__(self, file_path, compact_threshold=1000, blob_compact_threshold=1 << 20):
+        """
+        Initialize NoteStorage.
+
+        :param file_path: Path to the notes metadata file.
+        :param compact_threshold: Minimal number of log entries before the metadata is compacted.
+        :param blob_compact_threshold: Minimal number of dead bytes in the blob file before compaction.
+        """
+        self.file_path = file_path
+        self.log_path = file_path + '.log'
+        self.compact_threshold = compact_threshold
+        self.blob_compact_threshold = blob_compact_threshold
+        self.log_entries = 0
+        self.blob_name = os.path.basename(file_path) + '.blobs'
+        # content hash -> (offset, length) of the content in the blob file
+        self.blobs = {}
+        self.size = 0
+        # the last load read a notes file written by an older version
+        self.legacy = False
+        self._file = None
+        self._log_file = None
+        self._map = None
+        self._generation = 0
+        # number of the last snapshot, the log continues it
+        self._snapshot = 0
+        self._old_blob_path = None
+
+    @property
+    def blob_path(self):
+        return os.path.join(os.path.dirname(self.file_path), self.blob_name)
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+    def load(self):
+        """
+        Load the metadata of the notes by replaying the snapshot and the log, leaving their contents
+        in the blob file.
+
+        :return: List of note data. The data of a note has its `content_hash` instead of its
+            content, except for notes read from a legacy notes file.
+        """
+        self.close()
+        self.legacy = False
+        self.blobs = {}
+        self._snapshot = 0
+        notes = {}
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                metadata = json.load(file)
+            if isinstance(metadata, list):
+                self.legacy = True
+                return metadata
+            self.blob_name = metadata['blob_file']
+            self._generation = metadata.get('generation', 0)
+            self._snapshot = metadata.get('snapshot', 0)
+            notes = {note_data['note_id']: note_data for note_data in metadata['notes']}
+        self._replay(notes)
+        for note_data in notes.values():
+            self.blobs[note_data['content_hash']] = (note_data.pop('offset'), note_data.pop('length'))
+        self.size = os.path.getsize(self.blob_path) if os.path.exists(self.blob_path) else 0
+        return list(notes.values())
+
+    def _replay(self, notes):
+        self.log_entries = 0
+        if not os.path.exists(self.log_path):
+            return
+        valid_size = 0
+        with open(self.log_path, 'rb') as file:
+            for line in file:
+                try:
+                    # a line without its newline was torn by a crash in the middle of a write
+                    entry = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    entry = None
+                if not valid_size:
+                    # the log of another snapshot is dropped as a whole
+                    if entry != {'snapshot': self._snapshot}:
+                        break
+                elif not isinstance(entry, dict):
+                    break
+                elif entry['op'] == self.PUT:
+                    notes[entry['note']['note_id']] = entry['note']
+                    self.log_entries += 1
+                else:
+                    notes.pop(entry['note_id'], None)
+                    self.log_entries += 1
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.log_path) and os.access(self.log_path, os.W_OK):
+            # drop the torn tail, or the entries appended after it would never be read
+            with open(self.log_path, 'r+b') as file:
+                file.truncate(valid_size)
+
+    def _mapped(self, end):
+        # the map is created again when the blob file has grown past it
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            self.flush()
+            with open(self.blob_path, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self, content_hash):
+        """
+        Read a content from the blob file.
+        """
+        offset, length = self.blobs[content_hash]
+        if not length:
+            return ''
+        return self._mapped(offset + length)[offset:offset + length].decode('utf-8')
+
+    def write(self, content):
+        """
+        Append a content to the blob file, unless it is already stored.
+
+        :return: Hash of the content.
+        """
+        content_hash = self.content_hash(content)
+        if content_hash not in self.blobs:
+            data = content.encode('utf-8')
+            if self._file is None:
+                self._file = open(self.blob_path, 'ab')
+            self._file.write(data)
+            self.blobs[content_hash] = (self.size, len(data))
+            self.size += len(data)
+        return content_hash
+
+    def append(self, op, note_id, note_data=None):
+        """
+        Append the metadata of a single changed note to the log.
+
+        :param op: NoteStorage.PUT or NoteStorage.DELETE.
+        :param note_id: Id of the changed note.
+        :param note_data: Data of the changed note with its `content_hash` (for PUT only).
+        """
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'a', encoding='utf-8')
+            if not self._log_file.tell():
+                self._log_file.write(json.dumps({'snapshot': self._snapshot}) + '\n')
+        if op == self.PUT:
+            offset, length = self.blobs[note_data['content_hash']]
+            entry = {'op': op, 'note': {**note_data, 'offset': offset, 'length': length}}
+        else:
+            entry = {'op': op, 'note_id': note_id}
+        self._log_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.log_entries += 1
+
+    def flush(self):
+        # the contents are synced first, so a logged note never refers to contents lost by a crash
+        for file in (self._file, self._log_file):
+            if file is not None:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def should_snapshot(self, changed, size):
+        # a legacy notes file and contents moved to a new blob file are written as a new snapshot
+        return self.legacy or self._old_blob_path is not None or super().should_snapshot(changed, size)
+
+    def needs_blob_compaction(self, content_hashes):
+        """
+        Compaction of the blob file is due when its dead bytes outgrow the live ones.
+
+        :param content_hashes: Hashes of the contents of all notes.
+        """
+        live = sum(self.blobs[content_hash][1] for content_hash in set(content_hashes))
+        return self.size - live >= max(self.blob_compact_threshold, live)
+
+    def compact_blobs(self, content_hashes):
+        """
+        Copy the live contents to a new blob file, used by the notes file from the next snapshot on.
+
+        The old blob file is removed only after the notes file refers to the new one, so a crash
+        at any point leaves a notes file with its own blob file.
+
+        :param content_hashes: Hashes of the contents of all notes.
+        """
+        self.close()
+        old_path = self.blob_path
+        self._generation += 1
+        self.blob_name = f'{os.path.basename(self.file_path)}.{self._generation}.blobs'
+        blobs = {}
+        size = 0
+        with open(old_path, 'rb') as old_file, open(self.blob_path, 'wb') as file:
+            with mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) as old_map:
+                for content_hash in dict.fromkeys(content_hashes):
+                    offset, length = self.blobs[content_hash]
+                    file.write(old_map[offset:offset + length])
+                    blobs[content_hash] = (size, length)
+                    size += length
+            file.flush()
+            os.fsync(file.fileno())
+        self.blobs = blobs
+        self.size = size
+        self._old_blob_path = old_path
+
+    def compact(self, notes_data):
+        """
+        Write a new snapshot of the metadata of all notes, replacing the notes file atomically, and
+        start an empty log.
+
+        :param notes_data: Iterable of note data with the `content_hash` of every note.
+        """
+        self.flush()
+        self._close_log()
+        self._snapshot += 1
+        notes = []
+        for note_data in notes_data:
+            offset, length = self.blobs[note_data['content_hash']]
+            notes.append({**note_data, 'offset': offset, 'length': length})
+        metadata = {'version': self.VERSION, 'blob_file': self.blob_name, 'generation': self._generation,
+                    'snapshot': self._snapshot, 'notes': notes}
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(metadata, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.file_path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.log_entries = 0
+        self.legacy = False
+        if self._old_blob_path is not None:
+            if os.path.exists(self._old_blob_path):
+                os.remove(self._old_blob_path)
+            self._old_blob_path = None
+
+    def _close_log(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._close_log()
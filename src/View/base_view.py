@@ -105,6 +105,12 @@ class ConsoleView(BaseView):
     def display_notes_list(self, notes):
         pass
 
+    def display_tag_cloud(self, tag_counts):
+        pass
+
+    def display_month_counts(self, month_counts):
+        pass
+
     def display_event_details(self, event):
         pass
 
@@ -123,7 +129,7 @@ class NoteConsoleView(ConsoleView):
     def display_note_details(self, note):
         details = [
             [self.format_title('Title'), self.format_content(note.title)],
-            [self.format_title('Date'), self.format_content(note.note_date)],
+            [self.format_title('Date'), self.format_content(note.note_date.strftime('%d-%m-%Y'))],
             [self.format_title('Tags'), self.format_content(", ".join(note.tags))],
             [self.format_title('Content'), self.format_content(note.content)]
         ]
@@ -134,12 +140,33 @@ class NoteConsoleView(ConsoleView):
                    'Content']
         notes_table = [
             [self.format_content(i + 1), self.format_content(note.title),
-             self.format_content(note.note_date), self.format_content(", ".join(note.tags)),
+             self.format_content(note.note_date.strftime('%d-%m-%Y')), self.format_content(", ".join(note.tags)),
              self.format_content(note.content)]
             for i, note in enumerate(notes)
         ]
         print(tabulate(notes_table, headers=[self.format_title(header) for header in headers], tablefmt='pretty'))
 
+    def display_tag_cloud(self, tag_counts):
+        """
+        Displays the tags with the number of notes of every tag.
+
+        :param tag_counts: An iterable of (tag, number of notes) tuples.
+        """
+        headers = ['Tag', 'Notes']
+        tags_table = [[self.format_content(tag), self.format_content(count)] for tag, count in tag_counts]
+        print(tabulate(tags_table, headers=[self.format_title(header) for header in headers], tablefmt='pretty'))
+
+    def display_month_counts(self, month_counts):
+        """
+        Displays the number of notes of every month.
+
+        :param month_counts: An iterable of ((year, month), number of notes) tuples.
+        """
+        headers = ['Month', 'Notes']
+        months_table = [[self.format_content(f'{month:02d}-{year}'), self.format_content(count)]
+                        for (year, month), count in month_counts]
+        print(tabulate(months_table, headers=[self.format_title(header) for header in headers], tablefmt='pretty'))
+
 
 class EventConsoleView(ConsoleView):
 
@@ -154,6 +181,8 @@ class EventConsoleView(ConsoleView):
             [self.format_title('Date and Time'), self.format_content(event.date_time.strftime('%Y-%m-%d %H:%M'))],
             [self.format_title('Tags'), self.format_content(", ".join(event.tags))]
         ]
+        if event.recurrence:
+            details.append([self.format_title('Repeats'), self.format_content(str(event.recurrence))])
         print(tabulate(details, tablefmt='pretty'))
 
     def display_events_list(self, events):
@@ -179,7 +208,7 @@ class ContactConsoleView(ConsoleView):
     def display_contact_details(self, contact):
         details = [
             [self.format_title('Name'), self.format_content(contact.name)],
-            [self.format_title('Phones'), self.format_content(', '.join(phone.value for phone in contact.phones))]
+            [self.format_title('Phones'), self.format_content(', '.join(contact.get_phones_list()))]
         ]
 
         if contact.email:
@@ -193,21 +222,18 @@ class ContactConsoleView(ConsoleView):
 
         print(tabulate(details, tablefmt="pretty"))
 
-    def display_all_contacts(self, address_book, page_size=10):
-        contacts_list = list(address_book.data.values())
-        total_pages = len(contacts_list) // page_size + (1 if len(contacts_list) % page_size > 0 else 0)
-
-        for page_number in range(total_pages):
-            start_index = page_number * page_size
-            end_index = start_index + page_size
-            page = contacts_list[start_index:end_index]
+    def display_all_contacts(self, address_book, page_size=10, order='insertion'):
+        # pages are read from the book lazily, one page ahead of the shown one
+        pages = address_book.iterator(page_size, order)
+        page = next(pages, None)
 
+        while page:
             headers = ['No', 'Name', 'Phones', 'Email', 'Address', 'Birthday']
             contacts_table = [
                 [
                     self.format_content(str(index + 1)),
                     self.format_content(contact.name),
-                    self.format_content(', '.join([phone.value for phone in contact.phones])),
+                    self.format_content(', '.join(contact.get_phones_list())),
                     self.format_content(contact.email if contact.email else ''),
                     self.format_content(contact.address if contact.address else ''),
                     self.format_content(contact.birthday if contact.birthday else '')
@@ -215,6 +241,6 @@ class ContactConsoleView(ConsoleView):
             ]
 
             print(tabulate(contacts_table, headers=[self.format_title(header) for header in headers], tablefmt='pretty'))
-            if page_number < total_pages - 1:
+            page = next(pages, None)
+            if page:
                 input('Press Enter для continue...')
-
@@ -0,0 +1,179 @@
+"""
+Data structures shared by the managers: the substring and exact value indexes, the bulk
+import report and the compaction policy of the snapshot and log storages.
+"""
+
+
+class NgramIndex:
+    """
+    Inverted substring index.
+
+    Every indexed text is split into all its n-grams up to `n` symbols long, so a query
+    not longer than `n` is answered by a single lookup, and a longer query by the
+    intersection of its n-gram postings. Candidates for long queries still have to be
+    checked by the caller, as the n-grams of a query may come from different texts.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.postings = {}
+        self.keys_grams = {}
+
+    def grams(self, text):
+        return {text[i:i + size] for size in range(1, self.n + 1) for i in range(len(text) - size + 1)}
+
+    def add(self, key, *texts):
+        """
+        Index the texts of the key, replacing the ones indexed before.
+        """
+        self.remove(key)
+        grams = set().union(*map(self.grams, texts))
+        postings = self.postings
+        for gram in grams:
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = {key}
+            else:
+                keys.add(key)
+        self.keys_grams[key] = grams
+
+    def remove(self, key):
+        for gram in self.keys_grams.pop(key, ()):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def candidates(self, query):
+        """
+        Return the keys which texts may contain the query.
+
+        The result is exact for queries not longer than `n` symbols. It may be a set of the
+        index itself, so it must not be changed.
+        """
+        if len(query) <= self.n:
+            return self.postings.get(query, set())
+        postings = []
+        for gram in {query[i:i + self.n] for i in range(len(query) - self.n + 1)}:
+            keys = self.postings.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def is_exact(self, query):
+        return len(query) <= self.n
+
+
+class KeyIndex:
+    """
+    Hash index of exact values, every value maps to its keys in the order they were added.
+
+    The number of keys of a value is the size of its key dict, so value counts are never recomputed.
+    """
+
+    def __init__(self):
+        # dicts with None values are ordered sets
+        self.value_keys = {}
+        self.key_values = {}
+
+    def add(self, key, values):
+        """
+        Index the values of the key, replacing the ones indexed before.
+
+        Only the values the key gains or loses are touched, so the key keeps its position
+        among the keys of the values it already had.
+        """
+        values = set(values)
+        old_values = self.key_values.get(key, set())
+        for value in old_values - values:
+            self._discard(key, value)
+        for value in values - old_values:
+            self.value_keys.setdefault(value, {})[key] = None
+        self.key_values[key] = values
+
+    def _discard(self, key, value):
+        keys = self.value_keys[value]
+        del keys[key]
+        if not keys:
+            del self.value_keys[value]
+
+    def remove(self, key):
+        for value in self.key_values.pop(key, ()):
+            self._discard(key, value)
+
+    def find(self, value):
+        return list(self.value_keys.get(value, ()))
+
+    def first(self, value):
+        return next(iter(self.value_keys.get(value, ())), None)
+
+    def count(self, value):
+        return len(self.value_keys.get(value, ()))
+
+    def counts(self):
+        """
+        Return (value, number of keys) tuples, the most frequent values first.
+        """
+        return sorted(((value, len(keys)) for value, keys in self.value_keys.items()),
+                      key=lambda value_count: (-value_count[1], value_count[0]))
+
+
+class ImportReport:
+    """
+    Result of a bulk import: the number of imported items and the errors of the rejected ones.
+    """
+    def __init__(self, items='records', rejected='rows'):
+        """
+        Initialize ImportReport.
+
+        :param items: Name of the imported items in the summary.
+        :param rejected: Name of the rejected entries of the file in the summary.
+        """
+        self.items = items
+        self.rejected = rejected
+        self.imported = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def add_error(self, position, message):
+        """
+        :param position: Row or line number of the rejected entry in the imported file.
+        """
+        self.errors.append((position, message))
+
+    @property
+    def items_per_second(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f'Imported {self.imported} {self.items}, rejected {len(self.errors)} {self.rejected} '
+                f'in {self.elapsed:.2f}s ({self.items_per_second:.0f} {self.items}/sec)')
+
+
+class CompactionPolicy:
+    """
+    When a storage of a snapshot and a log of changes writes a new snapshot.
+
+    A storage using it counts the entries of its log in `log_entries` and sets the
+    `compact_threshold` below which the log is never compacted.
+    """
+
+    def needs_compaction(self, size):
+        """
+        Compaction is due when the log outgrows the data, so the snapshot rewrite costs
+        amortized O(1) per logged change.
+
+        :param size: Number of items in the data.
+        """
+        return self.log_entries >= max(self.compact_threshold, size)
+
+    def should_snapshot(self, changed, size):
+        """
+        A save changing most of the data is cheaper to write as a snapshot than to the log.
+
+        :param changed: Number of items changed since the last save.
+        :param size: Number of items in the data.
+        """
+        return changed >= self.compact_threshold and changed * 2 >= size
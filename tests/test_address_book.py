@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import unittest
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'ContactManager'), os.path.join(SRC, 'tools')]
+
+from models import AddressBook, Phone, Record  # noqa: E402
+
+
+class AddressBookOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'address_book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def reload(self, book):
+        book.storage.close()
+        loaded = AddressBook(self.path)
+        loaded.load_data_from_file()
+        return loaded
+
+    def test_order_survives_reload(self):
+        book = AddressBook(self.path)
+        book.load_data_from_file()
+        names = [f'N{i:02d}' for i in range(25, 0, -1)]
+        for name in names:
+            book.add_record(Record(name))
+        book.save_data_to_file()
+        loaded = self.reload(book)
+        self.assertEqual(list(loaded.data), names)
+
+        # the journal of a later save keeps the order too
+        more = [f'M{i:02d}' for i in range(10, 0, -1)]
+        for name in more:
+            loaded.add_record(Record(name))
+        loaded.rename('N10', 'A10')
+        loaded.save_data_to_file()
+        reloaded = self.reload(loaded)
+        expected = [name for name in names if name != 'N10'] + more + ['A10']
+        self.assertEqual(list(reloaded.data), expected)
+        reloaded.storage.close()
+
+
+class JournalRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'address_book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        book = AddressBook(self.path)
+        book.load_data_from_file()
+        return book
+
+    def test_saves_after_a_torn_entry_are_kept(self):
+        book = self.load()
+        book.add_record(Record('Before'))
+        book.save_data_to_file()
+        book.storage.close()
+        journal_path = book.storage.journal_path
+        with open(journal_path, 'rb') as file:
+            entry = file.read()
+        # a crash in the middle of the next append
+        with open(journal_path, 'ab') as file:
+            file.write(entry[:len(entry) // 2])
+
+        book = self.load()
+        self.assertEqual(list(book.data), ['Before'])
+        self.assertEqual(os.path.getsize(journal_path), len(entry))
+        book.add_record(Record('After'))
+        book.save_data_to_file()
+        book.storage.close()
+
+        book = self.load()
+        self.assertEqual(list(book.data), ['Before', 'After'])
+        book.storage.close()
+
+
+class RecordPhonesTest(unittest.TestCase):
+    def test_phones_cannot_be_changed_in_place(self):
+        record = Record('Anna')
+        record.add_phone('0501234567')
+        with self.assertRaises(AttributeError):
+            record.phones.append('0661234567')
+        self.assertEqual([phone.value for phone in record.phones], ['0501234567'])
+        record.phones = [*record.phones, Phone('0661234567')]
+        self.assertEqual(record.get_phones_list(), ['0501234567', '0661234567'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from array import array
+from datetime import date, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'ContactManager'), os.path.join(SRC, 'tools')]
+
+from binary_format import (DELETE, PUT, BookFile, decode_journal, encode_journal_entry, record_values,  # noqa: E402
+                           write_book)
+from models import AddressBook, Record  # noqa: E402
+
+
+def random_records(count, seed=0):
+    generator = random.Random(seed)
+    records = []
+    for i in range(count):
+        birthday = date(1970, 1, 1) + timedelta(days=generator.randrange(20000))
+        record = Record(f'Контакт {i} {generator.choice(["Anna", "Bob", "Oleh"])}',
+                        birthday=birthday.strftime('%d.%m.%Y') if i % 3 else None,
+                        email=f'user{i}@example.com' if i % 2 else None,
+                        address=generator.choice(['Kyiv', 'Lviv', None]))
+        record._phones = array('Q', [generator.randrange(10 ** 9, 10 ** 10) for _ in range(i % 3)])
+        records.append(record)
+    return records
+
+
+class BookFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'address_book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        values = [record_values(record) for record in random_records(200)]
+        write_book(self.path, values)
+        book_file = BookFile(self.path)
+        self.assertEqual(book_file.count, len(values))
+        self.assertEqual([book_file.values(index) for index in range(book_file.count)], values)
+        self.assertEqual([book_file.name(index) for index in range(book_file.count)], [value[0] for value in values])
+        book_file.close()
+
+    def test_journal_round_trip_and_torn_tail(self):
+        values = [record_values(record) for record in random_records(5)]
+        entries = [encode_journal_entry(PUT, value[0], value) for value in values]
+        entries.append(encode_journal_entry(DELETE, values[0][0]))
+        journal = b''.join(entries)
+        decoded = list(decode_journal(journal))
+        self.assertEqual([(op, key, values) for op, key, values, _ in decoded],
+                         [(PUT, value[0], value) for value in values] + [(DELETE, values[0][0], None)])
+        self.assertEqual(decoded[-1][3], len(journal))
+
+        # a torn tail and a corrupted entry both end the valid part of the journal
+        self.assertEqual(list(decode_journal(journal[:-3]))[-1][3], len(journal) - len(entries[-1]))
+        corrupted = bytearray(journal)
+        corrupted[len(entries[0]) + len(entries[1]) - 1] ^= 0xFF
+        self.assertEqual(len(list(decode_journal(bytes(corrupted)))), 1)
+
+
+class AddressBookStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'address_book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        book = AddressBook(self.path)
+        book.load_data_from_file()
+        return book
+
+    def contents(self, book):
+        return [(name, record_values(book.data[name])) for name in book.data]
+
+    def test_compaction_keeps_the_records(self):
+        book = self.load()
+        for record in random_records(300):
+            book.add_record(record)
+        book.save_data_to_file()
+        book.storage.compact(book.data, background=False)
+        expected = self.contents(book)
+        book.storage.close()
+
+        book = self.load()
+        self.assertEqual(self.contents(book), expected)
+        # changes journaled after the snapshot, then a compaction of the lazily read book
+        book.delete(expected[0][0])
+        book.data[expected[1][0]].set_birthday('29.02.2000')
+        book.rename(expected[2][0], 'Renamed')
+        book.save_data_to_file()
+        book.storage.compact(book.data, background=False)
+        expected = self.contents(book)
+        book.storage.close()
+        self.assertFalse(os.path.exists(book.storage.journal_path))
+
+        book = self.load()
+        self.assertEqual(self.contents(book), expected)
+        book.storage.close()
+
+    def test_interrupted_compaction_replays_the_rotated_journal(self):
+        book = self.load()
+        for record in random_records(20):
+            book.add_record(record)
+        book.save_data_to_file()
+        expected = self.contents(book)
+        book.storage.close()
+        # the compaction rotated the journal away and died before writing the snapshot
+        os.replace(book.storage.journal_path, book.storage.rotated_journal_path)
+
+        book = self.load()
+        self.assertEqual(self.contents(book), expected)
+        book.add_record(Record('Later'))
+        book.save_data_to_file()
+        book.storage.close()
+        book = self.load()
+        self.assertEqual(self.contents(book)[:-1], expected)
+        self.assertEqual(list(book.data)[-1], 'Later')
+        book.storage.close()
+
+    def test_queries_match_a_linear_scan(self):
+        book = self.load()
+        for record in random_records(300, seed=1):
+            book.add_record(record)
+        book.save_data_to_file()
+        book.storage.compact(book.data, background=False)
+        book.storage.close()
+
+        book = self.load()
+        records = list(book.data.values())
+        for query in ['anna', 'контакт 1', '12', 'bob', '0', 'zzz', ' 7 ']:
+            text = query.lower().strip()
+            expected = [record for record in records
+                        if text in record.name.value.lower() or any(text in phone for phone in record.get_phones_list())]
+            self.assertEqual(book.search_full(query), expected, query)
+        today = date(2026, 2, 27)
+        for days in (0, 1, 7, 30, 365):
+            expected = sorted((record for record in records
+                               if record.birthday and record.days_to_birthday(today) <= days),
+                              key=lambda record: (record.days_to_birthday(today), record.name.value))
+            found = book.upcoming_birthdays(days, today)
+            self.assertEqual([record.name.value for record in found], [record.name.value for record in expected])
+        book.storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
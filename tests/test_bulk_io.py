@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import unittest
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'ContactManager'), os.path.join(SRC, 'tools')]
+
+from bulk_io import export_contacts, import_contacts  # noqa: E402
+from models import AddressBook  # noqa: E402
+
+
+class BulkImportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.book_path = os.path.join(self.directory.name, 'address_book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        book = AddressBook(self.book_path)
+        book.load_data_from_file()
+        return book
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_unreadable_rows_are_reported(self):
+        path = self.write('contacts.csv', b'name,phones,email,birthday,address\n'
+                                          b'Anna,0501234567,,,\n'
+                                          b'Bad \xff\xfe,,,,\n'
+                                          b'Long,,,,' + b'x' * 200000 + b'\n'
+                                          b'Oleh,0671234567;0931234567,oleh@example.com,01.02.1990,Kyiv\n')
+        book = self.load()
+        report = import_contacts(book, path)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([row_number for row_number, _ in report.errors], [3, 4])
+        book.storage.close()
+        self.assertEqual(list(self.load().data), ['Anna', 'Oleh'])
+
+    def test_unreadable_jsonl_lines_are_reported(self):
+        path = self.write('contacts.jsonl', b'{"name": "Anna"}\n{"name": "\xff"}\n{"name": \n\n{"name": "Bob"}\n')
+        book = self.load()
+        report = import_contacts(book, path)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([row_number for row_number, _ in report.errors], [2, 3])
+        book.storage.close()
+
+    def test_round_trip(self):
+        source = self.write('contacts.csv', 'name,phones,email,birthday,address\n'
+                                            'Анна,0501234567;0661234567,anna@example.com,29.02.2000,"Kyiv, 1"\n'
+                                            'Bob,,,,\n'.encode('utf-8'))
+        book = self.load()
+        import_contacts(book, source)
+        for file_format in ('csv', 'jsonl'):
+            path = os.path.join(self.directory.name, f'export.{file_format}')
+            self.assertEqual(export_contacts(book, path), 2)
+            copy = AddressBook(os.path.join(self.directory.name, f'{file_format}.bin'))
+            copy.load_data_from_file()
+            report = import_contacts(copy, path)
+            self.assertEqual((report.imported, report.errors), (2, []))
+            self.assertEqual([str(record) for record in copy.data.values()],
+                             [str(record) for record in book.data.values()])
+            copy.storage.close()
+        book.storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
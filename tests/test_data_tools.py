@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'tools')]
+
+from data_tools import KeyIndex, NgramIndex  # noqa: E402
+
+
+class KeyIndexTest(unittest.TestCase):
+    def test_reindexed_key_keeps_its_position(self):
+        index = KeyIndex()
+        index.add(1, ['same', 'a'])
+        index.add(2, ['same', 'b'])
+        # re-indexing with an unchanged value, as an edit of another field does
+        index.add(1, ['same', 'c'])
+        self.assertEqual(index.find('same'), [1, 2])
+        self.assertEqual(index.first('same'), 1)
+        self.assertEqual(index.find('a'), [])
+        self.assertEqual(index.find('c'), [1])
+
+    def test_counts_and_remove(self):
+        index = KeyIndex()
+        index.add(1, ['x', 'y'])
+        index.add(2, ['x'])
+        self.assertEqual(index.counts(), [('x', 2), ('y', 1)])
+        index.remove(1)
+        self.assertEqual(index.counts(), [('x', 1)])
+        self.assertEqual(index.count('y'), 0)
+
+
+class NgramIndexTest(unittest.TestCase):
+    def test_candidates_match_a_linear_scan(self):
+        texts = {key: text for key, text in enumerate(['anna', 'hannah', 'john', 'joanna', 'nan', ''])}
+        index = NgramIndex()
+        for key, text in texts.items():
+            index.add(key, text)
+        index.add(1, 'hana')
+        texts[1] = 'hana'
+        index.remove(3)
+        del texts[3]
+        for query in ['a', 'an', 'nna', 'anna', 'han', 'hana', 'jo', 'x', 'annan']:
+            expected = {key for key, text in texts.items() if query in text}
+            found = {key for key in index.candidates(query) if query in texts[key]}
+            self.assertEqual(found, expected, query)
+            if index.is_exact(query):
+                self.assertEqual(set(index.candidates(query)), expected, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
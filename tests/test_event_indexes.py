@@ -0,0 +1,124 @@
+import os
+import random
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'EventManager'), os.path.join(SRC, 'View'), os.path.join(SRC, 'tools')]
+
+from event_indexes import EventTimeline, SortedKeyList  # noqa: E402
+from event_manager import Event  # noqa: E402
+from recurrence import Recurrence  # noqa: E402
+
+START = datetime(2026, 1, 1)
+
+
+def random_events(count, seed=0, first_id=0):
+    generator = random.Random(seed)
+    events = []
+    for event_id in range(first_id, first_id + count):
+        date_time = START + timedelta(minutes=15 * generator.randrange(4 * 24 * 365))
+        recurrence = None
+        if generator.random() < 0.1:
+            recurrence = Recurrence(generator.choice(Recurrence.FREQUENCIES), generator.randint(1, 3),
+                                    until=generator.choice([None, date_time + timedelta(days=generator.randrange(400))]),
+                                    count=generator.choice([None, generator.randint(1, 30)]))
+        duration = generator.choice([None, timedelta(minutes=30), timedelta(hours=5)])
+        events.append(Event(f'Event {event_id}', date_time, event_id=event_id, recurrence=recurrence,
+                            duration=duration))
+    return events
+
+
+def linear_occurrences(events, start, end):
+    found = []
+    for event in events:
+        if event.recurrence is None:
+            if start <= event.date_time <= end:
+                found.append((event.date_time, event.event_id))
+        else:
+            found.extend((date_time, event.event_id)
+                         for date_time in event.recurrence.occurrences(event.date_time, start, end))
+    return sorted(found)
+
+
+def may_overlap(event, start):
+    last = event.recurrence.last_occurrence(event.date_time)
+    return last is None or last + max(event.duration or timedelta(0), timedelta(seconds=1)) > start
+
+
+class SortedKeyListTest(unittest.TestCase):
+    def test_matches_a_sorted_list(self):
+        generator = random.Random(0)
+        expected = set(generator.sample(range(100000), 1500))
+        keys = SortedKeyList(expected)
+        for _ in range(3000):
+            key = generator.randrange(100000)
+            if key in expected:
+                keys.remove(key)
+                expected.remove(key)
+            else:
+                keys.add(key)
+                expected.add(key)
+        # many keys rebuild the blocks, a few are inserted one by one
+        for batch in (range(100000, 101000), [-1, 200000]):
+            keys.update(batch)
+            expected.update(batch)
+        self.assertEqual(list(keys.irange(-1, 200001)), sorted(expected))
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(list(keys.irange(500, 600)), sorted(key for key in expected if 500 <= key < 600))
+
+
+class EventTimelineTest(unittest.TestCase):
+    def setUp(self):
+        self.timeline = EventTimeline()
+        self.events = random_events(3000)
+        self.timeline.extend(self.events[:2000])
+        for event in self.events[2000:]:
+            self.timeline.add(event)
+
+    def check_queries(self):
+        generator = random.Random(1)
+        for _ in range(50):
+            start = START + timedelta(hours=generator.randrange(24 * 400))
+            end = start + timedelta(hours=generator.choice([0, 1, 24, 24 * 30]))
+            # events at the same time are ordered by when they were (re)added, so only the times are compared in order
+            between = self.timeline.between(start, end)
+            self.assertEqual(sorted((event.date_time, event.event_id) for event in between),
+                             sorted((event.date_time, event.event_id) for event in self.events
+                                    if event.recurrence is None and start <= event.date_time <= end))
+            self.assertEqual([event.date_time for event in between], sorted(event.date_time for event in between))
+            found = self.timeline.occurrences(start, end)
+            self.assertEqual(sorted((date_time, event.event_id) for date_time, event in found),
+                             linear_occurrences(self.events, start, end))
+            self.assertEqual([date_time for date_time, _ in found], sorted(date_time for date_time, _ in found))
+            # only the recurring events which last up to the window are expanded
+            self.assertEqual({event.event_id for event in self.timeline.recurring_overlapping(start, end)},
+                             {event.event_id for event in self.events if event.recurrence and event.date_time < end
+                              and may_overlap(event, start)})
+        self.assertEqual(len(self.timeline), len(self.events))
+    def test_queries_match_a_linear_scan(self):
+        self.check_queries()
+
+    def test_queries_after_edits_and_removals(self):
+        generator = random.Random(2)
+        for event in generator.sample(self.events, 500):
+            self.timeline.remove(event)
+            self.events.remove(event)
+        for event in generator.sample(self.events, 500):
+            event.date_time += timedelta(days=generator.randint(-30, 30))
+            self.timeline.add(event)
+        later = random_events(1000, seed=3, first_id=3000)
+        self.timeline.extend(later)
+        self.events.extend(later)
+        self.check_queries()
+
+    def test_rule_lasting_past_the_calendar_is_endless(self):
+        event = Event('Forever', START, event_id=5000, recurrence=Recurrence('monthly', count=10 ** 6))
+        self.timeline.add(event)
+        self.events.append(event)
+        self.check_queries()
+
+
+if __name__ == '__main__':
+    unittest.main()
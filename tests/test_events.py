@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'EventManager'), os.path.join(SRC, 'View'), os.path.join(SRC, 'tools')]
+
+from event_manager import Event, EventManager  # noqa: E402
+
+START = datetime(2026, 3, 2, 9, 0)
+
+
+class EventManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'events.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def manager(self):
+        return EventManager(self.path, None)
+
+    def test_edit_keeps_the_event_found_by_title(self):
+        manager = self.manager()
+        manager.add_events([Event('Standup', START, ['work']), Event('Standup', START + timedelta(days=1), ['work']),
+                            Event('Lunch', START, ['home'])])
+        first = manager.find_by_title('Standup')
+        first.date_time = START + timedelta(hours=1)
+        manager._index(first)
+        self.assertIs(manager.find_by_title('Standup'), first)
+        # an event renamed to the title comes after the ones added before it
+        lunch = manager.find_by_title('Lunch')
+        lunch.title = 'Standup'
+        lunch.tags = ['work']
+        manager._index(lunch)
+        self.assertIs(manager.find_by_title('Standup'), first)
+        self.assertEqual([event.event_id for event in manager.find_by_tag('work')], [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
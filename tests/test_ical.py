@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'EventManager'), os.path.join(SRC, 'View'), os.path.join(SRC, 'tools')]
+
+from event_manager import Event, EventManager  # noqa: E402
+from ical import export_events, import_events, read_events  # noqa: E402
+from recurrence import Recurrence  # noqa: E402
+
+
+def calendar(*events):
+    return 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n' + ''.join(events) + 'END:VCALENDAR\r\n'
+
+
+class IcalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ics_path = os.path.join(self.directory.name, 'events.ics')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, text, encoding='utf-8'):
+        with open(self.ics_path, 'w', encoding=encoding, newline='') as file:
+            file.write(text)
+
+    def manager(self, name='events.json'):
+        return EventManager(os.path.join(self.directory.name, name), None)
+
+    def read(self):
+        return list(read_events(self.ics_path))
+
+    def test_round_trip(self):
+        manager = self.manager()
+        manager.add_events([
+            Event('Зустріч, план; ціни', datetime(2026, 3, 2, 9, 30), ['work', 'a,b'], duration=timedelta(hours=1)),
+            Event('Gym ' * 30, datetime(2026, 3, 3, 18, 0),
+                  recurrence=Recurrence('weekly', 2, count=10, exceptions=[datetime(2026, 3, 17, 18, 0)])),
+            Event('Rent', datetime(2026, 1, 31), recurrence=Recurrence('monthly', until=datetime(2026, 12, 31)))])
+        self.assertEqual(export_events(manager, self.ics_path), 3)
+
+        imported = self.manager('imported.json')
+        report = import_events(imported, self.ics_path)
+        self.assertEqual((report.imported, report.errors), (3, []))
+        for event, copy in zip(manager.events.values(), imported.events.values()):
+            self.assertEqual((copy.title, copy.date_time, copy.tags, copy.duration),
+                             (event.title, event.date_time, event.tags, event.duration))
+            if event.recurrence:
+                rule, copied = event.recurrence, copy.recurrence
+                self.assertEqual((copied.frequency, copied.interval, copied.until, copied.count, copied.exceptions),
+                                 (rule.frequency, rule.interval, rule.until, rule.count, rule.exceptions))
+
+    def test_nested_component_properties_are_ignored(self):
+        self.write(calendar('BEGIN:VEVENT\r\nSUMMARY:Dentist\r\nDTSTART:20260302T100000\r\n'
+                            'BEGIN:VALARM\r\nSUMMARY:Reminder\r\nDURATION:PT15M\r\nEND:VALARM\r\n'
+                            'DURATION:PT1H\r\nEND:VEVENT\r\n'))
+        [(line_number, event)] = self.read()
+        self.assertEqual(line_number, 3)
+        self.assertEqual((event.title, event.duration), ('Dentist', timedelta(hours=1)))
+
+    def test_negative_duration_is_an_error(self):
+        self.write(calendar('BEGIN:VEVENT\r\nSUMMARY:Back\r\nDTSTART:20260302T100000\r\nDTEND:20260302T090000\r\n'
+                            'END:VEVENT\r\n'))
+        report = import_events(self.manager(), self.ics_path)
+        self.assertEqual((report.imported, len(report.errors)), (0, 1))
+
+    def test_unsupported_rule_parts_are_errors(self):
+        rules = ['FREQ=WEEKLY;BYDAY=MO,WE', 'FREQ=MONTHLY;BYMONTHDAY=-1', 'FREQ=YEARLY', 'FREQ=DAILY;INTERVAL=2;COUNT=3']
+        self.write(calendar(*(f'BEGIN:VEVENT\r\nSUMMARY:Rule\r\nDTSTART:20260302T100000\r\nRRULE:{rule}\r\n'
+                              'END:VEVENT\r\n' for rule in rules)))
+        events = [event for _, event in self.read()]
+        self.assertTrue(all(isinstance(event, ValueError) for event in events[:3]))
+        self.assertEqual((events[3].recurrence.interval, events[3].recurrence.count), (2, 3))
+
+    def test_invalid_utf8_rejects_only_its_event(self):
+        events = ''.join(f'BEGIN:VEVENT\r\nSUMMARY:Event {i}\r\nDTSTART:20260302T100000\r\nEND:VEVENT\r\n'
+                         for i in range(500))
+        with open(self.ics_path, 'wb') as file:
+            file.write(calendar(events).encode('utf-8').replace(b'Event 250', b'Event \xff\xfe'))
+        manager = self.manager()
+        report = import_events(manager, self.ics_path, chunk_size=10)
+        self.assertEqual(report.imported, 499)
+        self.assertEqual(report.errors, [(3 + 250 * 4, 'The event has text which is not valid UTF-8')])
+        self.assertEqual(len(self.manager().events), 499)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'NoteManger'), os.path.join(SRC, 'View'), os.path.join(SRC, 'tools')]
+
+from note_index import tokenize  # noqa: E402
+from note_manager import Note, NoteManager  # noqa: E402
+
+WORDS = ['meeting', 'plan', 'budget', 'зустріч', 'report', 'call', 'review', 'draft']
+
+
+class NoteManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'notes.json')
+        self.generator = random.Random(0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def manager(self):
+        return NoteManager(self.path, None)
+
+    def text(self, count):
+        return ' '.join(self.generator.choice(WORDS) for _ in range(count))
+
+    def add(self, manager, title=None):
+        note = Note(title or self.text(2), self.text(20), [self.generator.choice(WORDS)],
+                    date(2026, 1, 1) + timedelta(days=self.generator.randrange(365)), manager._next_id)
+        manager._next_id += 1
+        manager.notes[note.note_id] = note
+        manager._index(note)
+        return note
+
+    def edit(self, manager):
+        note = self.generator.choice(list(manager.notes.values()))
+        note.content = self.text(20)
+        note.tags = note.tags + [self.generator.choice(WORDS)]
+        manager._index(note)
+
+    @staticmethod
+    def contents(manager):
+        return [(note.note_id, note.title, note.content, note.tags, note.note_date) for note in manager.notes.values()]
+
+    def close(self, manager):
+        manager.storage.close()
+
+    def reload(self, manager):
+        expected = self.contents(manager)
+        self.close(manager)
+        manager = self.manager()
+        self.assertEqual(self.contents(manager), expected)
+        return manager
+
+    def test_saves_append_to_the_log(self):
+        manager = self.manager()
+        for _ in range(5):
+            self.add(manager)
+        manager.save_notes()
+        # a few notes are logged, a save of many of them writes a snapshot
+        self.assertFalse(os.path.exists(self.path))
+        for _ in range(1000):
+            self.add(manager)
+        manager.save_notes()
+        self.assertFalse(os.path.exists(manager.storage.log_path))
+        stamp = os.stat(self.path).st_mtime_ns
+        for _ in range(20):
+            self.edit(manager)
+            manager.save_notes()
+        manager._remove(manager.notes[3])
+        self.add(manager)
+        manager.save_notes()
+        # the notes file was written once, every save after it only appended to the log
+        self.assertEqual(os.stat(self.path).st_mtime_ns, stamp)
+        manager = self.reload(manager)
+        self.assertNotIn(3, manager.notes)
+        self.close(manager)
+
+    def test_log_is_compacted(self):
+        manager = self.manager()
+        manager.storage.compact_threshold = 10
+        for _ in range(5):
+            self.add(manager)
+            manager.save_notes()
+        for _ in range(30):
+            self.edit(manager)
+            manager.save_notes()
+        self.assertLess(manager.storage.log_entries, 10)
+        self.close(manager)
+
+    def test_torn_log_tail_is_dropped(self):
+        manager = self.manager()
+        for _ in range(5):
+            self.add(manager)
+            manager.save_notes()
+        self.add(manager, 'Torn')
+        manager.save_notes()
+        expected = self.contents(manager)[:-1]
+        self.close(manager)
+        # the save of the last note died in the middle of its log entry
+        with open(manager.storage.log_path, 'rb+') as file:
+            file.truncate(os.path.getsize(manager.storage.log_path) - 10)
+
+        manager = self.manager()
+        self.assertEqual(self.contents(manager), expected)
+        self.assertEqual(manager.index.search('torn'), [])
+        self.add(manager, 'Later')
+        manager.save_notes()
+        manager = self.reload(manager)
+        self.assertEqual(manager.find_by_title('Later').note_id, 5)
+        self.close(manager)
+
+    def test_log_of_an_older_snapshot_is_dropped(self):
+        manager = self.manager()
+        for _ in range(5):
+            self.add(manager)
+            manager.save_notes()
+        self.edit(manager)
+        manager.save_notes()
+        old_log = manager.storage.log_path + '.copy'
+        shutil.copy(manager.storage.log_path, old_log)
+        manager._remove(manager.notes[0])
+        manager.storage.compact(note.to_dict() for note in manager.notes.values())
+        # the compaction died before removing the log, which the new snapshot already contains
+        shutil.copy(old_log, manager.storage.log_path)
+        manager = self.reload(manager)
+        self.assertNotIn(0, manager.notes)
+        self.close(manager)
+
+    def test_search_matches_a_linear_scan(self):
+        manager = self.manager()
+        for _ in range(200):
+            self.add(manager)
+        manager.save_notes()
+        for _ in range(50):
+            self.edit(manager)
+        for note_id in range(0, 200, 7):
+            manager._remove(manager.notes[note_id])
+        manager.save_notes()
+        manager = self.reload(manager)
+
+        def terms(note):
+            return {term for text in manager.note_texts(note) for term in tokenize(text)}
+
+        for query in ['plan', 'budget review', 'зустріч OR call', 'rev*', 'missing']:
+            alternatives = [words.split() for words in query.split(' OR ')]
+            expected = {note.note_id for note in manager.notes.values()
+                        if any(all(any(term.startswith(word[:-1]) if word.endswith('*') else term == word
+                                       for term in terms(note)) for word in words) for words in alternatives)}
+            self.assertEqual(set(manager.index.search(query)), expected, query)
+        self.close(manager)
+
+    def test_edit_keeps_the_note_found_by_title(self):
+        manager = self.manager()
+        first = self.add(manager, 'Plan')
+        self.add(manager, 'Plan')
+        self.add(manager, 'Budget')
+        manager.save_notes()
+        first.content = 'Changed'
+        manager._index(first)
+        manager.save_notes()
+        self.assertIs(manager.find_by_title('Plan'), first)
+        manager = self.reload(manager)
+        self.assertEqual(manager.find_by_title('Plan').note_id, first.note_id)
+        self.close(manager)
+
+
+if __name__ == '__main__':
+    unittest.main()
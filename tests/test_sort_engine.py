@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [SRC]
+
+from FileManager import sort_engine  # noqa: E402
+
+
+class ParallelSorterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, 'root')
+        self.outside = os.path.join(self.directory.name, 'outside')
+        os.makedirs(self.outside)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, *parts):
+        path = os.path.join(self.root, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(path)
+        return path
+
+    def files(self, *parts):
+        return sorted(os.listdir(os.path.join(self.root, *parts)))
+
+    def sort(self):
+        report = sort_engine.ParallelSorter(self.root, workers=2, batch_size=2).run()
+        self.assertEqual(report.failed, [])
+        return report
+
+    def test_names_differing_in_case_conflict(self):
+        self.write('Images', 'PHOTO.png')
+        sources = [self.write('a', 'Photo.JPG'), self.write('b', 'photo.jpg'), self.write('c', 'photo.PNG'),
+                   self.write('X.DAT'), self.write('x.dat')]
+        report = self.sort()
+        self.assertEqual(report.moved, len(sources))
+        self.assertEqual(self.files('Images'), ['PHOTO.png', 'photo.JPG', 'photo_1.PNG', 'photo_1.jpg'])
+        self.assertEqual(self.files('Unknown'), ['X.DAT', 'x_1.dat'])
+        with open(os.path.join(self.root, 'Images', 'photo_1.jpg')) as file:
+            self.assertEqual(file.read(), sources[1])
+
+    def test_symlinks_to_directories_are_left_alone(self):
+        with open(os.path.join(self.outside, 'notes.txt'), 'w') as file:
+            file.write('outside')
+        os.makedirs(self.root)
+        os.symlink(self.outside, os.path.join(self.root, 'linked'))
+        os.symlink(os.path.join(self.outside, 'notes.txt'), os.path.join(self.root, 'notes.txt'))
+        self.write('sub', 'report.txt')
+        self.sort()
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'linked')))
+        self.assertEqual(os.listdir(self.outside), ['notes.txt'])
+        self.assertEqual(self.files('Unknown'), [])
+        # a symlink to a file is sorted as the file, the link itself is moved
+        self.assertEqual(self.files('Text'), ['notes.txt', 'report.txt'])
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'Text', 'notes.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path[:0] = [os.path.join(SRC, 'ContactManager'), os.path.join(SRC, 'tools')]
+
+from models import AddressBook, ObjectValidateError, Record  # noqa: E402
+from sqlite_book import SqliteAddressBook  # noqa: E402
+
+TODAY = date(2026, 2, 27)
+
+
+def random_records(count, seed=0):
+    generator = random.Random(seed)
+    records = []
+    for i in range(count):
+        birthday = date(1970, 1, 1) + timedelta(days=generator.randrange(20000))
+        record = Record(f'{generator.choice(["Anna", "Bob", "Олег"])} {i}',
+                        birthday=birthday.strftime('%d.%m.%Y') if i % 3 else None,
+                        email=f'user{i}@example.com' if i % 2 else None,
+                        address=generator.choice(['Kyiv', 'Lviv', None]))
+        for phone in range(i % 3):
+            record.add_phone(f'0{500000000 + 1000 * i + phone}')
+        records.append(record)
+    return records
+
+
+def values(records):
+    return [str(record) for record in records]
+
+
+class SqliteAddressBookTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.book = SqliteAddressBook(os.path.join(self.directory.name, 'address_book.db'))
+        self.book.load_data_from_file()
+        # the in-memory book is the reference, both get the same changes
+        self.expected = AddressBook(os.path.join(self.directory.name, 'address_book.bin'))
+        self.expected.load_data_from_file()
+
+    def tearDown(self):
+        self.book.close()
+        self.expected.storage.close()
+        self.directory.cleanup()
+
+    def fill(self, count):
+        self.assertFalse(self.book.data)
+        for book in (self.book, self.expected):
+            for record in random_records(count):
+                book.add_record(record)
+        self.assertTrue(self.book.data)
+
+    def test_rename_to_the_same_name_changes_nothing(self):
+        self.fill(5)
+        for book in (self.book, self.expected):
+            name = list(book.data)[1]
+            book.rename(name, name)
+            self.assertEqual(list(book.data)[1], name)
+            book.rename(name, 'Renamed')
+            self.assertIn('Renamed', book.data)
+            with self.assertRaises(ObjectValidateError):
+                book.rename('Renamed', list(book.data)[0])
+        # the in-memory book moves a renamed contact to the end
+        self.assertEqual(sorted(values(self.book.data.values())), sorted(values(self.expected.data.values())))
+
+    def test_queries_match_the_address_book(self):
+        self.fill(300)
+        for book in (self.book, self.expected):
+            names = list(book.data)
+            book.delete(names[0])
+            book.find(names[1]).set_birthday('29.02.2000')
+            book.save_data_to_file()
+        self.assertEqual(len(self.book.data), len(self.expected.data))
+        self.assertEqual(values(self.book.data.values()), values(self.expected.data.values()))
+        for query in ['anna', 'олег 1', '12', 'bob', '0', 'zzz', ' 7 ', '05000010']:
+            self.assertEqual(values(self.book.search_full(query)), values(self.expected.search_full(query)), query)
+        for days in (0, 1, 7, 30, 365):
+            self.assertEqual(values(self.book.upcoming_birthdays(days, TODAY)),
+                             values(self.expected.upcoming_birthdays(days, TODAY)))
+        for order, cursor in (('insertion', None), ('name', None), ('birthday', (TODAY, None))):
+            self.assertEqual([values(page) for page in self.book.iterator(7, order, cursor)],
+                             [values(page) for page in self.expected.iterator(7, order, cursor)], order)
+        name = list(self.expected.data)[1]
+        phone = self.expected.find(name).get_phones_list()[0]
+        self.assertEqual(self.book.find_by_phone(phone).name.value, name)
+
+
+if __name__ == '__main__':
+    unittest.main()